@@ -0,0 +1,404 @@
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+import ground_detection
+import pose_backend
+import process_video
+import result_sink
+
+MAX_BODY_SIZE = 64 << 20
+
+
+class Overloaded(Exception):
+    """
+    Raised by MicroBatcher.submit when the pending queue is full
+    """
+    pass
+
+
+class MicroBatcher:
+    """
+    Collects the items submitted concurrently into batches: a batch is sent as soon as it has max_batch items or
+    its first item has waited max_latency seconds. Batches run one at a time on a single worker thread, which is
+    where openpose wants to be called from.
+    """
+
+    def __init__(self, process_batch, max_batch=8, max_latency=0.01, max_pending=64):
+        """
+        :param process_batch: takes a list of items and returns the list of results, runs on the worker thread
+        :param max_batch: max items per batch
+        :param max_latency: seconds the first item of a batch waits for others
+        :param max_pending: items waiting for a batch above which submit raises Overloaded
+        """
+        self.process_batch = process_batch
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.task = None
+        self.batches = 0
+        self.items = 0
+        self.rejected = 0
+
+    def start(self):
+        self.task = asyncio.ensure_future(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        self.executor.shutdown(wait=True)
+
+    async def submit(self, item):
+        """
+        :return: the result of the item, raises Overloaded right away if too many items are waiting
+        """
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((item, future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise Overloaded()
+        return await future
+
+    async def submit_all(self, items):
+        """
+        Admit the items as one unit: the first of them, as many as the queue holds, are queued at once or none if
+        there is not room for them. The others then wait for room in the queue, so that a unit larger than the queue
+        streams through it instead of being rejected.
+        :return: the results of the items, raises Overloaded right away if the first items do not fit in the queue
+        """
+        admitted = min(len(items), self.queue.maxsize) if self.queue.maxsize > 0 else len(items)
+        if self.queue.maxsize > 0 and self.queue.maxsize - self.queue.qsize() < admitted:
+            self.rejected += 1
+            raise Overloaded()
+        loop = asyncio.get_running_loop()
+        futures = []
+        for i, item in enumerate(items):
+            future = loop.create_future()
+            if i < admitted:
+                # no await in between, nothing else can fill the queue
+                self.queue.put_nowait((item, future))
+            else:
+                await self.queue.put((item, future))
+            futures.append(future)
+        return await asyncio.gather(*futures)
+
+    async def next_batch(self):
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.max_latency
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self.next_batch()
+            items = [item for item, _ in batch]
+            try:
+                results = await loop.run_in_executor(self.executor, self.process_batch, items)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def stats(self):
+        return {'pending': self.queue.qsize(),
+                'batches': self.batches,
+                'items': self.items,
+                'mean_batch': self.items / self.batches if self.batches else 0.0,
+                'rejected': self.rejected}
+
+
+class FrameAnalyzer:
+    """
+    Ground masking, pose estimation and role classification of a batch of frames, with its own pose backend and
+    goal post cache (no process_video globals)
+    """
+
+    def __init__(self, backend, mask_mode=ground_detection.MASK_DOWNSCALED):
+        self.backend = backend
+        self.mask_mode = mask_mode
+        self.goal_posts = ground_detection.GoalPostCache(fallback=process_video.DEFAULT_GOAL_POST_COORDS)
+
+    def analyze(self, frames):
+        """
+        :param frames: list of BGR images
+        :return: list of result_sink.frame_record dicts
+        """
+        masked = [ground_detection.filter_ground_in_frame(frame, self.mask_mode) for frame in frames]
+        records = []
+        for frame, keypoints in zip(frames, self.backend.infer(masked)):
+            classification = process_video.classify_frame(frame, keypoints, self.goal_posts.get_box(frame))
+            records.append(result_sink.frame_record(0, keypoints, classification['roles'], classification['bounds'],
+                                                    classification['goal_post']))
+        return records
+
+
+def decode_image(body):
+    image = cv2.imdecode(np.frombuffer(body, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError('Could not decode the image')
+    return image
+
+
+def decode_clip(body, max_frames):
+    """
+    :return: the frames of an encoded video clip, raises RequestError (413) if it has more than max_frames
+    """
+    fd, path = tempfile.mkstemp(suffix='.mp4')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(body)
+        cap = cv2.VideoCapture(path)
+        frames = []
+        while len(frames) <= max_frames:
+            hasframe, frame = cap.read()
+            if not hasframe:
+                break
+            frames.append(frame)
+        cap.release()
+    finally:
+        os.remove(path)
+    if not frames:
+        raise ValueError('Could not decode the clip')
+    if len(frames) > max_frames:
+        raise RequestError(413, 'Clip longer than ' + str(max_frames) + ' frames')
+    return frames
+
+
+class AnalysisService:
+    """
+    Local HTTP service:
+    - POST /frame with an encoded image (jpg, png...) as body: roles and keypoints of the frame as JSON
+    - POST /clip with an encoded video of at most max_clip_frames frames as body (413 otherwise): list of the results
+    of its frames, admitted or rejected as a whole (see MicroBatcher.submit_all)
+    - GET /health: batching stats
+    Frames of all the concurrent requests are batched together, see MicroBatcher. A request arriving when the queue
+    is full gets a 503 right away.
+    """
+
+    def __init__(self, backend, max_batch=8, max_latency=0.01, max_pending=64, max_clip_frames=300,
+                 mask_mode=ground_detection.MASK_DOWNSCALED):
+        self.analyzer = FrameAnalyzer(backend, mask_mode)
+        self.batcher = MicroBatcher(self.analyzer.analyze, max_batch, max_latency, max_pending)
+        self.max_clip_frames = max_clip_frames
+        self.server = None
+
+    async def start(self, host='127.0.0.1', port=8000):
+        self.batcher.start()
+        self.server = await asyncio.start_server(self.handle_connection, host, port)
+        return self.server
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        await self.batcher.stop()
+
+    async def analyze_clip(self, frames):
+        records = await self.batcher.submit_all(frames)
+        for i, record in enumerate(records):
+            record['frame'] = i
+        return records
+
+    async def route(self, method, path, body):
+        """
+        :return: status code and JSON serializable response
+        """
+        loop = asyncio.get_running_loop()
+        if method == 'GET' and path == '/health':
+            return 200, {'status': 'ok', 'batching': self.batcher.stats()}
+        if method == 'POST' and path == '/frame':
+            image = await loop.run_in_executor(None, decode_image, body)
+            return 200, await self.batcher.submit(image)
+        if method == 'POST' and path == '/clip':
+            frames = await loop.run_in_executor(None, decode_clip, body, self.max_clip_frames)
+            return 200, {'frames': await self.analyze_clip(frames)}
+        return 404, {'error': 'Not found: ' + method + ' ' + path}
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                try:
+                    status, response = await self.route(method, path, body)
+                except Overloaded:
+                    status, response = 503, {'error': 'Overloaded, retry later'}
+                except RequestError as e:
+                    status, response = e.status, {'error': str(e)}
+                except ValueError as e:
+                    status, response = 400, {'error': str(e)}
+                except Exception as e:
+                    status, response = 500, {'error': repr(e)}
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                await write_response(writer, status, response, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except RequestError as e:
+            await write_response(writer, e.status, {'error': str(e)}, False)
+        finally:
+            writer.close()
+
+
+class RequestError(Exception):
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 413: 'Payload Too Large', 500: 'Internal Server Error',
+           503: 'Service Unavailable'}
+
+
+async def read_request(reader):
+    """
+    :return: method, path, lowercased headers and body of the next HTTP/1.1 request, None once the client is gone
+    """
+    line = await reader.readline()
+    if not line:
+        return None
+    parts = line.decode('latin-1').split()
+    if len(parts) != 3:
+        raise RequestError(400, 'Malformed request line')
+    method, path, _ = parts
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    if length > MAX_BODY_SIZE:
+        raise RequestError(413, 'Body larger than ' + str(MAX_BODY_SIZE) + ' bytes')
+    body = await reader.readexactly(length) if length else b''
+    return method, path.split('?')[0], headers, body
+
+
+async def write_response(writer, status, response, keep_alive=True):
+    payload = json.dumps(response).encode('utf-8')
+    head = ['HTTP/1.1 %d %s' % (status, REASONS.get(status, '')),
+            'Content-Type: application/json',
+            'Content-Length: %d' % len(payload),
+            'Connection: ' + ('keep-alive' if keep_alive else 'close')]
+    if status == 503:
+        head.append('Retry-After: 1')
+    writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + payload)
+    await writer.drain()
+
+
+async def post(host, port, path, body):
+    """
+    Minimal client, one request per connection
+    :return: status code and decoded JSON response
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(('POST %s HTTP/1.1\r\nHost: %s\r\nContent-Length: %d\r\nConnection: close\r\n\r\n'
+                      % (path, host, len(body))).encode('latin-1') + body)
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.strip().lower() == 'content-length':
+                length = int(value)
+        return status, json.loads(await reader.readexactly(length))
+    finally:
+        writer.close()
+
+
+async def load_test(host, port, image_body, requests=200, concurrency=16):
+    """
+    Send requests frames with concurrency requests in flight
+    :return: dict with the throughput, the latency percentiles and the status code counts
+    """
+    latencies = []
+    statuses = {}
+    remaining = [requests]
+
+    async def client():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            start = time.perf_counter()
+            status, _ = await post(host, port, '/frame', image_body)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    ms = np.array(latencies) * 1000.0
+    return {'requests': len(latencies),
+            'seconds': elapsed,
+            'requests_per_second': len(latencies) / elapsed,
+            'p50_ms': float(np.percentile(ms, 50)),
+            'p95_ms': float(np.percentile(ms, 95)),
+            'p99_ms': float(np.percentile(ms, 99)),
+            'statuses': statuses}
+
+
+async def serve(args):
+    if args.backend == 'synthetic':
+        backend = pose_backend.get_backend('synthetic', warm=True, latency=args.latency)
+    else:
+        backend = pose_backend.get_backend('openpose', warm=True)
+    service = AnalysisService(backend, args.max_batch, args.max_latency_ms / 1000.0, args.max_pending)
+    server = await service.start(args.host, args.port)
+    print('Serving on ' + args.host + ':' + str(args.port))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local penalty analysis service with micro-batching')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--backend', choices=['openpose', 'synthetic'], default='openpose',
+                        help='synthetic is a stub backend for offline load tests')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds per frame of the synthetic backend')
+    parser.add_argument('--max-batch', type=int, default=8, help='max frames per backend call')
+    parser.add_argument('--max-latency-ms', type=float, default=10.0, help='max wait of a frame for its batch')
+    parser.add_argument('--max-pending', type=int, default=64, help='queued frames above which requests get a 503')
+    asyncio.run(serve(parser.parse_args(argv)))
+
+
+if __name__ == '__main__':
+    main()
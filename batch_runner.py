@@ -0,0 +1,193 @@
+import hashlib
+import json
+import os
+import time
+
+import cv2
+
+import sharded_runner
+
+
+def load_manifest(manifest_path):
+    """
+    Manifest of the videos to process, a JSON list or one JSON object per line. Every entry has an "input" video
+    path, an "output" video path and optionally a "keypoints" .npz path and "options" passed to process_video.
+    :return: list of entries
+    """
+    with open(manifest_path) as f:
+        content = f.read()
+    if content.lstrip().startswith('['):
+        return json.loads(content)
+    return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+
+def video_work_dir(work_dir, vid_path):
+    name = os.path.splitext(os.path.basename(vid_path))[0]
+    path_hash = hashlib.sha1(os.path.abspath(vid_path).encode('utf-8')).hexdigest()[:8]
+    return os.path.join(work_dir, name + '-' + path_hash)
+
+
+def load_checkpoint(path, entry):
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {'input': entry['input'],
+            'next_frame': entry.get('starting_frame', 0),
+            'segments': [],
+            'frames': 0,
+            'done': False}
+
+
+def save_checkpoint(path, checkpoint):
+    # write then rename, so that a crash never leaves a half written checkpoint
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+class SegmentWriter:
+    """
+    Writes the annotated frames into short video segments. Every completed segment, with the keypoints of its frames,
+    is recorded in the checkpoint, so a restart resumes at the frame following the last recorded one. Segments are
+    closed (and not only checkpointed) because an mp4 file which was not released can't be read back.
+    """
+
+    def __init__(self, video_dir, checkpoint_path, checkpoint, segment_frames=50, fps=20.0):
+        """
+        :param segment_frames: frames per segment, i.e. the most work lost by a crash
+        """
+        self.video_dir = video_dir
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint = checkpoint
+        self.segment_frames = segment_frames
+        self.fps = fps
+        self.out_vid = None
+        self.frame_indices = []
+        self.keypoints = []
+
+    def segment_path(self, ext):
+        return os.path.join(self.video_dir, 'segment-' + str(len(self.checkpoint['segments'])) + ext)
+
+    def write(self, task):
+        out_image = task['out']
+        if self.out_vid is None:
+            h, w = out_image.shape[:2]
+            self.out_vid = cv2.VideoWriter(self.segment_path('.mp4'), cv2.VideoWriter_fourcc(*'mp4v'), self.fps, (w, h))
+        self.out_vid.write(out_image)
+        self.frame_indices.append(task['count'])
+        self.keypoints.append(task['keypoints'])
+        if len(self.frame_indices) >= self.segment_frames:
+            self.commit()
+
+    def commit(self):
+        if self.out_vid is None:
+            return
+        self.out_vid.release()
+        self.out_vid = None
+
+        keypoints_path = self.segment_path('.npz')
+        sharded_runner.save_keypoints(keypoints_path, self.frame_indices, self.keypoints)
+        self.checkpoint['segments'].append({'video': self.segment_path('.mp4'), 'keypoints': keypoints_path})
+        self.checkpoint['next_frame'] = int(self.frame_indices[-1]) + 1
+        self.checkpoint['frames'] += len(self.frame_indices)
+        save_checkpoint(self.checkpoint_path, self.checkpoint)
+
+        self.frame_indices = []
+        self.keypoints = []
+
+
+def process_entry(job):
+    """
+    Worker: process (or resume) one video of the manifest
+    :param job: dict with the manifest entry, work_dir, backend and segment_frames
+    :return: throughput report of the video
+    """
+    entry = job['entry']
+    video_dir = video_work_dir(job['work_dir'], entry['input'])
+    os.makedirs(video_dir, exist_ok=True)
+    checkpoint_path = os.path.join(video_dir, 'checkpoint.json')
+    checkpoint = load_checkpoint(checkpoint_path, entry)
+
+    report = {'input': entry['input'], 'resumed_from': checkpoint['next_frame'], 'frames': 0, 'seconds': 0.0,
+              'fps': 0.0, 'done': checkpoint['done']}
+    if checkpoint['done']:
+        return report
+
+    # the backend loaded by sharded_runner.init_worker, shared by all the videos of the worker
+    process_video = sharded_runner.worker_process_video(job['backend'])
+
+    cap = cv2.VideoCapture(entry['input'])
+    opened = cap.isOpened()
+    fps = cap.get(cv2.CAP_PROP_FPS) or 20.0
+    cap.release()
+    if not opened:
+        raise IOError('Could not read the video ' + entry['input'])
+    writer = SegmentWriter(video_dir, checkpoint_path, checkpoint, job['segment_frames'], fps)
+    frames_before = checkpoint['frames']
+    start = time.perf_counter()
+    try:
+        process_video.process_video(entry['input'], None, starting_frame=checkpoint['next_frame'],
+                                    on_frame=writer.write, **entry.get('options', {}))
+    finally:
+        # keep what was completed even if the video failed half way
+        writer.commit()
+
+    elapsed = time.perf_counter() - start
+    if not checkpoint['segments']:
+        # not marked done, the video is tried again on the next run
+        raise IOError('No frame processed in ' + entry['input'])
+    sharded_runner.stitch_videos([s['video'] for s in checkpoint['segments']], entry['output'])
+    if entry.get('keypoints'):
+        sharded_runner.merge_keypoints([s['keypoints'] for s in checkpoint['segments']], entry['keypoints'])
+    checkpoint['done'] = True
+    save_checkpoint(checkpoint_path, checkpoint)
+
+    report['frames'] = checkpoint['frames'] - frames_before
+    report['seconds'] = elapsed
+    report['fps'] = report['frames'] / elapsed if elapsed > 0 else 0.0
+    report['done'] = True
+    return report
+
+
+def safe_process_entry(job):
+    """
+    process_entry reporting the failure of a video instead of stopping the whole batch, the video resumes from its
+    checkpoint on the next run
+    """
+    try:
+        return process_entry(job)
+    except Exception as e:
+        return {'input': job['entry']['input'], 'error': repr(e), 'done': False}
+
+
+def run_batch(manifest, work_dir, num_workers=1, backend=None, segment_frames=50):
+    """
+    Process all the videos of a manifest on a pool of worker processes, resuming the ones interrupted before
+    :param manifest: list of entries or path of a manifest file, see load_manifest
+    :param work_dir: directory holding the checkpoints and the completed segments of every video
+    :param num_workers: number of videos processed at the same time
+    :param backend: pose_backend.create_backend arguments (e.g. {'name': 'synthetic'}), None for openpose
+    :param segment_frames: frames between two checkpoints
+    :return: list of per video reports (frames processed, seconds, fps)
+    """
+    if not isinstance(manifest, list):
+        manifest = load_manifest(manifest)
+    os.makedirs(work_dir, exist_ok=True)
+
+    jobs = [{'entry': entry, 'work_dir': work_dir, 'backend': backend, 'segment_frames': segment_frames}
+            for entry in manifest]
+    with sharded_runner.worker_pool(min(num_workers, len(jobs)), backend) as pool:
+        reports = []
+        for report in pool.imap(safe_process_entry, jobs):
+            if 'error' in report:
+                print('Failed ' + report['input'] + ':: ' + report['error'])
+            else:
+                print('Processed ' + report['input'] + ':: ' + str(report['frames']) + ' frames from frame '
+                      + str(report['resumed_from']) + ' at ' + '%.2f' % report['fps'] + ' fps')
+            reports.append(report)
+    return reports
+
+
+if __name__ == '__main__':
+    run_batch('resources/videos/manifest.jsonl', 'resources/output/batch', num_workers=2)
@@ -0,0 +1,272 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+import detections
+import frame_pool
+import ground_detection
+import overlay
+import pose_backend
+import process_video
+
+RESOLUTIONS = [(640, 360), (1280, 720), (1920, 1080)]
+PERSON_COUNTS = [1, 4, 10]
+
+
+def synthetic_frame(width, height, seed=0):
+    """
+    Pitch like frame: sky, noisy green ground, a white goal and a pitch line
+    """
+    rng = np.random.default_rng(seed)
+    frame = np.empty((height, width, 3), np.uint8)
+    frame[:] = (40, 140, 40)
+    frame[:height // 4] = (120, 110, 100)
+    frame = cv2.add(frame, rng.integers(0, 20, frame.shape, np.uint8))
+    x, y, x2, y2 = width // 4, height // 3, 3 * width // 4, 3 * height // 4
+    thickness = max(2, width // 160)
+    cv2.line(frame, (x, y), (x2, y), (240, 240, 240), thickness)
+    cv2.line(frame, (x, y), (x, y2), (240, 240, 240), thickness)
+    cv2.line(frame, (x2, y), (x2, y2), (240, 240, 240), thickness)
+    cv2.line(frame, (0, 5 * height // 6), (width, 5 * height // 6), (230, 230, 230), thickness)
+    return frame
+
+
+def load_frame(image_path, width, height):
+    """
+    Recorded input, resized to the benchmarked resolution
+    """
+    image = cv2.imread(image_path)
+    if image is None:
+        raise ValueError('Could not read image: ' + image_path)
+    return cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+
+
+def time_call(fn, repeats, warmup=1):
+    """
+    :return: list of the durations of the calls in seconds
+    """
+    for _ in range(warmup):
+        fn()
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def summarize(stage, width, height, people, durations):
+    ms = np.array(durations) * 1000.0
+    return {'stage': stage,
+            'resolution': str(width) + 'x' + str(height),
+            'people': people,
+            'repeats': len(durations),
+            'mean_ms': float(ms.mean()),
+            'median_ms': float(np.median(ms)),
+            'min_ms': float(ms.min()),
+            'max_ms': float(ms.max())}
+
+
+def bench_frame_stages(frame, keypoints, repeats):
+    """
+    :return: {stage: durations} of the per frame stages
+    """
+    durations = {}
+    durations['generate_ground_mask'] = time_call(lambda: ground_detection.generate_ground_mask(frame), repeats)
+    durations['filter_ground_in_frame'] = time_call(lambda: ground_detection.filter_ground_in_frame(frame), repeats)
+    durations['detect_goalpost_box'] = time_call(lambda: ground_detection.detect_goalpost_box(frame), repeats)
+    durations['get_body_bound'] = time_call(lambda: [process_video.get_body_bound(kp) for kp in keypoints], repeats)
+    durations['identify_keypoints'] = time_call(lambda: process_video.identify_keypoints(frame, keypoints, True),
+                                                repeats)
+    durations['draw_image_bound'] = time_call(
+        lambda: [process_video.draw_image_bound(frame, kp, 'Referee') for kp in keypoints], repeats)
+    durations['classify_frame'] = time_call(
+        lambda: process_video.classify_frame(frame, detections.FrameDetections(keypoints)), repeats)
+    classification = process_video.classify_frame(frame, keypoints)
+    for detail in [overlay.DETAIL_BOXES, overlay.DETAIL_LABELS, overlay.DETAIL_SKELETON]:
+        durations['render_overlay_' + detail] = time_call(
+            lambda: overlay.render_overlay(frame, classification['roles'], classification['bounds'], keypoints,
+                                           detail), repeats)
+    return durations
+
+
+def bench_video_io(frame, num_frames, work_dir):
+    """
+    Encode num_frames copies of the frame to an mp4, then decode them back
+    :return: per frame durations of the encode and the decode
+    """
+    h, w = frame.shape[:2]
+    path = os.path.join(work_dir, 'bench-' + str(w) + 'x' + str(h) + '.mp4')
+    out_vid = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), 20.0, (w, h))
+    encode = []
+    for _ in range(num_frames):
+        start = time.perf_counter()
+        out_vid.write(frame)
+        encode.append(time.perf_counter() - start)
+    out_vid.release()
+
+    cap = cv2.VideoCapture(path)
+    decode = []
+    while True:
+        start = time.perf_counter()
+        hasframe, _ = cap.read()
+        if not hasframe:
+            break
+        decode.append(time.perf_counter() - start)
+    cap.release()
+    return encode, decode
+
+
+def run_benchmark(resolutions=RESOLUTIONS, person_counts=PERSON_COUNTS, repeats=20, video_frames=30,
+                  image_path=None):
+    """
+    Time every stage separately at every resolution and person count. Pose estimation is left out, the keypoints
+    come from pose_backend.SyntheticPoseBackend so that no OpenPose build is needed.
+    :param image_path: recorded frame to use instead of the synthetic one
+    :return: dict with the environment and one result per stage, resolution and person count
+    """
+    results = []
+    work_dir = tempfile.mkdtemp(prefix='bench-')
+    try:
+        for width, height in resolutions:
+            if image_path is not None:
+                frame = load_frame(image_path, width, height)
+            else:
+                frame = synthetic_frame(width, height)
+
+            encode, decode = bench_video_io(frame, video_frames, work_dir)
+            results.append(summarize('video_encode', width, height, 0, encode))
+            results.append(summarize('video_decode', width, height, 0, decode))
+
+            for people in person_counts:
+                keypoints = pose_backend.SyntheticPoseBackend(num_people=people).generate(frame)
+                for stage, durations in bench_frame_stages(frame, keypoints, repeats).items():
+                    results.append(summarize(stage, width, height, people, durations))
+                print('Benchmarked ' + str(width) + 'x' + str(height) + ' with ' + str(people) + ' people')
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {'environment': {'date': datetime.now().isoformat(),
+                            'python': platform.python_version(),
+                            'numpy': np.__version__,
+                            'opencv': cv2.__version__,
+                            'machine': platform.machine(),
+                            'processor': platform.processor()},
+            'results': results}
+
+
+def bench_allocations(vid_path, warmup=5, mask_mode=ground_detection.MASK_EXACT, mask_cache=None):
+    """
+    Transient memory per frame of the serial per frame path of process_video (decode, mask, pose, annotate), with
+    and without a frame_pool.FramePool, see frame_pool.AllocationMeter. Every frame is dropped before the next one
+    starts, so whatever it allocates shows up. Uses the synthetic pose backend.
+    :param warmup: first frames left out of the stats
+    :param mask_cache: ground_detection.GroundMaskCache, reset before each run
+    :return: {'unpooled': stats, 'pooled': stats}, transient memory in bytes and in frames
+    """
+    process_video.set_pose_backend(pose_backend.SyntheticPoseBackend())
+    stats = {}
+    for name, pool in [('unpooled', None), ('pooled', frame_pool.FramePool())]:
+        if mask_cache is not None:
+            mask_cache.reset()
+        mask_stage, pose_stage, annotate_stage = process_video.make_frame_stages(mask_mode, mask_cache,
+                                                                                 frame_pool=pool)
+        cap = cv2.VideoCapture(vid_path)
+        frame_bytes = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) * int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) * 3
+        meter = frame_pool.AllocationMeter()
+        meter.start()
+        try:
+            for count, frame in process_video.read_frames(cap, frame_pool=pool):
+                task = annotate_stage(pose_stage([mask_stage({'count': count, 'frame': frame,
+                                                              'buffers': [frame]})])[0])
+                if pool is not None:
+                    process_video.GOAL_POST_CACHE.forget(frame)
+                    for buf in task['buffers']:
+                        pool.release(buf)
+                del task, frame
+                meter.frame_done()
+        finally:
+            meter.stop()
+            cap.release()
+        stats[name] = meter.stats(warmup, frame_bytes)
+    return stats
+
+
+def result_key(result):
+    return result['stage'], result['resolution'], result['people']
+
+
+def compare(report, baseline, tolerance=0.2):
+    """
+    :param tolerance: relative slowdown of the median above which a stage is reported
+    :return: list of (stage, resolution, people, baseline ms, current ms) of the regressed stages
+    """
+    previous = dict((result_key(r), r) for r in baseline['results'])
+    regressions = []
+    for result in report['results']:
+        before = previous.get(result_key(result))
+        if before is not None and result['median_ms'] > before['median_ms'] * (1.0 + tolerance):
+            regressions.append(result_key(result) + (before['median_ms'], result['median_ms']))
+    return regressions
+
+
+def print_report(report):
+    print('%-24s %-10s %6s %10s %10s' % ('stage', 'resolution', 'people', 'median ms', 'min ms'))
+    for r in report['results']:
+        print('%-24s %-10s %6d %10.3f %10.3f' % (r['stage'], r['resolution'], r['people'], r['median_ms'],
+                                                 r['min_ms']))
+
+
+def parse_resolution(value):
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Per stage benchmark of the frame processing')
+    parser.add_argument('--resolutions', default=','.join(str(w) + 'x' + str(h) for w, h in RESOLUTIONS),
+                        help='comma separated WIDTHxHEIGHT list')
+    parser.add_argument('--people', default=','.join(str(p) for p in PERSON_COUNTS),
+                        help='comma separated person counts')
+    parser.add_argument('--repeats', type=int, default=20, help='timed calls per stage')
+    parser.add_argument('--video-frames', type=int, default=30, help='frames encoded and decoded per resolution')
+    parser.add_argument('--image', default=None, help='recorded frame to use instead of a synthetic one')
+    parser.add_argument('--output', default=None, help='JSON file receiving the results')
+    parser.add_argument('--baseline', default=None, help='JSON results of a previous run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='relative slowdown reported as a regression')
+    parser.add_argument('--allocations', default=None, help='video to measure the per frame allocations on')
+    args = parser.parse_args(argv)
+
+    report = run_benchmark([parse_resolution(r) for r in args.resolutions.split(',')],
+                           [int(p) for p in args.people.split(',')], args.repeats, args.video_frames, args.image)
+    print_report(report)
+    if args.allocations is not None:
+        report['allocations'] = bench_allocations(args.allocations)
+        for name, stats in report['allocations'].items():
+            print('Transient memory per frame, ' + name + ':: mean %.2f frames, max %.2f frames'
+                  % (stats['mean_frames'], stats['max_frames']))
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for stage, resolution, people, before, after in regressions:
+            print('Regression:: ' + stage + ' ' + resolution + ' ' + str(people) + ' people: '
+                  + '%.3f ms -> %.3f ms' % (before, after))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
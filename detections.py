@@ -0,0 +1,133 @@
+import numpy as np
+
+NUM_BODY_PARTS = 25
+
+# BODY_25 joints, refer to https://github.com/stuartcrobinson/andre_aigassi/blob/a549c84ffbcf7510d9e0b4c0886d07254855077a/brownlee_maskrcnn/ex4.py
+JOINT_NAMES = ["Nose", "Neck", "RShoulder", "RElbow", "RWrist", "LShoulder", "LElbow", "LWrist", "MidHip", "RHip",
+               "RKnee", "RAnkle", "LHip", "LKnee", "LAnkle", "REye", "LEye", "REar", "LEar", "LBigToe", "LSmallToe",
+               "LHeel", "RBigToe", "RSmallToe", "RHeel"]
+JOINT_INDEX = dict((name, i) for i, name in enumerate(JOINT_NAMES))
+
+(NOSE, NECK, R_SHOULDER, R_ELBOW, R_WRIST, L_SHOULDER, L_ELBOW, L_WRIST, MID_HIP, R_HIP, R_KNEE, R_ANKLE, L_HIP,
+ L_KNEE, L_ANKLE, R_EYE, L_EYE, R_EAR, L_EAR, L_BIG_TOE, L_SMALL_TOE, L_HEEL, R_BIG_TOE, R_SMALL_TOE,
+ R_HEEL) = range(NUM_BODY_PARTS)
+
+# joints which have to be detected for a body to be considered for a role
+REQUIRED_JOINTS = np.array([NECK, L_HIP, R_HIP, L_KNEE, R_KNEE, L_ANKLE, R_ANKLE])
+
+BOUND_PADDING = 5
+
+
+def find_non_zero_min(a):
+    """
+    :return: smallest non zero value of a along the last axis, 0.0 where all the values are zero
+    """
+    a = np.asarray(a)
+    res = np.where(a != 0, a, np.inf).min(axis=-1)
+    return np.where(np.isinf(res), 0.0, res).astype(a.dtype)
+
+
+def body_bounds(keypoints, padding=BOUND_PADDING):
+    """
+    Corners of all the bodies in one masked reduction, undetected joints (0,0) are ignored for the minimum.
+    :param keypoints: (N,25,3) body keypoints of a frame, or (F,N,25,3) keypoints of a clip
+    :return: (N,4), or (F,N,4), array of [min_x, min_y, max_x, max_y] with padding
+    """
+    keypoints = np.asarray(keypoints)
+    # (..., 2, 25): one row of coordinates per axis
+    coords = np.swapaxes(keypoints[..., :2], -1, -2)
+    bounds = np.empty(keypoints.shape[:-2] + (4,), coords.dtype)
+    bounds[..., :2] = find_non_zero_min(coords) - padding
+    bounds[..., 2:] = coords.max(axis=-1) + padding
+    return bounds
+
+
+class FrameDetections:
+    """
+    The bodies detected in a frame as one contiguous (N,25,3) float32 array, with the per body fields the
+    classification and the drawing need (bounds, validity, hip width...) computed once, on first use. Build it once
+    per frame and hand it around instead of the keypoint array.
+    """
+
+    def __init__(self, keypoints):
+        """
+        :param keypoints: (N,25,3) body keypoints, anything else (e.g. openpose's 0-d array) is no body
+        """
+        keypoints = np.asarray(keypoints if keypoints is not None else [], np.float32)
+        if keypoints.ndim != 3:
+            keypoints = np.zeros((0, NUM_BODY_PARTS, 3), np.float32)
+        self.keypoints = np.ascontiguousarray(keypoints)
+        self._bounds = None
+        self._valid = None
+        self._hip_width = None
+        self._centers = None
+
+    def __len__(self):
+        return len(self.keypoints)
+
+    def __getitem__(self, index):
+        return self.keypoints[index]
+
+    def __array__(self, dtype=None, copy=None):
+        return self.keypoints if dtype is None else self.keypoints.astype(dtype)
+
+    def joint(self, joint):
+        """
+        :return: (N,3) x, y and confidence of a joint of every body
+        """
+        return self.keypoints[:, joint]
+
+    @property
+    def bounds(self):
+        """
+        (N,4) [x,y,x2,y2] of every body, see body_bounds
+        """
+        if self._bounds is None:
+            self._bounds = body_bounds(self.keypoints)
+        return self._bounds
+
+    @property
+    def valid(self):
+        """
+        (N,) whether all the REQUIRED_JOINTS of a body are detected
+        """
+        if self._valid is None:
+            self._valid = (self.keypoints[:, REQUIRED_JOINTS, 2] != 0).all(axis=1)
+        return self._valid
+
+    @property
+    def hip_width(self):
+        """
+        (N,) horizontal distance between the hips, small when the body is seen sideways
+        """
+        if self._hip_width is None:
+            self._hip_width = np.abs(self.keypoints[:, L_HIP, 0] - self.keypoints[:, R_HIP, 0])
+        return self._hip_width
+
+    @property
+    def centers(self):
+        """
+        (N,2) middle of the bounds of every body
+        """
+        if self._centers is None:
+            bounds = self.bounds
+            self._centers = np.stack([(bounds[:, 0] + bounds[:, 2]) / 2, (bounds[:, 1] + bounds[:, 3]) / 2], axis=1)
+        return self._centers
+
+    def neck_between_hips(self):
+        """
+        :return: (N,) whether the neck is horizontally between the hips, i.e. the body faces the camera
+        """
+        neck_x = self.keypoints[:, NECK, 0]
+        lhip_x = self.keypoints[:, L_HIP, 0]
+        rhip_x = self.keypoints[:, R_HIP, 0]
+        return (np.minimum(lhip_x, rhip_x) < neck_x) & (neck_x < np.maximum(lhip_x, rhip_x))
+
+
+def as_detections(keypoints):
+    """
+    :return: keypoints as FrameDetections, itself if it already is
+    """
+    if isinstance(keypoints, FrameDetections):
+        return keypoints
+    return FrameDetections(keypoints)
@@ -0,0 +1,89 @@
+import threading
+import tracemalloc
+
+import numpy as np
+
+
+class FramePool:
+    """
+    Recycles the full frame buffers of the per frame path (decoded frame, masked frame, openpose rendering) so that
+    a video of constant size stops allocating once as many buffers as there are frames in flight exist.
+    Thread safe, buffers can be acquired in one pipeline stage and released in another.
+    """
+
+    def __init__(self):
+        self.free = {}
+        self.lock = threading.Lock()
+        self.allocations = 0
+        self.reuses = 0
+
+    def acquire(self, shape, dtype=np.uint8):
+        """
+        :return: uninitialized buffer, a released one if there is one of this shape and dtype
+        """
+        key = (tuple(shape), np.dtype(dtype).str)
+        with self.lock:
+            buffers = self.free.get(key)
+            if buffers:
+                self.reuses += 1
+                return buffers.pop()
+            self.allocations += 1
+        return np.empty(shape, dtype)
+
+    def release(self, buf):
+        """
+        Give a buffer back, it must not be used by the caller afterwards
+        """
+        key = (buf.shape, buf.dtype.str)
+        with self.lock:
+            self.free.setdefault(key, []).append(buf)
+
+    def stats(self):
+        with self.lock:
+            return {'allocations': self.allocations,
+                    'reuses': self.reuses,
+                    'free': sum(len(buffers) for buffers in self.free.values())}
+
+
+class AllocationMeter:
+    """
+    Measures with tracemalloc the transient memory of every frame, i.e. the peak memory reached while processing it
+    above what was allocated when it started. A frame allocating (and freeing) a full frame buffer shows up as at
+    least the size of that frame. Call frame_done at the end of every frame, e.g. from process_video's on_frame.
+    """
+
+    def __init__(self):
+        self.transient = []
+        self.baseline = 0
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.mark()
+
+    def mark(self):
+        tracemalloc.reset_peak()
+        self.baseline = tracemalloc.get_traced_memory()[0]
+
+    def frame_done(self, task=None):
+        peak = tracemalloc.get_traced_memory()[1]
+        self.transient.append(max(0, peak - self.baseline))
+        self.mark()
+
+    def stop(self):
+        tracemalloc.stop()
+
+    def stats(self, skip=0, frame_bytes=None):
+        """
+        :param skip: first frames left out (warm up, e.g. the pool filling up)
+        :param frame_bytes: size of a full frame, to express the transient memory in frames
+        :return: mean and max transient bytes per frame
+        """
+        transient = np.array(self.transient[skip:], np.float64)
+        stats = {'frames': len(transient),
+                 'mean_bytes': float(transient.mean()) if len(transient) else 0.0,
+                 'max_bytes': float(transient.max()) if len(transient) else 0.0}
+        if frame_bytes:
+            stats['mean_frames'] = stats['mean_bytes'] / frame_bytes
+            stats['max_frames'] = stats['max_bytes'] / frame_bytes
+        return stats
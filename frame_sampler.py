@@ -0,0 +1,121 @@
+import cv2
+
+import ground_detection
+
+# frames are classified on a thumbnail of this size
+SAMPLE_SIZE = (64, 36)
+
+LABEL_NON_PITCH = 'non_pitch'
+LABEL_STATIC = 'static'
+LABEL_ACTIVE = 'active'
+
+
+def green_fraction(small):
+    """
+    :param small: BGR thumbnail
+    :return: fraction of the pixels within the ground color range
+    """
+    hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+    return cv2.countNonZero(cv2.inRange(hsv, ground_detection.LOW_GREEN, ground_detection.HIGH_GREEN)) \
+        / float(small.shape[0] * small.shape[1])
+
+
+def motion_energy(gray, prev_gray):
+    """
+    :return: mean absolute difference of two grayscale thumbnails, in gray levels
+    """
+    if prev_gray is None:
+        return 0.0
+    return float(cv2.mean(cv2.absdiff(gray, prev_gray))[0])
+
+
+def thumbnail(frame, size=SAMPLE_SIZE):
+    """
+    :return: BGR and grayscale thumbnails of the frame
+    """
+    small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    return small, cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+
+class FrameSampler:
+    """
+    Picks the frames worth a pose inference from cheap signals of the decoded frame:
+    - non pitch (crowd close-ups, studio, graphics): less than min_green of the frame is ground colored, skipped
+    - pitch, static (nothing moving, e.g. the players waiting): processed every static_stride frames
+    - pitch, active: processed every active_stride frames
+    The classification of consecutive frames is kept as spans, see report.
+    """
+
+    def __init__(self, min_green=0.35, motion_threshold=2.0, active_stride=1, static_stride=5, size=SAMPLE_SIZE):
+        """
+        :param min_green: green fraction below which a frame isn't a view of the pitch
+        :param motion_threshold: motion_energy above which a pitch frame is active
+        :param active_stride: process every nth active frame
+        :param static_stride: process every nth static frame, 0 to skip them all
+        :param size: thumbnail size the signals are computed on
+        """
+        self.min_green = min_green
+        self.motion_threshold = motion_threshold
+        self.active_stride = active_stride
+        self.static_stride = static_stride
+        self.size = size
+        self.reset()
+
+    def reset(self):
+        self.prev_gray = None
+        self.spans = []
+
+    def classify(self, frame):
+        """
+        :return: label, green fraction and motion energy of the frame
+        """
+        small, gray = thumbnail(frame, self.size)
+        green = green_fraction(small)
+        motion = motion_energy(gray, self.prev_gray)
+        self.prev_gray = gray
+        if green < self.min_green:
+            return LABEL_NON_PITCH, green, motion
+        if motion < self.motion_threshold:
+            return LABEL_STATIC, green, motion
+        return LABEL_ACTIVE, green, motion
+
+    def stride(self, label):
+        if label == LABEL_ACTIVE:
+            return self.active_stride
+        if label == LABEL_STATIC:
+            return self.static_stride
+        return 0
+
+    def should_process(self, count, frame):
+        """
+        :param count: frame index, frames are expected in increasing order
+        :return: whether the frame is to go through pose inference
+        """
+        label, _, _ = self.classify(frame)
+        span = self.spans[-1] if self.spans else None
+        if span is None or span['label'] != label:
+            span = {'label': label, 'start': count, 'end': count, 'frames': 0, 'processed': 0}
+            self.spans.append(span)
+
+        stride = self.stride(label)
+        # the first frame of a span is always processed (when the label is), then one every stride frames
+        process = stride > 0 and span['frames'] % stride == 0
+        span['end'] = count + 1
+        span['frames'] += 1
+        if process:
+            span['processed'] += 1
+        return process
+
+    def skipped_spans(self):
+        """
+        :return: list of the spans where no frame was processed
+        """
+        return [span for span in self.spans if span['processed'] == 0]
+
+    def report(self):
+        frames = sum(span['frames'] for span in self.spans)
+        processed = sum(span['processed'] for span in self.spans)
+        return {'frames': frames,
+                'processed': processed,
+                'skipped': frames - processed,
+                'spans': self.spans}
@@ -7,61 +7,275 @@
 #
 
 # import the necessary packages
+import logging
 import sys
+import time
 import traceback
 
 import cv2
 import numpy as np
-import matplotlib.pyplot as plt
+
+logger = logging.getLogger(__name__)
 
 try:
 
-    def generate_ground_mask(image):
-        # convert to HSV image
-        hsv_img = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    # Green color
+    LOW_GREEN = np.array([25, 52, 72])
+    HIGH_GREEN = np.array([102, 255, 255])
+
+    # (kernel size, iterations) of the erosion and the dilation cleaning the green mask
+    EROSION = (4, 20)
+    DILATION = (10, 28)
+
+    # exact: the iterated erosion and dilation
+    # downscaled: one erosion and one dilation with the equivalent scaled kernels on a frame resized by
+    # DOWNSCALED_MASK_SCALE, the mask is upsampled back
+    # (at full scale the equivalent kernels give the exact mask at the same cost, opencv already merges the
+    # iterations of a rectangular kernel)
+    MASK_EXACT = 'exact'
+    MASK_DOWNSCALED = 'downscaled'
+    DOWNSCALED_MASK_SCALE = 0.25
+
+
+    def generate_green_mask(image, pool=None):
+        """
+        :param pool: frame_pool.FramePool providing the HSV image and the mask, the mask is the caller's to release
+        """
+        if pool is None:
+            # convert to HSV image
+            hsv_img = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+            green_mask = cv2.inRange(hsv_img, LOW_GREEN, HIGH_GREEN)
+            # green_img = cv2.bitwise_and(img, img, mask=green_mask)
+            return green_mask
+        hsv_img = cv2.cvtColor(image, cv2.COLOR_BGR2HSV, dst=pool.acquire(image.shape))
+        green_mask = cv2.inRange(hsv_img, LOW_GREEN, HIGH_GREEN, dst=pool.acquire(image.shape[:2]))
+        pool.release(hsv_img)
+        return green_mask
+
+
+    def equivalent_kernel(kernel_size, iterations, scale):
+        """
+        n iterations with a k x k kernel are the same as one pass with a (n*(k-1)+1) x (n*(k-1)+1) kernel, the anchor
+        moving by n times the default one (which is not centered for even kernels)
+        :param scale: scale the kernel for an image resized by scale
+        :return: kernel and its anchor
+        """
+        size = iterations * (kernel_size - 1) + 1
+        anchor = iterations * (kernel_size // 2)
+        if scale != 1.0:
+            size = max(1, int(round(size * scale)))
+            anchor = min(size - 1, int(round(anchor * scale)))
+        return np.ones((size, size), np.uint8), (anchor, anchor)
 
-        # Green color
-        low_green = np.array([25, 52, 72])
-        high_green = np.array([102, 255, 255])
-        green_mask = cv2.inRange(hsv_img, low_green, high_green)
-        # green_img = cv2.bitwise_and(img, img, mask=green_mask)
+
+    def clean_green_mask(green_mask, scale):
+        er_kernel, er_anchor = equivalent_kernel(EROSION[0], EROSION[1], scale)
+        erosions = cv2.erode(green_mask, er_kernel, anchor=er_anchor)
+        dil_kernel, dil_anchor = equivalent_kernel(DILATION[0], DILATION[1], scale)
+        return cv2.dilate(erosions, dil_kernel, anchor=dil_anchor)
+
+
+    def generate_ground_mask(image, mode=MASK_EXACT, scale=DOWNSCALED_MASK_SCALE, pool=None):
+        """
+        :param image: BGR image
+        :param mode: MASK_EXACT or MASK_DOWNSCALED
+        :param scale: resize factor used by MASK_DOWNSCALED
+        :param pool: frame_pool.FramePool providing the full size scratch buffers and the mask, the mask is the
+        caller's to release
+        :return: ground mask with the size of the image
+        """
+        h, w = image.shape[:2]
+        if mode == MASK_DOWNSCALED:
+            small = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            mask = clean_green_mask(generate_green_mask(small), scale)
+            dst = pool.acquire((h, w)) if pool is not None else None
+            return cv2.resize(mask, (w, h), dst=dst, interpolation=cv2.INTER_NEAREST)
+
+        if mode != MASK_EXACT:
+            raise ValueError('Unknown ground mask mode: ' + str(mode))
+        green_mask = generate_green_mask(image, pool)
+        erosions = pool.acquire((h, w)) if pool is not None else None
 
         # Erosion
-        er_kernel = np.ones((4, 4), np.uint8)
-        erosions = cv2.erode(green_mask, er_kernel, iterations=20)
+        er_kernel = np.ones((EROSION[0], EROSION[0]), np.uint8)
+        erosions = cv2.erode(green_mask, er_kernel, dst=erosions, iterations=EROSION[1])
 
-        # Dilation
-        dil_kernel = np.ones((10, 10), np.uint8)
-        dilation = cv2.dilate(erosions, dil_kernel, iterations=28)
+        # Dilation, into the green mask buffer which is not needed anymore
+        dil_kernel = np.ones((DILATION[0], DILATION[0]), np.uint8)
+        dilation = cv2.dilate(erosions, dil_kernel, dst=green_mask if pool is not None else None,
+                              iterations=DILATION[1])
+        if pool is not None:
+            pool.release(erosions)
         return dilation
 
 
-    def filter_ground_in_frame(frame):
-        ground_mask = generate_ground_mask(frame)
-        masked_image = cv2.bitwise_and(frame, frame, mask=ground_mask).copy()
+    def mask_iou(mask, reference):
+        """
+        Intersection over union of two masks, 1.0 if both are empty
+        """
+        a = mask > 0
+        b = reference > 0
+        union = np.count_nonzero(a | b)
+        if union == 0:
+            return 1.0
+        return np.count_nonzero(a & b) / union
+
+
+    def evaluate_mask_mode(frames, mode, scale=DOWNSCALED_MASK_SCALE):
+        """
+        Accuracy and speed of a mask mode compared to MASK_EXACT, to choose the trade-off for a deployment
+        :param frames: sample frames of the videos to process
+        :return: dict with the mean and min IoU against the exact mask and the mean time per frame of both modes
+        """
+        ious = []
+        exact_time = mode_time = 0.0
+        for frame in frames:
+            start = time.perf_counter()
+            reference = generate_ground_mask(frame, MASK_EXACT)
+            exact_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            mask = generate_ground_mask(frame, mode, scale)
+            mode_time += time.perf_counter() - start
+
+            ious.append(mask_iou(mask, reference))
+
+        n = max(len(frames), 1)
+        return {'mode': mode,
+                'scale': scale,
+                'mean_iou': float(np.mean(ious)) if ious else 1.0,
+                'min_iou': float(np.min(ious)) if ious else 1.0,
+                'exact_time': exact_time / n,
+                'mode_time': mode_time / n}
+
+
+    # size of the grayscale thumbnail compared to detect scene changes
+    SIGNATURE_SIZE = (32, 18)
+
+
+    def frame_signature(frame):
+        """
+        Cheap summary of a frame to detect camera cuts and movements
+        :return: small grayscale thumbnail as float32
+        """
+        # resized first, the gray conversion of the full frame would cost a frame sized allocation
+        small = cv2.resize(frame, SIGNATURE_SIZE, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.float32)
+
+
+    def signature_distance(signature, other):
+        """
+        :return: mean absolute difference of two frame signatures, in gray levels
+        """
+        return float(np.mean(np.abs(signature - other)))
+
+
+    class GroundMaskCache:
+        """
+        Reuses the ground mask across the frames of a static shot. The mask is recomputed when the frame drifts away
+        from the one it was computed on (camera cut or movement) or when it is max_age frames old.
+        """
+
+        def __init__(self, change_threshold=6.0, max_age=25, mode=MASK_EXACT):
+            """
+            :param change_threshold: signature_distance above which the scene is considered changed
+            :param max_age: recompute the mask at least every max_age frames, 0 to never force it
+            :param mode: mode used to compute the mask
+            """
+            self.change_threshold = change_threshold
+            self.max_age = max_age
+            self.mode = mode
+            self.hits = 0
+            self.misses = 0
+            self.reset()
+
+        def reset(self):
+            self.mask = None
+            self.signature = None
+            self.age = 0
+
+        def is_valid_for(self, frame, signature):
+            if self.mask is None or self.mask.shape != frame.shape[:2]:
+                return False
+            if self.max_age and self.age >= self.max_age:
+                return False
+            return signature_distance(signature, self.signature) <= self.change_threshold
+
+        def get_mask(self, frame):
+            signature = frame_signature(frame)
+            if self.is_valid_for(frame, signature):
+                self.hits += 1
+                self.age += 1
+                return self.mask
+
+            self.misses += 1
+            self.mask = generate_ground_mask(frame, self.mode)
+            self.signature = signature
+            self.age = 1
+            return self.mask
+
+        def stats(self):
+            total = self.hits + self.misses
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'hit_rate': self.hits / total if total else 0.0}
+
+
+    def filter_ground_in_frame(frame, mode=MASK_EXACT, mask_cache=None, return_mask=False, dst=None, pool=None):
+        """
+        :param mode: ground mask mode
+        :param mask_cache: GroundMaskCache to reuse the mask of the previous frames, its own mode is used
+        :param return_mask: also return the ground mask
+        :param dst: buffer of the frame shape receiving the masked frame, a new one is allocated otherwise
+        :param pool: frame_pool.FramePool providing the buffers of the mask computation. A returned mask computed
+        here comes from it and is the caller's to release.
+        :return: frame with everything but the ground blacked out
+        """
+        if mask_cache is not None:
+            ground_mask = mask_cache.get_mask(frame)
+        else:
+            ground_mask = generate_ground_mask(frame, mode, pool=pool)
+        if dst is not None:
+            # the masked out pixels are left untouched by bitwise_and when it writes to an existing buffer
+            dst.fill(0)
+        masked_image = cv2.bitwise_and(frame, frame, dst=dst, mask=ground_mask)
+        if return_mask:
+            return masked_image, ground_mask
+        if pool is not None and mask_cache is None:
+            pool.release(ground_mask)
         return masked_image
 
 
-    def filter_ground_in_video(vid_path, out_vid_path, f_height=720, f_width=1280, read_frame_rate=1, starting_frame=0,
-                               display=False):
+    def filter_ground_in_video(vid_path, out_vid_path, f_height=None, f_width=None, read_frame_rate=1, starting_frame=0,
+                               display=False, mode=MASK_EXACT, sampler=None):
+        """
+        :param f_height: height of the output video (and of the frames), the source height by default
+        :param f_width: width of the output video (and of the frames), the source width by default
+        :param sampler: frame_sampler.FrameSampler, only the frames it picks are masked and written
+        """
+        cap = cv2.VideoCapture(vid_path)
+        out_size = (f_width or int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), f_height or int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
         fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out_vid = cv2.VideoWriter(out_vid_path, fourcc, 20.0, (f_width, f_height))
+        out_vid = cv2.VideoWriter(out_vid_path, fourcc, cap.get(cv2.CAP_PROP_FPS) or 20.0, out_size)
 
-        cap = cv2.VideoCapture(vid_path)
         count = starting_frame
         cap.set(cv2.CAP_PROP_POS_FRAMES, count)
         while cap.isOpened():
             grab_success = cap.grab()
             if grab_success:
                 if count % read_frame_rate == 0:
-                    print('------- Frame ' + str(count) + ' ----------')
+                    logger.debug('------- Frame %d ----------', count)
                     hasframe, frame = cap.retrieve()
-                    if hasframe:
-                        out_image = filter_ground_in_frame(frame)
+                    if hasframe and sampler is not None and not sampler.should_process(count, frame):
+                        pass
+                    elif hasframe:
+                        out_image = filter_ground_in_frame(frame, mode)
                         if display:
                             cv2.imshow("Final Out Image: " + str(count), out_image)
                             cv2.waitKey(30)
                             cv2.destroyAllWindows()
+                        if out_image.shape[1::-1] != out_size:
+                            out_image = cv2.resize(out_image, out_size, interpolation=cv2.INTER_AREA)
                         out_vid.write(out_image)
                     else:
                         break
@@ -71,7 +285,142 @@ try:
         out_vid.release()
 
 
+    # goal post detection runs on frames downscaled to this width
+    GOALPOST_DETECTION_WIDTH = 480
+    # goal post frames are white: low saturation, high value
+    LOW_WHITE = np.array([0, 0, 160])
+    HIGH_WHITE = np.array([180, 70, 255])
+
+
+    def split_lines(lines, max_angle=15):
+        """
+        :param lines: (N,4) [x1,y1,x2,y2] lines from HoughLinesP
+        :return: horizontal lines ordered left to right and vertical lines ordered top to bottom, both (M,4)
+        """
+        dx = lines[:, 2] - lines[:, 0]
+        dy = lines[:, 3] - lines[:, 1]
+        tan = np.tan(np.radians(max_angle))
+        horizontal = lines[np.abs(dy) <= tan * np.abs(dx)]
+        vertical = lines[np.abs(dx) <= tan * np.abs(dy)]
+        flip = horizontal[:, 0] > horizontal[:, 2]
+        horizontal[flip] = horizontal[flip][:, [2, 3, 0, 1]]
+        flip = vertical[:, 1] > vertical[:, 3]
+        vertical[flip] = vertical[flip][:, [2, 3, 0, 1]]
+        return horizontal, vertical
+
+
+    def detect_goalpost_box(image, width=GOALPOST_DETECTION_WIDTH):
+        """
+        Headless goal post detection: Canny edges of the white parts of the frame, then HoughLinesP. The goal is the
+        longest horizontal line (the crossbar) with vertical lines (the posts) starting at one of its ends.
+        :param width: the frame is downscaled to this width first
+        :return: goal post top-left and opposite coordinates [x,y,x2,y2] in the frame, None if not found
+        """
+        h, w = image.shape[:2]
+        scale = min(1.0, width / float(w))
+        small = cv2.resize(image, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA) if scale < 1 \
+            else image
+        sh, sw = small.shape[:2]
+
+        hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+        white = cv2.dilate(cv2.inRange(hsv, LOW_WHITE, HIGH_WHITE), np.ones((3, 3), np.uint8))
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        edges = cv2.bitwise_and(cv2.Canny(gray, 50, 150, apertureSize=3), white)
+
+        min_length = max(10, sw // 25)
+        lines = cv2.HoughLinesP(edges, 1, np.pi / 180, min_length, minLineLength=min_length, maxLineGap=5)
+        if lines is None:
+            return None
+        horizontal, vertical = split_lines(lines.reshape(-1, 4).astype(np.int32))
+        if len(horizontal) == 0 or len(vertical) == 0:
+            return None
+
+        # posts start at the crossbar ends (within tol pixels) and go down
+        tol = max(4, sw // 60)
+        best, best_score = None, 0
+        for x1, y1, x2, y2 in horizontal:
+            bar_y = min(y1, y2)
+            at_bar = np.abs(vertical[:, 1] - bar_y) <= tol
+            at_left = at_bar & (np.abs(vertical[:, 0] - x1) <= tol)
+            at_right = at_bar & (np.abs(vertical[:, 0] - x2) <= tol)
+            posts = vertical[at_left | at_right]
+            if len(posts) == 0:
+                continue
+            score = (x2 - x1) + (posts[:, 3] - posts[:, 1]).max() * (at_left.any() + at_right.any())
+            if score > best_score:
+                bottom = posts[:, 3].max()
+                best, best_score = [min(x1, posts[:, 0].min()), bar_y, max(x2, posts[:, 0].max()), bottom], score
+
+        if best is None:
+            return None
+        return [int(round(c / scale)) for c in best]
+
+
+    class GoalPostCache:
+        """
+        Detects the goal post on the first frame of a shot and reuses the box until the scene changes (same signature
+        as GroundMaskCache). When the detection fails the previous box, or else the fallback, is used.
+        """
+
+        def __init__(self, change_threshold=12.0, fallback=None, width=GOALPOST_DETECTION_WIDTH):
+            """
+            :param change_threshold: signature_distance above which the goal post is detected again
+            :param fallback: [x,y,x2,y2] used until a goal post is detected
+            :param width: detection width, see detect_goalpost_box
+            """
+            self.change_threshold = change_threshold
+            self.fallback = fallback
+            self.width = width
+            self.detections = 0
+            self.failures = 0
+            self.hits = 0
+            self.reset()
+
+        def reset(self):
+            self.box = None
+            self.signature = None
+            self.frame = None
+
+        def forget(self, frame):
+            """
+            Drop the reference to the frame, to be called before its buffer is reused for another frame
+            """
+            if self.frame is frame:
+                self.frame = None
+
+        def get_box(self, frame):
+            # the same frame is usually asked for more than once (classification, drawing)
+            if frame is self.frame:
+                self.hits += 1
+                return self.current_box()
+            signature = frame_signature(frame)
+            self.frame = frame
+            if self.signature is not None and signature_distance(signature, self.signature) <= self.change_threshold:
+                self.hits += 1
+                return self.current_box()
+
+            self.signature = signature
+            self.detections += 1
+            box = detect_goalpost_box(frame, self.width)
+            if box is None:
+                self.failures += 1
+            else:
+                self.box = box
+            return self.current_box()
+
+        def current_box(self):
+            return self.box if self.box is not None else self.fallback
+
+        def stats(self):
+            return {'detections': self.detections,
+                    'failures': self.failures,
+                    'hits': self.hits}
+
+
     def detect_goalpost(image):
+        # debug plots only, matplotlib is slow to import
+        import matplotlib.pyplot as plt
+
         img = image.copy()
 
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
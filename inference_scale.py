@@ -0,0 +1,109 @@
+import cv2
+import numpy as np
+
+import ground_detection
+
+# inference scales the policy picks from, a few fixed ones so the backend sees a handful of input sizes
+SCALE_STEPS = (1.0, 0.75, 0.5, 0.35)
+
+
+def quantize_scale(scale, steps=SCALE_STEPS):
+    """
+    :return: the smallest step at or above scale, so players are never made smaller than asked
+    """
+    above = [step for step in steps if step >= scale]
+    return min(above) if above else max(steps)
+
+
+def resize_for_inference(image, scale):
+    if scale >= 1.0:
+        return image
+    return cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+
+def rescale_keypoints(keypoints, scale):
+    """
+    :param keypoints: (N,25,3) keypoints inferred on an image resized by scale
+    :return: keypoints in the coordinates of the source image, the undetected joints stay at 0
+    """
+    if scale == 1.0 or len(keypoints) == 0:
+        return keypoints
+    keypoints = np.array(keypoints, np.float32)
+    keypoints[..., :2] /= scale
+    return keypoints
+
+
+def rescale_rendered(rendered, shape, out=None):
+    """
+    :return: rendered image resized back to the source shape, into out when given
+    """
+    if rendered.shape[:2] == tuple(shape[:2]):
+        if out is not None:
+            np.copyto(out, rendered)
+            return out
+        return rendered
+    return cv2.resize(rendered, (shape[1], shape[0]), dst=out, interpolation=cv2.INTER_LINEAR)
+
+
+class InferenceScalePolicy:
+    """
+    Picks the resolution pose inference runs at from the apparent size of the players. The first frame of a shot
+    (scene change detected on the frame signature, as in ground_detection.GroundMaskCache) is inferred at full
+    resolution, then the frames are downscaled so that the median body height of the last inference is close to
+    target_height pixels. Close-ups with big players run at a fraction of the cost of the wide views.
+    """
+
+    def __init__(self, target_height=160, min_scale=0.35, change_threshold=12.0, steps=SCALE_STEPS):
+        """
+        :param target_height: body height in pixels openpose gets at the picked scale (it still finds smaller
+        bodies but the joints get less accurate)
+        :param min_scale: smallest scale picked
+        :param change_threshold: signature_distance above which a new shot starts
+        :param steps: the scales picked from
+        """
+        self.target_height = target_height
+        self.min_scale = min_scale
+        self.change_threshold = change_threshold
+        self.steps = tuple(sorted(steps, reverse=True))
+        self.reset()
+
+    def reset(self):
+        self.scale = 1.0
+        self.signature = None
+        self.shots = 0
+        self.frames_per_scale = {}
+
+    def describe(self):
+        return {'target_height': self.target_height,
+                'min_scale': self.min_scale,
+                'change_threshold': self.change_threshold,
+                'steps': list(self.steps)}
+
+    def scale_for(self, frame):
+        """
+        :return: scale to infer the frame at
+        """
+        signature = ground_detection.frame_signature(frame)
+        if self.signature is None or \
+                ground_detection.signature_distance(signature, self.signature) > self.change_threshold:
+            self.shots += 1
+            self.scale = max(self.steps)
+        self.signature = signature
+        self.frames_per_scale[self.scale] = self.frames_per_scale.get(self.scale, 0) + 1
+        return self.scale
+
+    def update(self, bounds):
+        """
+        :param bounds: (N,4) body bounds of the last inference, in source coordinates
+        """
+        if len(bounds) == 0:
+            # no player seen, keep looking at full resolution
+            self.scale = max(self.steps)
+            return
+        heights = np.asarray(bounds)[:, 3] - np.asarray(bounds)[:, 1]
+        wanted = self.target_height / max(float(np.median(heights)), 1.0)
+        self.scale = quantize_scale(min(1.0, max(self.min_scale, wanted)), self.steps)
+
+    def stats(self):
+        return {'shots': self.shots,
+                'frames_per_scale': dict(self.frames_per_scale)}
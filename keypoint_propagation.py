@@ -0,0 +1,85 @@
+import cv2
+import numpy as np
+
+
+class KeypointPropagator:
+    """
+    Runs pose inference only on keyframes and carries the keypoints of the previous frame forward with sparse
+    (Lucas-Kanade) optical flow in between. A keyframe is needed every keyframe_interval frames, or as soon as too
+    many joints are lost by the tracking.
+    """
+
+    def __init__(self, keyframe_interval=5, min_tracked_ratio=0.7, max_fb_error=2.0, win_size=21, max_level=3):
+        """
+        :param keyframe_interval: max frames between two pose inferences, 1 runs the inference on every frame
+        :param min_tracked_ratio: below this fraction of the detected joints still tracked, run the inference
+        :param max_fb_error: max forward-backward flow error in pixels for a joint to be considered tracked
+        :param win_size: optical flow search window
+        :param max_level: optical flow pyramid levels
+        """
+        self.keyframe_interval = keyframe_interval
+        self.min_tracked_ratio = min_tracked_ratio
+        self.max_fb_error = max_fb_error
+        self.lk_params = dict(winSize=(win_size, win_size), maxLevel=max_level,
+                              criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03))
+        self.keyframes = 0
+        self.propagated = 0
+        self.reset()
+
+    def reset(self):
+        self.prev_gray = None
+        self.keypoints = None
+        self.since_keyframe = 0
+
+    def keyframe(self, frame, keypoints, inferred=True):
+        """
+        Store the keypoints found by pose inference on frame
+        :param inferred: False for keypoints obtained otherwise (e.g. read from a keypoint store), not counted as a
+        keyframe
+        """
+        self.prev_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        self.keypoints = keypoints
+        self.since_keyframe = 0
+        if inferred:
+            self.keyframes += 1
+
+    def propagate(self, frame):
+        """
+        Move the keypoints of the previous frame onto frame
+        :return: (N,25,3) keypoints, or None if pose inference has to run on this frame
+        """
+        if self.prev_gray is None or self.since_keyframe + 1 >= self.keyframe_interval:
+            return None
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if gray.shape != self.prev_gray.shape:
+            return None
+
+        keypoints = self.keypoints.copy()
+        detected = keypoints[:, :, 2] > 0
+        if detected.any():
+            p0 = keypoints[detected][:, :2].astype(np.float32).reshape(-1, 1, 2)
+            p1, status, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, p0, None, **self.lk_params)
+            back, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, self.prev_gray, p1, None, **self.lk_params)
+            fb_error = np.linalg.norm((p0 - back).reshape(-1, 2), axis=1)
+            tracked = (status.ravel() == 1) & (back_status.ravel() == 1) & (fb_error < self.max_fb_error)
+
+            if np.count_nonzero(tracked) < self.min_tracked_ratio * len(tracked):
+                return None
+
+            moved = keypoints[detected]
+            moved[:, :2] = p1.reshape(-1, 2)
+            # lost joints are reported like openpose reports undetected ones
+            moved[~tracked] = 0.0
+            keypoints[detected] = moved
+
+        self.prev_gray = gray
+        self.keypoints = keypoints
+        self.since_keyframe += 1
+        self.propagated += 1
+        return keypoints
+
+    def stats(self):
+        total = self.keyframes + self.propagated
+        return {'keyframes': self.keyframes,
+                'propagated': self.propagated,
+                'inference_ratio': self.keyframes / total if total else 0.0}
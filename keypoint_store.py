@@ -0,0 +1,155 @@
+import glob
+import hashlib
+import json
+import os
+import time
+import uuid
+
+import numpy as np
+
+from detections import NUM_BODY_PARTS
+
+KEYPOINTS_EXT = '.f32'
+INDEX_EXT = '.index.npy'
+META_FILE = 'meta.json'
+
+
+def video_content_hash(vid_path, chunk_size=1 << 20):
+    """
+    :return: sha1 of the video file content, so that a renamed or copied video still hits the store
+    """
+    sha1 = hashlib.sha1()
+    with open(vid_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def store_key(content_hash, pose_params):
+    """
+    :param content_hash: video_content_hash of the video
+    :param pose_params: everything the keypoints depend on (backend, openpose flags, ground mask mode...)
+    """
+    params = json.dumps(pose_params, sort_keys=True, default=str)
+    return hashlib.sha1((content_hash + params).encode('utf-8')).hexdigest()
+
+
+class KeypointStore:
+    """
+    Persistent per video keypoint cache. Every entry is a directory holding one segment per writer
+    - <segment>.f32: the (N,25,3) float32 keypoints of the frames of the writer one after the other
+    - <segment>.index.npy: (F,3) int64 rows of [frame index, first body row, number of bodies], sorted by frame
+    - meta.json: the video and pose parameters the entry was computed with
+    Writers never touch the files of another one, so several processes (e.g. the shards of sharded_runner) can add to
+    the same entry at the same time. The segments are merged when reading, the latest one winning for a frame stored
+    twice. The keypoints files are memory mapped, so opening an entry costs nothing whatever the video length.
+    """
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+
+    def entry_dir(self, key):
+        return os.path.join(self.root_dir, key)
+
+    def has(self, key):
+        return len(segment_names(self.entry_dir(key))) > 0
+
+    def reader(self, key):
+        """
+        :return: KeypointReader of the entry, None if there is none
+        """
+        if not self.has(key):
+            return None
+        return KeypointReader(self.entry_dir(key))
+
+    def writer(self, key, meta=None):
+        """
+        :param meta: saved with the entry for reference
+        :return: KeypointWriter adding a segment to the entry (frames already stored are overwritten)
+        """
+        return KeypointWriter(self.entry_dir(key), meta)
+
+
+def segment_names(entry_dir):
+    """
+    :return: names of the completed segments of an entry, oldest first
+    """
+    paths = glob.glob(os.path.join(glob.escape(entry_dir), '*' + INDEX_EXT))
+    return sorted(os.path.basename(path)[:-len(INDEX_EXT)] for path in paths)
+
+
+class KeypointReader:
+
+    def __init__(self, entry_dir):
+        self.segments = []
+        self.rows = {}
+        for name in segment_names(entry_dir):
+            index = np.load(os.path.join(entry_dir, name + INDEX_EXT))
+            keypoints_path = os.path.join(entry_dir, name + KEYPOINTS_EXT)
+            rows = os.path.getsize(keypoints_path) // (NUM_BODY_PARTS * 3 * 4)
+            if rows:
+                keypoints = np.memmap(keypoints_path, np.float32, 'r', shape=(rows, NUM_BODY_PARTS, 3))
+            else:
+                keypoints = np.zeros((0, NUM_BODY_PARTS, 3), np.float32)
+            for frame, offset, count in index:
+                self.rows[int(frame)] = (len(self.segments), int(offset), int(count))
+            self.segments.append(keypoints)
+
+    def __contains__(self, frame):
+        return frame in self.rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def frames(self):
+        return np.array(sorted(self.rows), np.int64)
+
+    def get(self, frame):
+        """
+        :return: (N,25,3) keypoints of the frame, None if the frame is not stored
+        """
+        row = self.rows.get(frame)
+        if row is None:
+            return None
+        segment, offset, count = row
+        return np.array(self.segments[segment][offset:offset + count])
+
+
+class KeypointWriter:
+
+    def __init__(self, entry_dir, meta=None):
+        os.makedirs(entry_dir, exist_ok=True)
+        self.entry_dir = entry_dir
+        self.meta = meta
+        # sorts by creation time, unique across processes
+        self.name = '%020d-%s' % (time.time_ns(), uuid.uuid4().hex)
+        self.keypoints_path = os.path.join(entry_dir, self.name + KEYPOINTS_EXT)
+        self.rows = {}
+        self.offset = 0
+        # the keypoints of a write interrupted before its index was saved are never read
+        self.file = open(self.keypoints_path, 'wb')
+
+    def add(self, frame, keypoints):
+        keypoints = np.ascontiguousarray(keypoints, np.float32).reshape(-1, NUM_BODY_PARTS, 3)
+        self.file.write(keypoints.tobytes())
+        self.rows[int(frame)] = (self.offset, len(keypoints))
+        self.offset += len(keypoints)
+
+    def close(self):
+        """
+        Flush the keypoints then save the index, the segment only becomes visible to readers once this is done
+        """
+        self.file.close()
+        if not self.rows:
+            os.remove(self.keypoints_path)
+            return
+        index = np.array([[frame, offset, count] for frame, (offset, count) in sorted(self.rows.items())],
+                         np.int64).reshape(-1, 3)
+        tmp_path = os.path.join(self.entry_dir, self.name + '.tmp.npy')
+        np.save(tmp_path, index)
+        os.replace(tmp_path, os.path.join(self.entry_dir, self.name + INDEX_EXT))
+        if self.meta is not None:
+            tmp_path = os.path.join(self.entry_dir, self.name + '.' + META_FILE)
+            with open(tmp_path, 'w') as f:
+                json.dump(self.meta, f, default=str)
+            os.replace(tmp_path, os.path.join(self.entry_dir, META_FILE))
@@ -0,0 +1,194 @@
+import json
+import os
+
+import cv2
+import numpy as np
+
+import frame_sampler
+import process_video
+
+# width of the frames the pre-pass works on
+LOCATOR_WIDTH = 320
+
+
+def goal_region(box, scale, shape, margin=0.25):
+    """
+    :param box: goal post [x,y,x2,y2] in the full frame
+    :param scale: low resolution / full resolution
+    :param shape: shape of the low resolution frame
+    :param margin: fraction of the goal size added around it, the striker runs up from outside the goal
+    :return: [x,y,x2,y2] region in the low resolution frame
+    """
+    x, y, x2, y2 = [c * scale for c in box]
+    mx, my = (x2 - x) * margin, (y2 - y) * margin
+    h, w = shape[:2]
+    return [int(max(0, x - mx)), int(max(0, y - my)), int(min(w, x2 + mx)), int(min(h, y2 + my))]
+
+
+def scan_video(vid_path, step=2, width=LOCATOR_WIDTH, min_green=0.35):
+    """
+    Low resolution pass over the whole video, without any pose inference
+    :param step: look at every nth frame
+    :return: (F,) frame indices, motion energy in the goal region, motion energy of the whole frame and whether the
+    frame is a view of the pitch, one entry per scanned frame
+    """
+    cap = cv2.VideoCapture(vid_path)
+    process_video.GOAL_POST_CACHE.reset()
+    frames, goal_motion, global_motion, pitch = [], [], [], []
+    prev_gray = None
+    count = 0
+    try:
+        while cap.grab():
+            if count % step == 0:
+                hasframe, frame = cap.retrieve()
+                if not hasframe:
+                    break
+                h, w = frame.shape[:2]
+                scale = min(1.0, width / float(w))
+                small = cv2.resize(frame, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+                gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+                # the goal post is only detected again on a scene change, see ground_detection.GoalPostCache
+                x, y, x2, y2 = goal_region(process_video.get_goal_post_coords(frame), scale, small.shape)
+
+                frames.append(count)
+                pitch.append(frame_sampler.green_fraction(small) >= min_green)
+                if prev_gray is None or x2 <= x or y2 <= y:
+                    goal_motion.append(0.0)
+                else:
+                    goal_motion.append(frame_sampler.motion_energy(gray[y:y2, x:x2], prev_gray[y:y2, x:x2]))
+                global_motion.append(frame_sampler.motion_energy(gray, prev_gray))
+                prev_gray = gray
+            count += 1
+    finally:
+        cap.release()
+    return np.array(frames, np.int64), np.array(goal_motion), np.array(global_motion), np.array(pitch, bool)
+
+
+def find_windows(frames, goal_motion, global_motion, pitch, fps, before=2.0, after=2.0, min_motion=1.5,
+                 sensitivity=4.0, locality=1.3, cut_motion=25.0, merge_gap=1.0):
+    """
+    Candidate kicks are the pitch frames whose goal motion stands out of the rest of the video (above the median by
+    sensitivity times the median absolute deviation, and at least min_motion). Camera cuts and pans, where the whole
+    frame changes as much as the goal region, are ignored.
+    :param before: seconds kept before the peak of a candidate
+    :param after: seconds kept after the peak of a candidate
+    :param locality: min ratio between the goal region and the whole frame motion energies
+    :param cut_motion: global motion energy above which a frame is a camera cut
+    :param merge_gap: candidates closer than this many seconds belong to the same kick
+    :return: list of windows {'start', 'end' (excluded), 'peak', 'score'} sorted by start
+    """
+    usable = pitch & (global_motion < cut_motion) & (goal_motion >= locality * global_motion)
+    if not usable.any():
+        return []
+    motion = goal_motion[usable]
+    median = float(np.median(motion))
+    mad = float(np.median(np.abs(motion - median)))
+    threshold = max(min_motion, median + sensitivity * mad)
+    candidates = np.flatnonzero(usable & (goal_motion > threshold))
+
+    # group the candidates into events, the peak of each is the most active frame
+    events = []
+    for i in candidates:
+        if events and frames[i] - frames[events[-1][-1]] <= merge_gap * fps:
+            events[-1].append(i)
+        else:
+            events.append([i])
+
+    windows = []
+    for event in events:
+        peak = event[int(np.argmax(goal_motion[event]))]
+        start = max(0, int(frames[peak] - before * fps))
+        end = int(frames[peak] + after * fps) + 1
+        if windows and start <= windows[-1]['end']:
+            windows[-1]['end'] = max(windows[-1]['end'], end)
+            if goal_motion[peak] > windows[-1]['score']:
+                windows[-1]['peak'], windows[-1]['score'] = int(frames[peak]), float(goal_motion[peak])
+        else:
+            windows.append({'start': start, 'end': end, 'peak': int(frames[peak]), 'score': float(goal_motion[peak])})
+    return windows
+
+
+def locate_kicks(vid_path, step=2, width=LOCATOR_WIDTH, **window_options):
+    """
+    Find the candidate kick windows of a video
+    :param window_options: find_windows arguments
+    :return: index dict with the video, its fps and frame count, the parameters and the windows
+    """
+    cap = cv2.VideoCapture(vid_path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 20.0
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    frames, goal_motion, global_motion, pitch = scan_video(vid_path, step, width)
+    windows = find_windows(frames, goal_motion, global_motion, pitch, fps, **window_options)
+    for window in windows:
+        window['end'] = min(window['end'], frame_count) if frame_count > 0 else window['end']
+    return {'video': vid_path,
+            'fps': fps,
+            'frame_count': frame_count,
+            'params': dict(window_options, step=step, width=width),
+            'windows': windows}
+
+
+def save_index(path, index):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_index(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def process_kick_windows(vid_path, out_vid_path, index_path=None, f_height=None, f_width=None, **options):
+    """
+    Run process_video.process_video only inside the kick windows of the video, the annotated frames of all the
+    windows going to a single output video
+    :param index_path: JSON window index, read if it exists, else computed by locate_kicks and saved there
+    :param f_height: height of the output video, the source height by default
+    :param f_width: width of the output video, the source width by default
+    :param options: other process_video arguments, on_frame is still called for every frame
+    :return: the window index
+    """
+    if index_path is not None and os.path.exists(index_path):
+        index = load_index(index_path)
+    else:
+        index = locate_kicks(vid_path)
+        if index_path is not None:
+            save_index(index_path, index)
+
+    on_frame = options.pop('on_frame', None)
+    cap = cv2.VideoCapture(vid_path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 20.0
+    size = (f_width or int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), f_height or int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    cap.release()
+    out_vid = None
+    if out_vid_path is not None and not options.get('analysis_only'):
+        out_vid = cv2.VideoWriter(out_vid_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+
+    def write(task):
+        if out_vid is not None:
+            out_image = task['out']
+            if out_image.shape[1::-1] != size:
+                out_image = cv2.resize(out_image, size, interpolation=cv2.INTER_AREA)
+            out_vid.write(out_image)
+        if on_frame is not None:
+            on_frame(task)
+
+    try:
+        for window in index['windows']:
+            process_video.process_video(vid_path, None, starting_frame=window['start'],
+                                        end_frame=window['end'], on_frame=write, **options)
+    finally:
+        if out_vid is not None:
+            out_vid.release()
+    return index
+
+
+if __name__ == '__main__':
+    vid_path = "resources/videos/video3/video3.mp4"
+    out_vid_path = "resources/output/video3-kicks-out.mp4"
+    index_path = "resources/output/video3-kicks.json"
+    process_kick_windows(vid_path, out_vid_path, index_path)
@@ -0,0 +1,244 @@
+import contextlib
+import csv
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class StageTimer:
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.calls += 1
+        self.total += seconds
+        if seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def summary(self):
+        return {'calls': self.calls,
+                'total_s': self.total,
+                'mean_ms': self.total / self.calls * 1000.0 if self.calls else 0.0,
+                'min_ms': self.min * 1000.0 if self.calls else 0.0,
+                'max_ms': self.max * 1000.0}
+
+
+class Gauge:
+    """
+    Sampled value, e.g. the depth of a queue every time an item is taken from it
+    """
+
+    def __init__(self):
+        self.samples = 0
+        self.total = 0.0
+        self.last = 0
+        self.max = 0
+
+    def add(self, value):
+        self.samples += 1
+        self.total += value
+        self.last = value
+        if value > self.max:
+            self.max = value
+
+    def summary(self):
+        return {'samples': self.samples,
+                'mean': self.total / self.samples if self.samples else 0.0,
+                'last': self.last,
+                'max': self.max}
+
+
+# returned by Metrics.timer when disabled, entering it does nothing
+NULL_TIMER = contextlib.nullcontext()
+
+
+class Metrics:
+    """
+    Per stage timers, counters and gauges shared by the threads of a run. When disabled every call returns right away
+    and timed() hands back the function itself, so instrumented code costs (almost) nothing.
+    """
+
+    def __init__(self, enabled=True, exporters=None):
+        """
+        :param exporters: LogExporter, CsvExporter, PrometheusExporter... called by export()
+        """
+        self.enabled = enabled
+        self.exporters = exporters if exporters is not None else []
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.timers = {}
+        self.counters = {}
+        self.gauges = {}
+        self.start_time = time.perf_counter()
+
+    def add_time(self, stage, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            timer = self.timers.get(stage)
+            if timer is None:
+                timer = self.timers[stage] = StageTimer()
+            timer.add(seconds)
+
+    @contextlib.contextmanager
+    def _timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start)
+
+    def timer(self, stage):
+        """
+        :return: context manager timing its block as stage
+        """
+        if not self.enabled:
+            return NULL_TIMER
+        return self._timer(stage)
+
+    def timed(self, stage, fn):
+        """
+        :return: fn timing every call as stage, fn itself when disabled
+        """
+        if not self.enabled:
+            return fn
+
+        def timed_fn(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.add_time(stage, time.perf_counter() - start)
+
+        return timed_fn
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name, value):
+        if not self.enabled:
+            return
+        with self.lock:
+            gauge = self.gauges.get(name)
+            if gauge is None:
+                gauge = self.gauges[name] = Gauge()
+            gauge.add(value)
+
+    def snapshot(self):
+        """
+        :return: dict with the elapsed seconds and the summary of every timer, counter and gauge
+        """
+        with self.lock:
+            return {'elapsed_s': time.perf_counter() - self.start_time,
+                    'timers': dict((name, t.summary()) for name, t in self.timers.items()),
+                    'counters': dict(self.counters),
+                    'gauges': dict((name, g.summary()) for name, g in self.gauges.items())}
+
+    def export(self):
+        if not self.enabled:
+            return
+        snapshot = self.snapshot()
+        for exporter in self.exporters:
+            exporter.export(snapshot)
+
+
+# shared disabled instance, the default of the instrumented functions
+DISABLED = Metrics(enabled=False)
+
+
+class LogExporter:
+    """
+    Human readable summary through logging
+    """
+
+    def __init__(self, log=None, level=logging.INFO):
+        self.log = log if log is not None else logger
+        self.level = level
+
+    def export(self, snapshot):
+        self.log.log(self.level, 'Run time:: %.2f s', snapshot['elapsed_s'])
+        for name, t in sorted(snapshot['timers'].items()):
+            self.log.log(self.level, 'Stage %-10s calls %6d  total %8.2f s  mean %8.2f ms  max %8.2f ms',
+                         name, t['calls'], t['total_s'], t['mean_ms'], t['max_ms'])
+        for name, value in sorted(snapshot['counters'].items()):
+            self.log.log(self.level, 'Counter %-20s %d', name, value)
+        for name, g in sorted(snapshot['gauges'].items()):
+            self.log.log(self.level, 'Gauge %-20s mean %.2f  max %d', name, g['mean'], g['max'])
+
+
+class CsvExporter:
+    """
+    Appends one row per timer, counter and gauge field to a CSV file, rows of one export share their timestamp
+    """
+
+    FIELDS = ['timestamp', 'kind', 'name', 'field', 'value']
+
+    def __init__(self, path):
+        self.path = path
+
+    def export(self, snapshot):
+        timestamp = datetime.now().isoformat()
+        rows = [[timestamp, 'run', 'elapsed', 'seconds', snapshot['elapsed_s']]]
+        for name, t in sorted(snapshot['timers'].items()):
+            rows.extend([timestamp, 'timer', name, field, value] for field, value in t.items())
+        for name, value in sorted(snapshot['counters'].items()):
+            rows.append([timestamp, 'counter', name, 'value', value])
+        for name, g in sorted(snapshot['gauges'].items()):
+            rows.extend([timestamp, 'gauge', name, field, value] for field, value in g.items())
+
+        new_file = not os.path.exists(self.path)
+        with open(self.path, 'a', newline='') as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(self.FIELDS)
+            writer.writerows(rows)
+
+
+class PrometheusExporter:
+    """
+    Prometheus text file, for the node exporter textfile collector. The file is replaced atomically.
+    """
+
+    def __init__(self, path, prefix='penalty_pose'):
+        self.path = path
+        self.prefix = prefix
+
+    def export(self, snapshot):
+        p = self.prefix
+        lines = ['# TYPE %s_run_seconds gauge' % p,
+                 '%s_run_seconds %f' % (p, snapshot['elapsed_s']),
+                 '# TYPE %s_stage_seconds_total counter' % p,
+                 '# TYPE %s_stage_calls_total counter' % p,
+                 '# TYPE %s_stage_max_seconds gauge' % p]
+        for name, t in sorted(snapshot['timers'].items()):
+            lines.append('%s_stage_seconds_total{stage="%s"} %f' % (p, name, t['total_s']))
+            lines.append('%s_stage_calls_total{stage="%s"} %d' % (p, name, t['calls']))
+            lines.append('%s_stage_max_seconds{stage="%s"} %f' % (p, name, t['max_ms'] / 1000.0))
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append('# TYPE %s_%s_total counter' % (p, name))
+            lines.append('%s_%s_total %s' % (p, name, value))
+        lines.append('# TYPE %s_gauge_mean gauge' % p)
+        lines.append('# TYPE %s_gauge_max gauge' % p)
+        for name, g in sorted(snapshot['gauges'].items()):
+            lines.append('%s_gauge_mean{name="%s"} %f' % (p, name, g['mean']))
+            lines.append('%s_gauge_max{name="%s"} %f' % (p, name, g['max']))
+
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, self.path)
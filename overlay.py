@@ -0,0 +1,78 @@
+import cv2
+import numpy as np
+
+import result_sink
+
+# detail levels of the overlay
+DETAIL_BOXES = 'boxes'
+DETAIL_LABELS = 'labels'
+DETAIL_SKELETON = 'skeleton'
+
+BOX_COLOR = (36, 255, 12)
+SKELETON_COLOR = (255, 160, 0)
+ROLE_LABELS = {result_sink.ROLE_STRIKER: 'Striker',
+               result_sink.ROLE_GOALKEEPER: 'Goalkeeper',
+               result_sink.ROLE_REFEREE: 'Referee'}
+# roles are drawn in this order, the later labels going over the earlier ones
+DRAW_ORDER = [result_sink.ROLE_STRIKER, result_sink.ROLE_GOALKEEPER, result_sink.ROLE_REFEREE]
+
+# BODY_25 limbs as (joint, joint) pairs, the way openpose renders them
+BODY_25_PAIRS = np.array([[1, 8], [1, 2], [1, 5], [2, 3], [3, 4], [5, 6], [6, 7], [8, 9], [9, 10], [10, 11],
+                          [8, 12], [12, 13], [13, 14], [1, 0], [0, 15], [15, 17], [0, 16], [16, 18], [14, 19],
+                          [19, 20], [14, 21], [11, 22], [22, 23], [11, 24]])
+
+
+def draw_order(roles):
+    """
+    :return: indices of the bodies with a role, striker first then the goalkeeper then the referees
+    """
+    roles = np.asarray(roles)
+    return np.concatenate([np.flatnonzero(roles == role) for role in DRAW_ORDER]).astype(int)
+
+
+def skeleton_lines(keypoints):
+    """
+    :param keypoints: (N,25,3) keypoints
+    :return: list of (2,2) int32 segments of the limbs whose both joints were detected
+    """
+    a = keypoints[:, BODY_25_PAIRS[:, 0]]
+    b = keypoints[:, BODY_25_PAIRS[:, 1]]
+    found = (a[..., 2] != 0) & (b[..., 2] != 0)
+    segments = np.stack([a[found][:, :2], b[found][:, :2]], axis=1)
+    return list(np.round(segments).astype(np.int32))
+
+
+def render_overlay(image, roles, bounds, keypoints=None, detail=DETAIL_LABELS, out=None, track_ids=None):
+    """
+    Draw the boxes (and labels, skeletons) of all the bodies with a role in a single pass
+    :param image: frame to draw on
+    :param roles: (N,) role of every body, see result_sink.role_array
+    :param bounds: (N,4) body bounds, see process_video.get_body_bounds_array
+    :param keypoints: (N,25,3) keypoints, needed by DETAIL_SKELETON
+    :param detail: DETAIL_BOXES, DETAIL_LABELS or DETAIL_SKELETON (boxes, labels and limbs)
+    :param out: buffer receiving the drawing, can be the image itself. A copy of the image is drawn on otherwise.
+    :param track_ids: (N,) id of every body (see player_tracker.PlayerTracker), added to the labels
+    :return: the image with the overlay
+    """
+    if out is None:
+        out = image.copy()
+    elif out is not image:
+        np.copyto(out, image)
+
+    order = draw_order(roles)
+    if len(order) == 0:
+        return out
+
+    if detail == DETAIL_SKELETON and keypoints is not None:
+        cv2.polylines(out, skeleton_lines(np.asarray(keypoints)[order]), False, SKELETON_COLOR, 2)
+
+    boxes = np.asarray(bounds)[order].astype(int)
+    labels = detail in (DETAIL_LABELS, DETAIL_SKELETON)
+    for i, (x, y, x2, y2) in zip(order, boxes):
+        cv2.rectangle(out, (x, y), (x2, y2), BOX_COLOR, 1)
+        if labels:
+            label = ROLE_LABELS[int(roles[i])]
+            if track_ids is not None:
+                label += ' #' + str(int(track_ids[i]))
+            cv2.putText(out, label, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, BOX_COLOR, 2)
+    return out
@@ -0,0 +1,162 @@
+import queue
+import threading
+
+# marker pushed through the queues once the source is exhausted (or a stage failed)
+END_OF_STREAM = object()
+
+
+class PipelineError(Exception):
+    pass
+
+
+class Stage(threading.Thread):
+    """
+    One step of the pipeline running in its own thread. Items are taken from in_queue in FIFO order, passed through
+    fn and pushed to out_queue, so the order of the frames is preserved from one stage to the next.
+    """
+
+    def __init__(self, name, fn, in_queue, out_queue, stop_event, batch_size=None, metrics=None):
+        """
+        :param batch_size: if set, fn takes a list of up to batch_size items (whatever is already waiting in the
+        queue) and returns the list of results
+        :param metrics: metrics.Metrics receiving the depth of in_queue every time an item is taken from it
+        """
+        super().__init__(name=name, daemon=True)
+        self.fn = fn
+        self.in_queue = in_queue
+        self.out_queue = out_queue
+        self.stop_event = stop_event
+        self.batch_size = batch_size
+        self.metrics = metrics
+        self.error = None
+
+    def run(self):
+        try:
+            if self.batch_size is not None:
+                self.run_batched()
+                return
+            while True:
+                item = _get(self.in_queue, self.stop_event)
+                if item is END_OF_STREAM:
+                    break
+                if self.metrics is not None:
+                    self.metrics.gauge('queue_' + self.name, self.in_queue.qsize())
+                result = self.fn(item)
+                if self.out_queue is not None:
+                    _put(self.out_queue, result, self.stop_event)
+        except Exception as e:
+            self.error = e
+            self.stop_event.set()
+        finally:
+            if self.out_queue is not None:
+                _put(self.out_queue, END_OF_STREAM, self.stop_event, force=True)
+
+    def run_batched(self):
+        done = False
+        while not done:
+            item = _get(self.in_queue, self.stop_event)
+            if item is END_OF_STREAM:
+                break
+            if self.metrics is not None:
+                self.metrics.gauge('queue_' + self.name, self.in_queue.qsize())
+            batch = [item]
+            # don't wait for a full batch, take what the upstream stage has already produced
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.in_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is END_OF_STREAM:
+                    done = True
+                    break
+                batch.append(item)
+
+            results = self.fn(batch)
+            if self.out_queue is not None:
+                for result in results:
+                    _put(self.out_queue, result, self.stop_event)
+
+
+class SourceStage(threading.Thread):
+    """
+    First step of the pipeline, pushes the items of an iterable (e.g. decoded frames) to out_queue.
+    """
+
+    def __init__(self, name, source, out_queue, stop_event):
+        super().__init__(name=name, daemon=True)
+        self.source = source
+        self.out_queue = out_queue
+        self.stop_event = stop_event
+        self.error = None
+
+    def run(self):
+        try:
+            for item in self.source:
+                if self.stop_event.is_set():
+                    break
+                _put(self.out_queue, item, self.stop_event)
+        except Exception as e:
+            self.error = e
+            self.stop_event.set()
+        finally:
+            _put(self.out_queue, END_OF_STREAM, self.stop_event, force=True)
+
+
+def _get(q, stop_event):
+    while True:
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            if stop_event.is_set():
+                return END_OF_STREAM
+
+
+def _put(q, item, stop_event, force=False):
+    """
+    Put on a bounded queue without blocking forever if a downstream stage died.
+    :param force: keep trying even when the pipeline is stopping (used for the end of stream marker)
+    """
+    while True:
+        try:
+            q.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            if stop_event.is_set():
+                if not force:
+                    return
+                # make room for the marker, the pipeline is being torn down anyway
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    pass
+
+
+def run_pipeline(source, stages, queue_size=4, metrics=None):
+    """
+    Run source -> stage_1 -> ... -> stage_n with every step in its own thread, connected by bounded queues.
+    The last stage is the sink, whatever it returns is dropped.
+    :param source: iterable producing the items, e.g. decoded frames
+    :param stages: list of (name, fn) or (name, fn, batch_size) tuples, fn takes an item and returns the item for
+    the next stage, or a list of items and the list of results when batch_size is given
+    :param queue_size: max items waiting between two stages, bounds the memory held by the pipeline
+    :param metrics: metrics.Metrics sampling the queue depths, see Stage
+    :return: None, raises PipelineError if any of the steps failed
+    """
+    stop_event = threading.Event()
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+
+    threads = [SourceStage('source', source, queues[0], stop_event)]
+    for i, stage in enumerate(stages):
+        name, fn = stage[:2]
+        batch_size = stage[2] if len(stage) > 2 else None
+        out_queue = queues[i + 1] if i + 1 < len(queues) else None
+        threads.append(Stage(name, fn, queues[i], out_queue, stop_event, batch_size, metrics))
+
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    for t in threads:
+        if t.error is not None:
+            raise PipelineError('Pipeline stage "' + t.name + '" failed') from t.error
@@ -0,0 +1,223 @@
+import numpy as np
+
+import result_sink
+
+# roles held by a single body in a frame
+UNIQUE_ROLES = (result_sink.ROLE_STRIKER, result_sink.ROLE_GOALKEEPER)
+
+
+def box_iou(a, b):
+    """
+    :param a: (N,4) boxes [x,y,x2,y2]
+    :param b: (M,4) boxes
+    :return: (N,M) intersection over union of every pair
+    """
+    a = np.asarray(a, np.float64).reshape(-1, 4)
+    b = np.asarray(b, np.float64).reshape(-1, 4)
+    x = np.maximum(a[:, None, 0], b[None, :, 0])
+    y = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x, 0, None) * np.clip(y2 - y, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.where(union > 0, union, 1.0), 0.0)
+
+
+def linear_assignment(cost):
+    """
+    Minimum cost assignment of rows to columns (Hungarian algorithm with shortest augmenting paths, O(N^2 M))
+    :param cost: (N,M) cost matrix
+    :return: (K,2) int array of (row, column) pairs, K = min(N,M)
+    """
+    cost = np.asarray(cost, np.float64)
+    if cost.size == 0:
+        return np.zeros((0, 2), int)
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+
+    # 1-based potentials and matching, column 0 is the virtual start of every augmenting path
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    row_of = np.zeros(m + 1, int)
+    way = np.zeros(m + 1, int)
+    for i in range(1, n + 1):
+        row_of[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, bool)
+        while row_of[j0] != 0:
+            used[j0] = True
+            i0 = row_of[j0]
+            free = ~used
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            better = free[1:] & (reduced < minv[1:])
+            minv[1:][better] = reduced[better]
+            way[1:][better] = j0
+            candidates = np.where(free[1:], minv[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+            u[row_of[used]] += delta
+            v[used] -= delta
+            minv[free] -= delta
+            j0 = j1
+        # flip the augmenting path
+        while j0 != 0:
+            j1 = way[j0]
+            row_of[j0] = row_of[j1]
+            j0 = j1
+
+    cols = np.flatnonzero(row_of[1:])
+    pairs = np.stack([row_of[1:][cols] - 1, cols], axis=1)
+    if transposed:
+        pairs = pairs[:, ::-1]
+    return pairs[np.argsort(pairs[:, 0], kind='stable')]
+
+
+class Track:
+    """
+    One person followed from frame to frame, with the role it keeps
+    """
+
+    def __init__(self, track_id, box):
+        self.id = track_id
+        self.box = box
+        self.hits = 1
+        self.missed = 0
+        self.role = result_sink.ROLE_NONE
+        self.confirmed = False
+        # last role given by the heuristics and for how many classifications in a row
+        self.candidate = result_sink.ROLE_NONE
+        self.streak = 0
+
+    @property
+    def ambiguous(self):
+        return not self.confirmed or self.candidate != self.role
+
+    def observe(self, role, confirm_frames):
+        """
+        Take the role found by the heuristics: an unconfirmed track follows it, a confirmed one only switches after
+        confirm_frames classifications in a row agree on another role
+        :return: whether the role of a confirmed track changed
+        """
+        if role == self.candidate:
+            self.streak += 1
+        else:
+            self.candidate, self.streak = role, 1
+        if not self.confirmed:
+            self.role = role
+            self.confirmed = self.streak >= confirm_frames
+            return False
+        if role != self.role and self.streak >= confirm_frames:
+            self.role = role
+            return True
+        return False
+
+
+class PlayerTracker:
+    """
+    Associates the bodies of consecutive frames by the IoU of their bounds (optimal assignment, see
+    linear_assignment) and keeps a stable id and role per person. The role heuristics (process_video.classify_roles)
+    run again only when a body is new or its role is not settled, when the striker or goalkeeper was lost, and every
+    reclassify_interval frames to catch slow drifts. The other frames reuse the roles of the tracks, which also stops
+    the labels from flickering.
+    """
+
+    def __init__(self, min_iou=0.3, max_missed=10, confirm_frames=3, reclassify_interval=25):
+        """
+        :param min_iou: min IoU between the bounds of a track and a body for them to be associated
+        :param max_missed: frames a track survives without any body associated, e.g. through an occlusion
+        :param confirm_frames: classifications in a row agreeing on a role for it to be kept, or changed
+        :param reclassify_interval: max frames between two classifications
+        """
+        self.min_iou = min_iou
+        self.max_missed = max_missed
+        self.confirm_frames = confirm_frames
+        self.reclassify_interval = reclassify_interval
+        self.reset()
+
+    def reset(self):
+        self.tracks = []
+        self.next_id = 1
+        self.since_classified = 0
+        self.frames = 0
+        self.classified = 0
+        self.role_switches = 0
+
+    def match(self, bounds):
+        """
+        :return: (N,) index in self.tracks of the track associated with every body, -1 for the new ones
+        """
+        matched = np.full(len(bounds), -1, int)
+        if len(bounds) == 0 or len(self.tracks) == 0:
+            return matched
+        iou = box_iou([track.box for track in self.tracks], bounds)
+        for t, b in linear_assignment(1.0 - iou):
+            if iou[t, b] >= self.min_iou:
+                matched[b] = t
+        return matched
+
+    def update(self, bounds, classify):
+        """
+        :param bounds: (N,4) body bounds of the frame
+        :param classify: function without argument returning the (N,) roles of the bodies found by the heuristics,
+        called only when needed
+        :return: (N,) int32 track id and (N,) int8 role of every body
+        """
+        self.frames += 1
+        bounds = np.asarray(bounds).reshape(-1, 4)
+        matched = self.match(bounds)
+
+        body_tracks = []
+        for b, t in enumerate(matched):
+            if t >= 0:
+                track = self.tracks[t]
+                track.box = bounds[b]
+                track.hits += 1
+                track.missed = 0
+            else:
+                track = Track(self.next_id, bounds[b])
+                self.next_id += 1
+            body_tracks.append(track)
+        seen = set(id(track) for track in body_tracks)
+        lost_unique_role = False
+        for track in self.tracks:
+            if id(track) not in seen:
+                track.missed += 1
+                lost_unique_role |= track.missed == 1 and track.confirmed and track.role in UNIQUE_ROLES
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed] + \
+                      [track for track, t in zip(body_tracks, matched) if t < 0]
+
+        self.since_classified += 1
+        if lost_unique_role or self.since_classified >= self.reclassify_interval or \
+                any(track.ambiguous for track in body_tracks):
+            roles = classify()
+            for track, role in zip(body_tracks, roles):
+                self.role_switches += track.observe(int(role), self.confirm_frames)
+            self.since_classified = 0
+            self.classified += 1
+
+        return np.array([track.id for track in body_tracks], np.int32), self.unique_roles(body_tracks)
+
+    def unique_roles(self, body_tracks):
+        """
+        :return: (N,) roles of the tracks, a single striker and goalkeeper, the most established track keeping the
+        role and the others becoming referees
+        """
+        roles = np.array([track.role for track in body_tracks], np.int8)
+        for role in UNIQUE_ROLES:
+            holders = np.flatnonzero(roles == role)
+            if len(holders) > 1:
+                keep = max(holders, key=lambda i: (body_tracks[i].confirmed, body_tracks[i].hits))
+                roles[holders[holders != keep]] = result_sink.ROLE_REFEREE
+        return roles
+
+    def stats(self):
+        return {'frames': self.frames,
+                'classified': self.classified,
+                'reused': self.frames - self.classified,
+                'tracks': self.next_id - 1,
+                'role_switches': self.role_switches}
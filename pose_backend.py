@@ -0,0 +1,377 @@
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+from sys import platform
+
+import numpy as np
+
+from detections import NUM_BODY_PARTS
+
+OPENPOSE_MODEL_FOLDER = "openpose/models/"
+
+op = None
+
+
+def import_openpose():
+    """
+    Import Openpose (Windows/Ubuntu/OSX) on first use, so that the rest of the code can run without an OpenPose build
+    :return: the pyopenpose module
+    """
+    global op
+    if op is not None:
+        return op
+
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    try:
+        # Windows Import
+        if platform == "win32":
+            # Change these variables to point to the correct folder (Release/x64 etc.)
+            sys.path.append(dir_path + '/../../python/openpose/Release')
+            os.environ['PATH']  = os.environ['PATH'] + ';' + dir_path + '/../../x64/Release;' +  dir_path + '/../../bin;'
+            import pyopenpose
+        else:
+            # Change these variables to point to the correct folder (Release/x64 etc.)
+            sys.path.append('openpose/build/python')
+            # If you run `make install` (default path is `/usr/local/python` for Ubuntu), you can also access the OpenPose/python module from there. This will install OpenPose and the python library at your desired installation path. Ensure that this is in your python path in order to use it.
+            # sys.path.append('/usr/local/python')
+            from openpose import pyopenpose
+    except ImportError as e:
+        print('Error: OpenPose library could not be found. Did you enable `BUILD_PYTHON` in CMake and have this Python script in the right folder?')
+        raise e
+
+    op = pyopenpose
+    return op
+
+
+def empty_keypoints():
+    return np.zeros((0, NUM_BODY_PARTS, 3), np.float32)
+
+
+def normalize_keypoints(pose_keypoints):
+    """
+    Openpose returns a 0-d array instead of an empty one when no body is detected
+    :param pose_keypoints: datum.poseKeypoints
+    :return: (N,25,3) keypoint array, N can be 0
+    """
+    if pose_keypoints is None or np.ndim(pose_keypoints) != 3:
+        return empty_keypoints()
+    return pose_keypoints
+
+
+def copy_rendered(images, out=None):
+    """
+    Copy the rendered images out of the backend owned memory, into the out buffers when given
+    """
+    if out is None:
+        return [image.copy() for image in images]
+    for image, buf in zip(images, out):
+        np.copyto(buf, image)
+    return out
+
+
+class PoseBackend:
+    """
+    Pose estimation on a batch of frames. Subclasses implement infer_rendered.
+    """
+
+    def infer_rendered(self, frames, out=None):
+        """
+        :param frames: list of BGR images
+        :param out: list of buffers, one per frame with its shape, receiving the rendered images
+        :return: list of (N,25,3) keypoint arrays and list of rendered images, one of each per frame
+        """
+        raise NotImplementedError
+
+    def infer(self, frames):
+        """
+        :param frames: list of BGR images
+        :return: list of (N,25,3) keypoint arrays, one per frame
+        """
+        keypoints, _ = self.infer_rendered(frames)
+        return keypoints
+
+    def describe(self):
+        """
+        :return: the parameters the keypoints depend on, used as a cache key
+        """
+        return {'name': type(self).__name__}
+
+    def warm_up(self):
+        """
+        Load the model now instead of on the first frame
+        """
+        pass
+
+    def close(self):
+        pass
+
+
+class OpenPoseBackend(PoseBackend):
+    """
+    Submits all the frames of a batch to openpose in a single emplaceAndPop call
+    """
+
+    def __init__(self, params=None):
+        """
+        :param params: openpose flags (refer to include/openpose/flags.hpp), model_folder defaults to openpose/models/
+        """
+        self.params = dict()
+        self.params["model_folder"] = OPENPOSE_MODEL_FOLDER
+        if params is not None:
+            self.params.update(params)
+        self.wrapper = None
+        self.lock = threading.Lock()
+
+    def describe(self):
+        return {'name': 'openpose', 'params': self.params}
+
+    def start(self):
+        with self.lock:
+            if self.wrapper is None:
+                op = import_openpose()
+                opw = op.WrapperPython()
+                opw.configure(self.params)
+                opw.start()
+                self.wrapper = opw
+        return self.wrapper
+
+    def warm_up(self):
+        self.start()
+
+    def close(self):
+        with self.lock:
+            if self.wrapper is not None:
+                self.wrapper.stop()
+                self.wrapper = None
+
+    def run(self, frames):
+        opWrapper = self.start()
+        datums = []
+        for frame in frames:
+            datum = op.Datum()
+            datum.cvInputData = frame
+            datums.append(datum)
+        opWrapper.emplaceAndPop(datums)
+        return datums
+
+    def infer_rendered(self, frames, out=None):
+        datums = self.run(frames)
+        keypoints = [normalize_keypoints(datum.poseKeypoints) for datum in datums]
+        rendered = copy_rendered([datum.cvOutputData for datum in datums], out)
+        return keypoints, rendered
+
+    def infer(self, frames):
+        return [normalize_keypoints(datum.poseKeypoints) for datum in self.run(frames)]
+
+
+# Standing pose facing the camera, (x, y) as a fraction of the body height from the top of the head between the feet
+BODY_TEMPLATE = np.array([[0.0, 0.06],     # Nose
+                          [0.0, 0.16],     # Neck
+                          [-0.1, 0.17],    # RShoulder
+                          [-0.13, 0.32],   # RElbow
+                          [-0.14, 0.45],   # RWrist
+                          [0.1, 0.17],     # LShoulder
+                          [0.13, 0.32],    # LElbow
+                          [0.14, 0.45],    # LWrist
+                          [0.0, 0.5],      # MidHip
+                          [-0.06, 0.5],    # RHip
+                          [-0.06, 0.72],   # RKnee
+                          [-0.06, 0.94],   # RAnkle
+                          [0.06, 0.5],     # LHip
+                          [0.06, 0.72],    # LKnee
+                          [0.06, 0.94],    # LAnkle
+                          [-0.02, 0.04],   # REye
+                          [0.02, 0.04],    # LEye
+                          [-0.04, 0.05],   # REar
+                          [0.04, 0.05],    # LEar
+                          [0.08, 0.99],    # LBigToe
+                          [0.1, 0.98],     # LSmallToe
+                          [0.05, 0.97],    # LHeel
+                          [-0.08, 0.99],   # RBigToe
+                          [-0.1, 0.98],    # RSmallToe
+                          [-0.05, 0.97]],  # RHeel
+                         np.float32)
+
+# face and feet joints which are dropped now and then like openpose does for small or occluded people
+OPTIONAL_PARTS = [15, 16, 17, 18, 19, 20, 21, 22, 23, 24]
+
+
+class SyntheticPoseBackend(PoseBackend):
+    """
+    Deterministic stand-in for openpose, the bodies generated depend only on the seed and the frame content, so the
+    same frame always gets the same keypoints whatever the batch it comes in. The first body is sideways (striker like),
+    the others face the camera.
+    """
+
+    def __init__(self, num_people=4, seed=0, latency=0.0):
+        """
+        :param num_people: bodies generated per frame
+        :param seed: random seed
+        :param latency: seconds slept per frame to emulate the inference cost
+        """
+        self.num_people = num_people
+        self.seed = seed
+        self.latency = latency
+
+    def describe(self):
+        return {'name': 'synthetic', 'num_people': self.num_people, 'seed': self.seed}
+
+    def generate(self, frame):
+        h, w = frame.shape[:2]
+        frame_hash = zlib.crc32(np.ascontiguousarray(frame[::16, ::16]).tobytes())
+        rng = np.random.default_rng([self.seed, frame_hash])
+
+        keypoints = np.zeros((self.num_people, NUM_BODY_PARTS, 3), np.float32)
+        for i in range(self.num_people):
+            body = BODY_TEMPLATE.copy()
+            if i == 0:
+                # sideways: hips close to each other and the neck leaning out of them
+                body[:, 0] *= 0.2
+                body[:2, 0] += 0.05
+            body_height = rng.uniform(0.15, 0.3) * h
+            foot_x = rng.uniform(0.1, 0.9) * w
+            foot_y = rng.uniform(0.4, 0.95) * h
+
+            keypoints[i, :, 0] = foot_x + body[:, 0] * body_height
+            keypoints[i, :, 1] = foot_y - (1.0 - body[:, 1]) * body_height
+            keypoints[i, :, :2] += rng.normal(0.0, 0.01 * body_height, (NUM_BODY_PARTS, 2))
+            keypoints[i, :, 2] = rng.uniform(0.4, 0.95, NUM_BODY_PARTS)
+
+            dropped = [p for p in OPTIONAL_PARTS if rng.random() < 0.2]
+            keypoints[i, dropped] = 0.0
+
+        np.clip(keypoints[:, :, 0], 0, w - 1, out=keypoints[:, :, 0])
+        np.clip(keypoints[:, :, 1], 0, h - 1, out=keypoints[:, :, 1])
+        return keypoints
+
+    def infer_rendered(self, frames, out=None):
+        if self.latency > 0:
+            time.sleep(self.latency * len(frames))
+        keypoints = [self.generate(frame) for frame in frames]
+        rendered = copy_rendered(frames, out)
+        return keypoints, rendered
+
+    def infer(self, frames):
+        if self.latency > 0:
+            time.sleep(self.latency * len(frames))
+        return [self.generate(frame) for frame in frames]
+
+
+BACKENDS = {'openpose': OpenPoseBackend,
+            'synthetic': SyntheticPoseBackend}
+
+
+def body_scores(keypoints):
+    """
+    :return: (N,) score of every body, the sum of its joint confidences
+    """
+    return np.asarray(keypoints)[..., 2].sum(axis=-1)
+
+
+class TopPeopleBackend(PoseBackend):
+    """
+    Keeps the max_people best scored bodies of another backend, like openpose's number_people_max, so that the
+    single body detection can share the model already loaded for the full frames. The rendering still shows all the
+    bodies.
+    """
+
+    def __init__(self, backend, max_people=1):
+        self.backend = backend
+        self.max_people = max_people
+
+    def describe(self):
+        return {'name': 'top_people', 'max_people': self.max_people, 'backend': self.backend.describe()}
+
+    def top(self, keypoints):
+        if len(keypoints) <= self.max_people:
+            return keypoints
+        order = np.argsort(-body_scores(keypoints), kind='stable')
+        return keypoints[order[:self.max_people]]
+
+    def infer_rendered(self, frames, out=None):
+        keypoints, rendered = self.backend.infer_rendered(frames, out)
+        return [self.top(k) for k in keypoints], rendered
+
+    def infer(self, frames):
+        return [self.top(k) for k in self.backend.infer(frames)]
+
+    def warm_up(self):
+        self.backend.warm_up()
+
+
+def create_backend(name='openpose', **kwargs):
+    """
+    Build a backend from a picklable description, e.g. in a worker process
+    :param name: key of BACKENDS
+    :param kwargs: arguments of the backend class
+    """
+    if name not in BACKENDS:
+        raise ValueError('Unknown pose backend: ' + str(name))
+    return BACKENDS[name](**kwargs)
+
+
+class BackendPool:
+    """
+    Backends shared by configuration: asking twice for the same name and arguments gives the same backend, so a
+    process running several jobs (batch_runner workers, the analysis service) loads each model once and keeps it
+    warm between the jobs. Thread safe.
+    """
+
+    def __init__(self):
+        self.backends = {}
+        self.lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    @staticmethod
+    def key(name, kwargs):
+        return json.dumps([name, kwargs], sort_keys=True, default=str)
+
+    def get(self, name='openpose', warm=False, **kwargs):
+        """
+        :param name: key of BACKENDS
+        :param warm: load the model before returning, see PoseBackend.warm_up
+        :param kwargs: arguments of the backend class
+        :return: the backend of this configuration, created on the first call
+        """
+        key = self.key(name, kwargs)
+        with self.lock:
+            backend = self.backends.get(key)
+            if backend is None:
+                backend = create_backend(name, **kwargs)
+                self.backends[key] = backend
+                self.created += 1
+            else:
+                self.reused += 1
+        if warm:
+            backend.warm_up()
+        return backend
+
+    def close(self):
+        """
+        Stop all the backends, they are created again when next asked for
+        """
+        with self.lock:
+            backends = list(self.backends.values())
+            self.backends.clear()
+        for backend in backends:
+            backend.close()
+
+    def stats(self):
+        with self.lock:
+            return {'backends': len(self.backends),
+                    'created': self.created,
+                    'reused': self.reused}
+
+
+BACKEND_POOL = BackendPool()
+
+
+def get_backend(name='openpose', warm=False, **kwargs):
+    """
+    :return: the shared backend of this configuration, see BackendPool
+    """
+    return BACKEND_POOL.get(name, warm, **kwargs)
@@ -1,101 +1,71 @@
-import math
+import logging
 import sys
 import traceback
+import detections
 import ground_detection
+import pipeline
+import inference_scale
+import keypoint_store
+import metrics as run_metrics
+import overlay
+import pose_backend
+import result_sink
+import roi
 
 import cv2
-import os
 import numpy as np
-from sys import platform
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 try:
-    # Import Openpose (Windows/Ubuntu/OSX)
-    dir_path = os.path.dirname(os.path.realpath(__file__))
-    try:
-        # Windows Import
-        if platform == "win32":
-            # Change these variables to point to the correct folder (Release/x64 etc.)
-            sys.path.append(dir_path + '/../../python/openpose/Release')
-            os.environ['PATH']  = os.environ['PATH'] + ';' + dir_path + '/../../x64/Release;' +  dir_path + '/../../bin;'
-            import pyopenpose as op
-        else:
-            # Change these variables to point to the correct folder (Release/x64 etc.)
-            sys.path.append('openpose/build/python')
-            # If you run `make install` (default path is `/usr/local/python` for Ubuntu), you can also access the OpenPose/python module from there. This will install OpenPose and the python library at your desired installation path. Ensure that this is in your python path in order to use it.
-            # sys.path.append('/usr/local/python')
-            from openpose import pyopenpose as op
-    except ImportError as e:
-        print('Error: OpenPose library could not be found. Did you enable `BUILD_PYTHON` in CMake and have this Python script in the right folder?')
-        raise e
-
-
-    # refer to https://github.com/stuartcrobinson/andre_aigassi/blob/a549c84ffbcf7510d9e0b4c0886d07254855077a/brownlee_maskrcnn/ex4.py
-    m_i_bodyPart = {0: "Nose",
-                    1: "Neck",
-                    2: "RShoulder",
-                    3: "RElbow",
-                    4: "RWrist",
-                    5: "LShoulder",
-                    6: "LElbow",
-                    7: "LWrist",
-                    8: "MidHip",
-                    9: "RHip",
-                    10: "RKnee",
-                    11: "RAnkle",
-                    12: "LHip",
-                    13: "LKnee",
-                    14: "LAnkle",
-                    15: "REye",
-                    16: "LEye",
-                    17: "REar",
-                    18: "LEar",
-                    19: "LBigToe",
-                    20: "LSmallToe",
-                    21: "LHeel",
-                    22: "RBigToe",
-                    23: "RSmallToe",
-                    24: "RHeel"}
-    m_bodyPart_i = dict((v, k) for k, v in m_i_bodyPart.items())
+    m_i_bodyPart = dict(enumerate(detections.JOINT_NAMES))
+    m_bodyPart_i = detections.JOINT_INDEX
 
     OP_START = OP_ONE_START = False
-    OP_WRAPPER = ONE_OP_WRAPPER = None
-    BOUND_PADDING = 5
+    OP_WRAPPER = ONE_OP_WRAPPER = OP_ANALYSIS_WRAPPER = None
+    BOUND_PADDING = detections.BOUND_PADDING
 
-    def init_op():
-        global OP_START, OP_WRAPPER
+    def init_op(render=True):
+        """
+        :param render: whether the rendered images are used, the openpose backend of analysis only runs is configured
+        not to render at all (render_pose 0)
+        :return: pose backend used on the full frames, the shared openpose backend unless set_pose_backend was called
+        """
+        global OP_START, OP_WRAPPER, OP_ANALYSIS_WRAPPER
         if not OP_START:
             # Custom Params (refer to include/openpose/flags.hpp for more parameters)
             params = dict()
-            params["model_folder"] = "openpose/models/"
             # params["number_people_max"] = 3
-
-            # Starting OpenPose
-            opw = op.WrapperPython()
-            opw.configure(params)
-            opw.start()
-            OP_WRAPPER = opw
+            OP_WRAPPER = pose_backend.get_backend('openpose', params=params)
+            OP_ANALYSIS_WRAPPER = pose_backend.get_backend('openpose', params=dict(params, render_pose=0))
             OP_START = True
 
-        return OP_WRAPPER
+        return OP_WRAPPER if render else OP_ANALYSIS_WRAPPER
 
     def init_one_person_op():
+        """
+        :return: pose backend detecting a single body, used on the goal post crop. Shares the model of init_op.
+        """
         global OP_ONE_START, ONE_OP_WRAPPER
         if not OP_ONE_START:
-            # Custom Params (refer to include/openpose/flags.hpp for more parameters)
-            params = dict()
-            params["model_folder"] = "openpose/models/"
-            params["number_people_max"] = 1
-
-            # Starting OpenPose
-            opw = op.WrapperPython()
-            opw.configure(params)
-            opw.start()
-            ONE_OP_WRAPPER = opw
+            ONE_OP_WRAPPER = pose_backend.TopPeopleBackend(init_op(), 1)
             OP_ONE_START = True
 
         return ONE_OP_WRAPPER
 
+    def set_pose_backend(backend, one_person_backend=None):
+        """
+        Replace openpose, e.g. with pose_backend.SyntheticPoseBackend to run without an OpenPose build
+        :param backend: pose_backend.PoseBackend used on the full frames
+        :param one_person_backend: pose_backend.PoseBackend used on the goal post crop, defaults to the best body of
+        backend
+        """
+        global OP_START, OP_WRAPPER, OP_ANALYSIS_WRAPPER, OP_ONE_START, ONE_OP_WRAPPER
+        OP_WRAPPER = OP_ANALYSIS_WRAPPER = backend
+        ONE_OP_WRAPPER = one_person_backend if one_person_backend is not None else pose_backend.TopPeopleBackend(backend, 1)
+        OP_START = OP_ONE_START = True
+
     # def find_nth_smallest(a, n):
     #     return np.partition(a, n - 1)[n - 1]
 
@@ -107,25 +77,22 @@ try:
     #         n += 1
     #     return res
 
-    def find_non_zero_min(a):
-        min = 0.0
-        arr = np.sort(a)
-        for num in arr:
-            if num != 0.0:
-                min = num
-                break
-        return min
+    find_non_zero_min = detections.find_non_zero_min
+
+    def get_body_bounds_array(body_keypoints):
+        """
+        :param body_keypoints: (N,25,3) body keypoints of a frame, or (F,N,25,3) keypoints of a clip, or
+        detections.FrameDetections
+        :return: (N,4), or (F,N,4), array of [min_x, min_y, max_x, max_y] with BOUND_PADDING
+        """
+        if isinstance(body_keypoints, detections.FrameDetections):
+            return body_keypoints.bounds
+        return detections.body_bounds(body_keypoints, BOUND_PADDING)
 
     def get_body_bound(body_keypoint):
         if body_keypoint is None:
             return None
-        padding = BOUND_PADDING
-        min_x = find_non_zero_min(body_keypoint[:, 0]) - padding
-        max_x = body_keypoint[:, 0].max() + padding
-        min_y = find_non_zero_min(body_keypoint[:, 1]) - padding
-        max_y = body_keypoint[:, 1].max() + padding
-        coord = [min_x, min_y, max_x, max_y]
-        return coord
+        return list(get_body_bounds_array(body_keypoint[np.newaxis])[0])
 
     def get_body_bounds(body_keypoints):
         """
@@ -133,12 +100,9 @@ try:
         :param body_keypoints: body_keypoints generated by openpose
         :return: corner coordinates
         """
-        res = []
-        for kp in body_keypoints:
-            coord = get_body_bound(kp)
-            res.append(coord)
-
-        return res
+        if len(body_keypoints) == 0:
+            return []
+        return [list(coord) for coord in get_body_bounds_array(body_keypoints)]
 
     def draw_bound(image, coords, text):
         """
@@ -155,46 +119,373 @@ try:
         return out
 
 
-    def process_video(vid_path, out_vid_path, f_height=720, f_width=1280, read_frame_rate=1, starting_frame=0, display=False):
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out_vid = cv2.VideoWriter(out_vid_path, fourcc, 20.0, (f_width, f_height))
-
-        cap = cv2.VideoCapture(vid_path)
+    def read_frames(cap, read_frame_rate=1, starting_frame=0, end_frame=None, metrics=run_metrics.DISABLED,
+                    sampler=None, frame_pool=None):
+        """
+        Generator over the frames of an opened video which are to be processed
+        :param cap: opened cv2.VideoCapture
+        :param read_frame_rate: process every nth frame
+        :param starting_frame: index of the first frame to read
+        :param end_frame: index of the frame to stop at (excluded), None to read until the end of the video
+        :param metrics: metrics.Metrics receiving the decode time and the number of skipped frames
+        :param sampler: frame_sampler.FrameSampler, only the frames it picks among the read_frame_rate ones are
+        yielded
+        :param frame_pool: frame_pool.FramePool the frames are decoded into, the consumer releases them
+        :return: yields (frame index, frame)
+        """
         count = starting_frame
         cap.set(cv2.CAP_PROP_POS_FRAMES, count)
+        frame_shape = (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), 3)
+        if frame_shape[0] <= 0 or frame_shape[1] <= 0:
+            frame_pool = None
         while cap.isOpened():
-            grab_success = cap.grab()
-            if grab_success:
-                if count % read_frame_rate == 0:
-                    print('------- Frame ' + str(count) + ' ----------')
-                    hasframe, frame = cap.retrieve()
-                    if hasframe:
-                        out_image = process_image_v2(frame, display)
-                        if display:
-                            cv2.imshow("Final Out Image: " + str(count), out_image)
-                            cv2.waitKey(0)
-                            cv2.destroyAllWindows()
-                        out_vid.write(out_image)
+            if end_frame is not None and count >= end_frame:
+                break
+            with metrics.timer('decode'):
+                grab_success = cap.grab()
+                if grab_success and count % read_frame_rate == 0:
+                    if frame_pool is not None:
+                        buf = frame_pool.acquire(frame_shape)
+                        hasframe, frame = cap.retrieve(buf)
+                        if frame is not buf:
+                            frame_pool.release(buf)
                     else:
-                        break
-                count += 1
-            else:
+                        hasframe, frame = cap.retrieve()
+                else:
+                    hasframe = frame = None
+            if not grab_success:
                 break
-        out_vid.release()
+            if hasframe is None:
+                metrics.count('frames_skipped')
+            elif not hasframe:
+                break
+            elif sampler is not None and not sampler.should_process(count, frame):
+                metrics.count('frames_sampled_out')
+                if frame_pool is not None:
+                    frame_pool.release(frame)
+            else:
+                logger.debug('------- Frame %d ----------', count)
+                yield count, frame
+            count += 1
+
+
+    def make_frame_stages(mask_mode=ground_detection.MASK_EXACT, mask_cache=None, propagator=None, roi_planner=None,
+                          stored_keypoints=None, render=True, classify=False, metrics=run_metrics.DISABLED,
+                          frame_pool=None, overlay_detail=overlay.DETAIL_LABELS, scale_policy=None, tracker=None):
+        """
+        Per frame processing steps shared by the serial and the pipelined mode of process_video. A frame goes through
+        them as a task dict, {'count': frame index, 'frame': image}, every step adding its results to it.
+        :param mask_mode: ground mask mode, see ground_detection.evaluate_mask_mode for the speed/accuracy trade-off
+        :param mask_cache: ground_detection.GroundMaskCache reusing the mask while the scene doesn't change
+        :param propagator: keypoint_propagation.KeypointPropagator, runs pose inference on keyframes only
+        :param roi_planner: roi.RoiPlanner, runs pose inference on crops around the ground and the previous bodies
+        :param stored_keypoints: keypoint_store.KeypointReader, the frames found in it skip masking and inference
+        :param render: composite the openpose output and draw the bounds into task['out']
+        :param classify: add the role of every body, the body bounds and the goal post (see classify_frame)
+        :param metrics: metrics.Metrics timing the mask, inference, classify and draw steps
+        :param frame_pool: frame_pool.FramePool providing the masked and rendered frame buffers, which are added to
+        task['buffers'], and the annotated frame is drawn into the decoded frame
+        :param overlay_detail: overlay.DETAIL_BOXES, DETAIL_LABELS or DETAIL_SKELETON
+        :param scale_policy: inference_scale.InferenceScalePolicy picking the resolution of the inference, the
+        keypoints and renderings are scaled back to the frame. Not applied to the roi_planner crops.
+        :param tracker: player_tracker.PlayerTracker keeping the roles from frame to frame (see track_frame), the
+        frames must reach the annotate function in order
+        :return: mask, pose and annotate functions, pose takes and returns a list of tasks
+        """
+        def pooled(task, shape):
+            buf = frame_pool.acquire(shape)
+            task.setdefault('buffers', []).append(buf)
+            return buf
+
+        def mask_stage(task):
+            if stored_keypoints is not None and task['count'] in stored_keypoints:
+                task['keypoints'] = stored_keypoints.get(task['count'])
+                task['op_img'] = None
+                task['stored'] = True
+                return task
+            dst = pooled(task, task['frame'].shape) if frame_pool is not None else None
+            if roi_planner is not None:
+                task['masked'], task['ground_mask'] = mask_frame(task['frame'], mask_mode, mask_cache, True, dst,
+                                                                 frame_pool)
+                if frame_pool is not None and mask_cache is None:
+                    task['buffers'].append(task['ground_mask'])
+            else:
+                task['masked'] = mask_frame(task['frame'], mask_mode, mask_cache, dst=dst, pool=frame_pool)
+            return task
+
+        def infer(tasks):
+            masked_images = [task['masked'] for task in tasks]
+            if roi_planner is None and scale_policy is not None:
+                op_imgs, body_keypoints = infer_scaled(tasks, masked_images)
+            elif roi_planner is None:
+                out = None
+                if frame_pool is not None and render:
+                    out = [pooled(task, task['masked'].shape) for task in tasks]
+                op_imgs, body_keypoints = estimate_poses(masked_images, render, out)
+            else:
+                rois = [roi_planner.plan(task['ground_mask']) for task in tasks]
+                op_imgs, body_keypoints = estimate_poses_in_rois(masked_images, rois, render)
+                roi_planner.update(get_body_bounds_array(body_keypoints[-1]))
+
+            for task, op_img, keypoints in zip(tasks, op_imgs, body_keypoints):
+                task['op_img'], task['keypoints'] = op_img, keypoints
+                task['masked'] = task['ground_mask'] = None
+            return tasks
+
+        def infer_scaled(tasks, masked_images):
+            scales = [scale_policy.scale_for(task['frame']) for task in tasks]
+            for scale in scales:
+                metrics.gauge('inference_scale', scale)
+            op_imgs, body_keypoints = estimate_poses([inference_scale.resize_for_inference(image, scale)
+                                                      for image, scale in zip(masked_images, scales)], render)
+            body_keypoints = [inference_scale.rescale_keypoints(keypoints, scale)
+                              for keypoints, scale in zip(body_keypoints, scales)]
+            if render:
+                op_imgs = [inference_scale.rescale_rendered(op_img, task['masked'].shape,
+                                                            pooled(task, task['masked'].shape)
+                                                            if frame_pool is not None else None)
+                           for task, op_img in zip(tasks, op_imgs)]
+            scale_policy.update(get_body_bounds_array(body_keypoints[-1]))
+            return op_imgs, body_keypoints
+
+        def pose_stage(tasks):
+            pending = [task for task in tasks if 'keypoints' not in task]
+            if propagator is not None:
+                for task in tasks:
+                    if 'keypoints' in task:
+                        # from the keypoint store, the next frames are propagated from this one
+                        propagator.keyframe(task['frame'], task['keypoints'], inferred=False)
+                    else:
+                        propagate_pose(task)
+            elif pending:
+                infer(pending)
+            return tasks
+
+        def propagate_pose(task):
+            keypoints = propagator.propagate(task['frame'])
+            if keypoints is None:
+                task = infer([task])[0]
+                propagator.keyframe(task['frame'], task['keypoints'])
+            else:
+                # nothing rendered by openpose in between keyframes
+                task['op_img'] = task['masked'] if render else None
+                task['keypoints'] = keypoints
+                task['masked'] = task['ground_mask'] = None
+            return task
+
+        def annotate_stage(task):
+            # built once, the classification and the drawing share its derived fields
+            task['detections'] = dets = detections.FrameDetections(task['keypoints'])
+            task['keypoints'] = dets.keypoints
+            if tracker is not None:
+                with metrics.timer('classify'):
+                    task.update(track_frame(task['frame'], dets, tracker))
+            elif classify:
+                with metrics.timer('classify'):
+                    task.update(classify_frame(task['frame'], dets))
+            if render:
+                with metrics.timer('draw'):
+                    out = task['frame'] if frame_pool is not None else None
+                    task['out'] = annotate_frame(task['frame'], task['op_img'], dets, out, overlay_detail,
+                                                 task if classify or tracker is not None else None)
+            return task
+
+        return metrics.timed('mask', mask_stage), metrics.timed('inference', pose_stage), annotate_stage
+
+
+    def pose_cache_params(mask_mode, mask_cache=None, propagator=None, roi_planner=None, scale_policy=None,
+                          render=True):
+        """
+        :param render: False for analysis only runs, see init_op
+        :return: everything the keypoints of a video depend on, for the keypoint store key
+        """
+        return {'backend': init_op(render).describe(),
+                'mask_mode': mask_cache.mode if mask_cache is not None else mask_mode,
+                'mask_cache': mask_cache is not None,
+                'keyframe_interval': propagator.keyframe_interval if propagator is not None else 1,
+                'roi': roi_planner is not None,
+                'inference_scale': scale_policy.describe() if scale_policy is not None else None}
+
+
+    def process_video(vid_path, out_vid_path, f_height=None, f_width=None, read_frame_rate=1, starting_frame=0, display=False,
+                      pipelined=False, queue_size=4, batch_size=1, mask_mode=ground_detection.MASK_EXACT,
+                      mask_cache=None, propagator=None, roi_planner=None, end_frame=None, on_frame=None,
+                      keypoint_cache=None, analysis_only=False, results=None, metrics=None, sampler=None,
+                      frame_pool=None, overlay_detail=overlay.DETAIL_LABELS, scale_policy=None, tracker=None):
+        """
+        Process the video frame by frame and write the annotated frames to out_vid_path
+        :param out_vid_path: output video, None to only hand the frames to on_frame
+        :param f_height: height of the output video, the source height by default
+        :param f_width: width of the output video, the source width by default. The output video has the source fps.
+        :param pipelined: run decoding, ground masking, pose estimation, annotation and encoding as separate stages
+        in their own threads connected by bounded queues, so that the decoder and encoder are not idle while openpose
+        runs. Frames stay in order since every stage is a single FIFO worker. Ignores display.
+        :param queue_size: max frames waiting between two stages in the pipelined mode
+        :param batch_size: max frames sent to the pose backend in one call in the pipelined mode
+        :param mask_mode: ground mask mode, see ground_detection.evaluate_mask_mode for the speed/accuracy trade-off
+        :param mask_cache: ground_detection.GroundMaskCache reusing the mask while the scene doesn't change
+        :param propagator: keypoint_propagation.KeypointPropagator, runs pose inference on keyframes only and moves
+        the keypoints with optical flow in between
+        :param roi_planner: roi.RoiPlanner, runs pose inference only on crops around the pitch and the previous
+        bodies, the keypoints being mapped back to the frame
+        :param end_frame: index of the frame to stop at (excluded), None to process until the end of the video
+        :param on_frame: called with the task dict of every frame once written ('count', 'keypoints', 'out', ...)
+        :param keypoint_cache: keypoint_store.KeypointStore, frames already in it (for this video content and pose
+        parameters) skip masking and pose inference, the others are inferred and added to it
+        :param analysis_only: run openpose without rendering (render_pose 0, see init_op) and skip the compositing,
+        the drawing and the encoding, out_vid_path is ignored. Use with results to get the roles and keypoints.
+        :param results: result_sink.JsonlResultSink or BinaryResultSink receiving the roles, bounds and keypoints of
+        every frame
+        :param metrics: metrics.Metrics receiving the stage timings, the counters and the queue depths, exported at
+        the end of the video. Disabled by default.
+        :param sampler: frame_sampler.FrameSampler skipping the frames which are not a view of the pitch and thinning
+        out the static ones, on top of read_frame_rate. The skipped spans are logged at the end.
+        :param frame_pool: frame_pool.FramePool recycling the decoded, masked and rendered frame buffers, so that no
+        full frame is allocated per frame once the pool is warm. The images of a task are only valid until on_frame
+        returns.
+        :param overlay_detail: overlay.DETAIL_BOXES (boxes only), DETAIL_LABELS (boxes and roles) or DETAIL_SKELETON
+        (boxes, roles and limbs)
+        :param scale_policy: inference_scale.InferenceScalePolicy running pose inference on downscaled frames when
+        the players are big enough, per shot
+        :param tracker: player_tracker.PlayerTracker giving every person a stable id and role across the frames, the
+        role heuristics only running again for the new or ambiguous bodies. The ids are added to the labels and the
+        results.
+        """
+        if metrics is None:
+            metrics = run_metrics.DISABLED
+        cap = cv2.VideoCapture(vid_path)
+        source_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        out_size = (f_width or source_size[0], f_height or source_size[1])
+        out_vid = None
+        if out_vid_path is not None and not analysis_only:
+            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+            out_vid = cv2.VideoWriter(out_vid_path, fourcc, cap.get(cv2.CAP_PROP_FPS) or 20.0, out_size)
+        stored_keypoints = keypoint_writer = None
+        if keypoint_cache is not None:
+            params = pose_cache_params(mask_mode, mask_cache, propagator, roi_planner, scale_policy,
+                                       not analysis_only)
+            key = keypoint_store.store_key(keypoint_store.video_content_hash(vid_path), params)
+            stored_keypoints = keypoint_cache.reader(key)
+            keypoint_writer = keypoint_cache.writer(key, {'video': vid_path, 'params': params})
+
+        GOAL_POST_CACHE.reset()
+        if sampler is not None:
+            sampler.reset()
+        if scale_policy is not None:
+            scale_policy.reset()
+        if tracker is not None:
+            tracker.reset()
+        mask_stage, pose_stage, annotate_stage = make_frame_stages(mask_mode, mask_cache, propagator, roi_planner,
+                                                                   stored_keypoints, not analysis_only,
+                                                                   results is not None, metrics, frame_pool,
+                                                                   overlay_detail, scale_policy, tracker)
+
+        def decode():
+            for count, frame in read_frames(cap, read_frame_rate, starting_frame, end_frame, metrics, sampler,
+                                            frame_pool):
+                task = {'count': count, 'frame': frame}
+                if frame_pool is not None:
+                    task['buffers'] = [frame]
+                yield task
+
+        def encode_stage(task):
+            metrics.count('frames')
+            metrics.count('people', len(task['keypoints']))
+            if task.get('stored'):
+                metrics.count('frames_from_store')
+            if out_vid is not None:
+                with metrics.timer('encode'):
+                    out_image = task['out']
+                    if out_image.shape[1::-1] != out_size:
+                        out_image = cv2.resize(out_image, out_size, interpolation=cv2.INTER_AREA)
+                    out_vid.write(out_image)
+            if keypoint_writer is not None and not task.get('stored'):
+                keypoint_writer.add(task['count'], task['keypoints'])
+            if results is not None:
+                results.write(task['count'], task['keypoints'], task['roles'], task['bounds'], task['goal_post'],
+                              task.get('track_ids'))
+            if on_frame is not None:
+                on_frame(task)
+            if frame_pool is not None:
+                GOAL_POST_CACHE.forget(task['frame'])
+                for buf in task['buffers']:
+                    frame_pool.release(buf)
+
+        try:
+            if pipelined:
+                pipeline.run_pipeline(decode(), [('mask', mask_stage),
+                                                 ('pose', pose_stage, batch_size),
+                                                 ('annotate', annotate_stage),
+                                                 ('encode', encode_stage)], queue_size,
+                                      metrics if metrics.enabled else None)
+            else:
+                for task in decode():
+                    task = pose_stage([mask_stage(task)])[0]
+                    if display and task['op_img'] is not None:
+                        cv2.imshow("Op Image", task['op_img'])
+                        cv2.waitKey(0)
+                    task = annotate_stage(task)
+                    if display and not analysis_only:
+                        cv2.imshow("Final Out Image: " + str(task['count']), task['out'])
+                        cv2.waitKey(0)
+                        cv2.destroyAllWindows()
+                    encode_stage(task)
+        finally:
+            cap.release()
+            if out_vid is not None:
+                out_vid.release()
+            if keypoint_writer is not None:
+                keypoint_writer.close()
+
+        if mask_cache is not None:
+            count_stats(metrics, 'mask_cache', mask_cache.stats())
+        if propagator is not None:
+            count_stats(metrics, 'propagation', propagator.stats())
+        count_stats(metrics, 'goal_post', GOAL_POST_CACHE.stats())
+        if sampler is not None:
+            log_sampling(sampler.report())
+        if frame_pool is not None:
+            count_stats(metrics, 'frame_pool', frame_pool.stats())
+        if scale_policy is not None:
+            logger.info('Inference scale:: %s', scale_policy.stats())
+            count_stats(metrics, 'inference_scale', scale_policy.stats())
+        if tracker is not None:
+            logger.info('Tracking:: %s', tracker.stats())
+            count_stats(metrics, 'tracker', tracker.stats())
+        metrics.export()
+
+
+    def log_sampling(report):
+        logger.info('Frame sampling:: %d of %d frames processed', report['processed'], report['frames'])
+        for span in report['spans']:
+            if span['processed'] < span['frames']:
+                logger.info('Frames %d-%d %s:: %d of %d processed', span['start'], span['end'] - 1, span['label'],
+                            span['processed'], span['frames'])
+
+
+    def count_stats(metrics, prefix, stats):
+        """
+        Add the integer stats of a cache (hits, misses...) to the counters, e.g. mask_cache_hits
+        """
+        for name, value in stats.items():
+            if isinstance(value, int):
+                metrics.count(prefix + '_' + name, value)
+
+
+    # used until a goal post is detected
+    # for video1.mp4: [720,240,1120,520]
+    # for video3.mp4
+    DEFAULT_GOAL_POST_COORDS = [100,300,650,600]
+    GOAL_POST_CACHE = ground_detection.GoalPostCache(fallback=DEFAULT_GOAL_POST_COORDS)
 
 
     def get_goal_post_coords(image):
         """
-        Function to identify goal post coordinates
+        Function to identify goal post coordinates, detected once per shot (see ground_detection.GoalPostCache)
         :param image: main image
         :return: goal post top-left and opposite coordinates. [x,y,x2,y2]
         """
-        # for video1.mp4
-        # coords = [720,240,1120,520]
-
-        # for video3.mp4
-        coords = [100,300,650,600]
-        return coords
+        return GOAL_POST_CACHE.get_box(image)
 
 
     def get_goal_post_image(image):
@@ -229,8 +520,7 @@ try:
         :param display: boolean param to display image or not
         :return: body keypoints wrt the cropped image, cropped and marked image
         """
-        opWrapper = init_one_person_op()
-        datum = op.Datum()
+        backend = init_one_person_op()
 
         x, y, x2, y2 = crop_coords
         croppedImage = image[y:y2, x:x2].copy()
@@ -238,64 +528,53 @@ try:
             cv2.imshow("cropped image",croppedImage)
             cv2.waitKey(25)
 
-        datum.cvInputData = croppedImage
-        opWrapper.emplaceAndPop([datum])
-        outImg = datum.cvOutputData
+        body_keypoints, rendered = backend.infer_rendered([croppedImage])
+        outImg = rendered[0]
         if display:
             cv2.imshow("marked image", outImg)
             cv2.waitKey(25)
 
         keypoints = None
-        if datum.poseKeypoints.shape != ():
-            keypoints = datum.poseKeypoints[0]
+        if len(body_keypoints[0]) != 0:
+            keypoints = body_keypoints[0][0]
         else:
             outImg = croppedImage
 
         return keypoints, outImg
 
 
-    def draw_image_bound(image, body_points, text):
+    def draw_image_bound(image, body_points, text, in_place=False):
         """
         Draw image bounds around the keypoints detected with the text associated.
         Works if body_points are not empty.
         :param image: image on which the box is to be drawn
         :param body_points: body keypoints on the basis of which the rectangle is drawn
         :param text: Annotation of the bounding box
+        :param in_place: draw on the image itself instead of a copy
         :return: returns the image with rectangle drawn and text written.
         """
         if body_points is None or not is_valid_keypoints(body_points):
             return image
 
-        out = image.copy()
+        out = image if in_place else image.copy()
         bound = get_body_bound(body_points)
         out = draw_bound(out, bound, text)
         return out
 
 
+    PRINTED_PARTS = ['Nose', 'Neck', 'LWrist', 'RWrist', 'LElbow', 'RElbow', 'LHip', 'RHip', 'LKnee', 'RKnee',
+                     'LAnkle', 'RAnkle', 'LHeel', 'RHeel']
+    PRINTED_JOINTS = [(part, detections.JOINT_INDEX[part]) for part in PRINTED_PARTS]
+
+
     def printKp(kp):
+        """
+        Log the main joints of a body at debug level
+        """
         if kp is None:
             return
-
-        print("Nose:" + str(kp[m_bodyPart_i['Nose']]))
-        print("Neck:" + str(kp[m_bodyPart_i['Neck']]))
-
-        print("LWrist:" + str(kp[m_bodyPart_i['LWrist']]))
-        print("RWrist:" + str(kp[m_bodyPart_i['RWrist']]))
-
-        print("LElbow:" + str(kp[m_bodyPart_i['LElbow']]))
-        print("RElbow:" + str(kp[m_bodyPart_i['RElbow']]))
-
-        print("LHip:" + str(kp[m_bodyPart_i['LHip']]))
-        print("RHip:" + str(kp[m_bodyPart_i['RHip']]))
-
-        print("LKnee:" + str(kp[m_bodyPart_i['LKnee']]))
-        print("RKnee:" + str(kp[m_bodyPart_i['RKnee']]))
-
-        print("LAnkle:" + str(kp[m_bodyPart_i['LAnkle']]))
-        print("RAnkle:" + str(kp[m_bodyPart_i['RAnkle']]))
-
-        print("LHeel:" + str(kp[m_bodyPart_i['LHeel']]))
-        print("RHeel:" + str(kp[m_bodyPart_i['RHeel']]))
+        for part, joint in PRINTED_JOINTS:
+            logger.debug(part + ":" + str(kp[joint]))
 
 
     def is_valid_keypoints(keypoints):
@@ -304,10 +583,10 @@ try:
         :param keypoints: body keypoints
         :return: True if keypoints are available
         """
-        return keypoints[m_bodyPart_i['Neck']][2] != 0 \
-               and keypoints[m_bodyPart_i['LHip']][2] != 0 and keypoints[m_bodyPart_i['RHip']][2] != 0 \
-               and keypoints[m_bodyPart_i['LKnee']][2] != 0 and keypoints[m_bodyPart_i['RKnee']][2] != 0 \
-               and keypoints[m_bodyPart_i['LAnkle']][2] != 0 and keypoints[m_bodyPart_i['RAnkle']][2] != 0
+        return keypoints[detections.NECK][2] != 0 \
+               and keypoints[detections.L_HIP][2] != 0 and keypoints[detections.R_HIP][2] != 0 \
+               and keypoints[detections.L_KNEE][2] != 0 and keypoints[detections.R_KNEE][2] != 0 \
+               and keypoints[detections.L_ANKLE][2] != 0 and keypoints[detections.R_ANKLE][2] != 0
 
 
     HIP_THRESHOLD = 8
@@ -322,17 +601,9 @@ try:
         """
         res = False
 
-        neck = kp[m_bodyPart_i['Neck']]
-        lelbow = kp[m_bodyPart_i['LElbow']]
-        relbow = kp[m_bodyPart_i['RElbow']]
-        lwrist = kp[m_bodyPart_i['LWrist']]
-        rwrist = kp[m_bodyPart_i['RWrist']]
-        lhip = kp[m_bodyPart_i['LHip']]
-        rhip = kp[m_bodyPart_i['RHip']]
-        lknee = kp[m_bodyPart_i['LKnee']]
-        rknee = kp[m_bodyPart_i['RKnee']]
-        lankle = kp[m_bodyPart_i['LAnkle']]
-        rankle = kp[m_bodyPart_i['RAnkle']]
+        neck = kp[detections.NECK]
+        lhip = kp[detections.L_HIP]
+        rhip = kp[detections.R_HIP]
 
         left = min(lhip[0], rhip[0])
         right = max(lhip[0], rhip[0])
@@ -364,17 +635,9 @@ try:
         """
         res = False
 
-        neck = kp[m_bodyPart_i['Neck']]
-        lelbow = kp[m_bodyPart_i['LElbow']]
-        relbow = kp[m_bodyPart_i['RElbow']]
-        lwrist = kp[m_bodyPart_i['LWrist']]
-        rwrist = kp[m_bodyPart_i['RWrist']]
-        lhip = kp[m_bodyPart_i['LHip']]
-        rhip = kp[m_bodyPart_i['RHip']]
-        lknee = kp[m_bodyPart_i['LKnee']]
-        rknee = kp[m_bodyPart_i['RKnee']]
-        lankle = kp[m_bodyPart_i['LAnkle']]
-        rankle = kp[m_bodyPart_i['RAnkle']]
+        neck = kp[detections.NECK]
+        lhip = kp[detections.L_HIP]
+        rhip = kp[detections.R_HIP]
 
         left = min(lhip[0], rhip[0])
         right = max(lhip[0], rhip[0])
@@ -389,134 +652,240 @@ try:
         x, y, x2, y2 = bound
         return ((x + x2)/2, (y + y2)/2)
 
-    def identify_keypoints(image, keypoints, detect_gk=False):
-        keypoints_list = []
-        for kp in keypoints:
-            if is_valid_keypoints(kp):
-                keypoints_list.append(kp)
+    # joints which have to be detected for a body to be considered, see is_valid_keypoints
+    REQUIRED_PARTS = detections.REQUIRED_JOINTS
 
-        striker_kp = None
-        gk_kp = None
+    # distances and hip widths at or above this value are never picked
+    MAX_ROLE_DIST = 1000
+
+    def _argmin_where(values, mask):
+        """
+        :return: index of the first smallest value below MAX_ROLE_DIST among the masked ones, None if there is none
+        """
+        mask = mask & (values < MAX_ROLE_DIST)
+        if not mask.any():
+            return None
+        return int(np.flatnonzero(mask)[np.argmin(values[mask])])
+
+    def classify_roles(keypoints, gp_coords, detect_gk=False):
+        """
+        Vectorized role assignment over all the bodies detected in a frame
+        :param keypoints: (N,25,3) body keypoints generated by openpose, or detections.FrameDetections
+        :param gp_coords: goal post coordinates [x,y,x2,y2]
+        :param detect_gk: look for the goalkeeper around the goal post
+        :return: index of the striker, list of indices of the referees and index of the goalkeeper in keypoints.
+        Striker and goalkeeper are None when not found.
+        """
+        dets = detections.as_detections(keypoints)
+        if len(dets) == 0:
+            return None, [], None
+
+        candidates = np.flatnonzero(dets.valid)
 
-        gp_coords = get_goal_post_coords(image)
         gx, gy, gx2, gy2 = gp_coords
         g_mid = mid_bound_point(gp_coords)  # middle point of the goal post, [x,y]
+        mid_x, mid_y = dets.centers[candidates].T
+        dist = np.sqrt((mid_x - g_mid[0]) ** 2 + (mid_y - g_mid[1]) ** 2)
 
+        remaining = np.ones(len(candidates), bool)
+        gk = None
         if detect_gk:
-            # find gk and remove from list
             # goalkeeper will be in closest proximity to the goal post coordinates
             # goalkeeper will be inside the goal frame
-            min_dist = 1000
-            for kp in keypoints_list:
-                bbox = get_body_bound(kp)
-                # bx, by, bx2, by2 = bbox
-                mid = mid_bound_point(bbox)
-                dist = math.sqrt((mid[0] - g_mid[0])*(mid[0] - g_mid[0]) + (mid[1] - g_mid[1])*(mid[1] - g_mid[1]))
-                if gx < mid[0] < gx2 and gy < mid[1] < gy2:
-                    if dist < min_dist:
-                        min_dist = dist
-                        gk_kp = kp
-
-            if gk_kp is not None:
-                # removing gk_bp from main keypoints list
-                temp = []
-                for kp in keypoints_list:
-                    if not np.equal(kp, gk_kp).all():
-                        temp.append(kp)
-                keypoints_list = temp
-
-        # check if there exists any body point where neck is outside of LHip and RHip
-        neckOutsideBp = []
-        for kp in keypoints_list:
-            neck = kp[m_bodyPart_i['Neck']]
-            lhip = kp[m_bodyPart_i['LHip']]
-            rhip = kp[m_bodyPart_i['RHip']]
-
-            left = min(lhip[0], rhip[0])
-            right = max(lhip[0], rhip[0])
-
-            if not left < neck[0] < right:
-                neckOutsideBp.append(kp)
-
-        if len(neckOutsideBp) == 0:
+            in_goal = (gx < mid_x) & (mid_x < gx2) & (gy < mid_y) & (mid_y < gy2)
+            gk = _argmin_where(dist, in_goal)
+            if gk is not None:
+                remaining[gk] = False
+
+        neck_outside = ~dets.neck_between_hips()[candidates] & remaining
+
+        n_outside = np.count_nonzero(neck_outside)
+        if n_outside == 0:
             # If no striker found earlier check for body keypoint with thinnest hip size, that is most likely to be a
             # striker since the striker is facing sideways
-            min_hip = 1000
-            min_hip_kp = None
-            for kp in keypoints_list:
-                lhip = kp[m_bodyPart_i['LHip']]
-                rhip = kp[m_bodyPart_i['RHip']]
+            striker = _argmin_where(dets.hip_width[candidates], remaining)
+        elif n_outside == 1:
+            striker = int(np.flatnonzero(neck_outside)[0])
+        else:
+            # Find body furthest away from the goal since the other referee next to the line is crouching
+            striker = _argmin_where(dist, remaining)
 
-                hipLength = abs(lhip[0] - rhip[0])
-                if hipLength < min_hip:
-                    min_hip = hipLength
-                    min_hip_kp = kp
-            striker_kp = min_hip_kp
+        if striker is not None:
+            remaining[striker] = False
+        refs = [int(i) for i in candidates[remaining]]
+        striker = int(candidates[striker]) if striker is not None else None
+        gk = int(candidates[gk]) if gk is not None else None
+        return striker, refs, gk
 
-        elif len(neckOutsideBp) == 1:
-            striker_kp = neckOutsideBp[0]
+    def identify_keypoints(image, keypoints, detect_gk=False):
+        gp_coords = get_goal_post_coords(image)
+        striker, refs, gk = classify_roles(keypoints, gp_coords, detect_gk)
 
-        else:
-            # Find body furthest away from the goal since the other referee next to the line is crouching
-            min_dist = 1000
-            min_dist_kp = None
-            for kp in keypoints_list:
-                mid = mid_bound_point(get_body_bound(kp))
-                neck = kp[m_bodyPart_i['Neck']]
-                dist = math.sqrt((mid[0] - g_mid[0]) * (mid[0] - g_mid[0]) + (mid[1] - g_mid[1]) * (mid[1] - g_mid[1]))
-                if dist < min_dist:
-                    min_dist = dist
-                    min_dist_kp = kp
-            striker_kp = min_dist_kp
-
-        ref_arr = []
-        for kp in keypoints_list:
-            if not np.equal(kp, striker_kp).all():
-                ref_arr.append(kp)
-
-        print("\nStriker:: \n")
-        printKp(striker_kp)
+        striker_kp = keypoints[striker] if striker is not None else None
+        gk_kp = keypoints[gk] if gk is not None else None
+        ref_arr = [keypoints[i] for i in refs]
 
-        if detect_gk:
-            print("\nGoalkeeper:: \n")
-            printKp(gk_kp)
+        # formatting every joint is expensive, skip it unless it is going to be logged
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Striker::")
+            printKp(striker_kp)
 
-        print("\nRefs:: \n")
-        for kp in ref_arr:
-            printKp(kp)
-            print('\n')
+            if detect_gk:
+                logger.debug("Goalkeeper::")
+                printKp(gk_kp)
+
+            logger.debug("Refs::")
+            for kp in ref_arr:
+                printKp(kp)
 
-        print("\n\n")
         return striker_kp, ref_arr, gk_kp
 
 
-    def process_image_v2(image, display):
-        opWrapper = init_op()
-        datum = op.Datum()
+    def mask_frame(image, mask_mode=ground_detection.MASK_EXACT, mask_cache=None, return_mask=False, dst=None,
+                   pool=None):
+        """
+        Remove the crowd by masking the image on the basis of ground color
+        :param mask_mode: ground_detection.MASK_EXACT or MASK_DOWNSCALED
+        :param mask_cache: ground_detection.GroundMaskCache, takes precedence over mask_mode
+        :param return_mask: also return the ground mask
+        :param dst: buffer receiving the masked image
+        :param pool: frame_pool.FramePool providing the buffers of the ground mask, see
+        ground_detection.filter_ground_in_frame
+        """
+        return ground_detection.filter_ground_in_frame(image, mask_mode, mask_cache, return_mask, dst, pool)
+
 
-        # removing crowd by generating a masked image on the basis of ground color
-        masked_image = ground_detection.filter_ground_in_frame(image)
+    def estimate_pose(masked_image):
+        """
+        Run pose estimation on the masked image
+        :return: openpose rendered image and (N,25,3) body keypoints
+        """
+        op_imgs, body_keypoints = estimate_poses([masked_image])
+        return op_imgs[0], body_keypoints[0]
 
-        datum.cvInputData = masked_image
-        opWrapper.emplaceAndPop([datum])
-        op_img = datum.cvOutputData.copy()
 
-        out_image = cv2.bitwise_or(op_img, image)
+    def estimate_poses(masked_images, render=True, out=None):
+        """
+        Run pose estimation on a batch of masked images in a single backend call
+        :param render: get the openpose rendered images, None are returned otherwise
+        :param out: buffers receiving the rendered images, one per masked image
+        :return: list of openpose rendered images and list of (N,25,3) body keypoints
+        """
+        if not render:
+            return [None] * len(masked_images), init_op(False).infer(masked_images)
+        body_keypoints, op_imgs = init_op().infer_rendered(masked_images, out)
+        return op_imgs, body_keypoints
+
+
+    def estimate_poses_in_rois(masked_images, rois, render=True):
+        """
+        Run pose estimation only on crops of the masked images, all the crops of the batch in a single backend call
+        :param masked_images: list of masked images, the rendered crops are pasted back into them
+        :param rois: list of [x,y,x2,y2] crops per image, see roi.RoiPlanner
+        :param render: get the openpose rendered images, None are returned otherwise
+        :return: list of rendered images and list of (N,25,3) body keypoints in full frame coordinates
+        """
+        crops = []
+        owners = []
+        for i, (masked_image, boxes) in enumerate(zip(masked_images, rois)):
+            for box in boxes:
+                x, y, x2, y2 = box
+                crops.append(masked_image[y:y2, x:x2].copy())
+                owners.append((i, box))
+
+        rendered, crop_keypoints = estimate_poses(crops, render) if crops else ([], [])
+
+        per_image = [[] for _ in masked_images]
+        for (i, box), keypoints, crop_img in zip(owners, crop_keypoints, rendered):
+            x, y, x2, y2 = box
+            if render:
+                masked_images[i][y:y2, x:x2] = crop_img
+            if len(keypoints) != 0:
+                per_image[i].append(roi.offset_keypoints(keypoints, x, y))
+
+        body_keypoints = [np.concatenate(kps) if kps else pose_backend.empty_keypoints() for kps in per_image]
+        if not render:
+            return [None] * len(masked_images), body_keypoints
+        return masked_images, body_keypoints
+
+
+    def classify_frame(image, body_keypoints, gp_coords=None):
+        """
+        Structured result of a frame, without any drawing
+        :param gp_coords: goal post coordinates, get_goal_post_coords by default
+        :return: dict with the role of every body (see result_sink.role_array), the (N,4) body bounds and the goal
+        post coordinates
+        """
+        if gp_coords is None:
+            gp_coords = get_goal_post_coords(image)
+        dets = detections.as_detections(body_keypoints)
+        striker, refs, gk = classify_roles(dets, gp_coords, True)
+        return {'roles': result_sink.role_array(len(dets), striker, refs, gk),
+                'bounds': dets.bounds,
+                'goal_post': gp_coords}
+
+
+    def track_frame(image, body_keypoints, tracker, gp_coords=None):
+        """
+        classify_frame with the roles kept by a player_tracker.PlayerTracker, classify_roles only runs when the tracker
+        asks for it
+        :return: classify_frame dict with the (N,) track id of every body
+        """
+        if gp_coords is None:
+            gp_coords = get_goal_post_coords(image)
+        dets = detections.as_detections(body_keypoints)
+
+        def classify():
+            striker, refs, gk = classify_roles(dets, gp_coords, True)
+            return result_sink.role_array(len(dets), striker, refs, gk)
+
+        track_ids, roles = tracker.update(dets.bounds, classify)
+        return {'roles': roles,
+                'bounds': dets.bounds,
+                'goal_post': gp_coords,
+                'track_ids': track_ids}
+
+
+    def annotate_frame(image, op_img, body_keypoints, out=None, detail=overlay.DETAIL_LABELS, classification=None):
+        """
+        Combine the openpose output with the original image and mark the striker, goalkeeper and referees
+        :param body_keypoints: (N,25,3) body keypoints or detections.FrameDetections
+        :param out: buffer receiving the annotated image, can be the image itself
+        :param detail: overlay.DETAIL_BOXES, DETAIL_LABELS or DETAIL_SKELETON
+        :param classification: classify_frame result of the frame if already computed
+        :return: annotated image
+        """
+        dets = detections.as_detections(body_keypoints)
+        if len(dets) == 0:
+            if out is not None and out is not image:
+                np.copyto(out, image)
+                return out
+            return image
+
+        # before compositing, out can be the image
+        if classification is None:
+            classification = classify_frame(image, dets)
+        if logger.isEnabledFor(logging.DEBUG):
+            identify_keypoints(image, dets, True)
+
+        if op_img is not None:
+            image = out = cv2.bitwise_or(op_img, image, dst=out)
+        # no openpose rendering when the keypoints come from the keypoint store, the image is copied unless out is given
+        return overlay.render_overlay(image, classification['roles'], classification['bounds'], dets.keypoints,
+                                      detail, out, classification.get('track_ids'))
+
+
+    def process_image_v2(image, display, mask_mode=ground_detection.MASK_EXACT):
+        masked_image = mask_frame(image, mask_mode)
+        op_img, body_keypoints = estimate_pose(masked_image)
+
         if display:
             cv2.imshow("Op Image",op_img)
             cv2.waitKey(0)
             # cv2.imshow("Out Image", out_image)
             # cv2.waitKey(30)
 
-        body_keypoints = datum.poseKeypoints
-        if body_keypoints.size != 1:
-            striker_bp, ref_bp_arr, gk_bp = identify_keypoints(image, body_keypoints, True)
-            out_image = draw_image_bound(out_image, striker_bp, "Striker")
-            out_image = draw_image_bound(out_image, gk_bp, "Goalkeeper")
-            for kp in ref_bp_arr:
-                out_image = draw_image_bound(out_image, kp, "Referee")
-        else:
-            out_image = image
+        out_image = annotate_frame(image, op_img, body_keypoints)
 
         if display:
             # gp = get_goal_post_coords(out_image)
@@ -528,9 +897,6 @@ try:
 
 
     def process_image(image, display):
-        opWrapper = init_op()
-        datum = op.Datum()
-
         # marking goalkeeper in frame
         gk_bp, gk_img, gp_coords = get_gk_bodypoints(image, False)
         x,y,x2,y2 = gp_coords
@@ -542,17 +908,15 @@ try:
         # mask goalpost image area so as to avoid double identification by openpose
         image[y:y2, x:x2] = (255, 255, 255)
 
-        datum.cvInputData = image
-        opWrapper.emplaceAndPop([datum])
-        out_image = datum.cvOutputData.copy()
+        body_keypoints, op_imgs = init_op().infer_rendered([image])
+        out_image = op_imgs[0]
         out_image[y:y2, x:x2] = gk_proc_img
 
         if display:
             cv2.imshow("Out Image", out_image)
             cv2.waitKey(0)
 
-        body_keypoints = datum.poseKeypoints
-        striker_bp, ref_bp_arr, _ = identify_keypoints(image, body_keypoints)
+        striker_bp, ref_bp_arr, _ = identify_keypoints(image, body_keypoints[0])
         out_image = draw_image_bound(out_image, striker_bp, "Striker")
         for kp in ref_bp_arr:
             out_image = draw_image_bound(out_image, kp, "Referee")
@@ -563,6 +927,7 @@ try:
 
 
     def run():
+        logging.basicConfig(level=logging.INFO, format='%(message)s')
         start_time = datetime.now().strftime("%H:%M:%S")
 
         print("Start Time:: " + start_time)
@@ -574,9 +939,11 @@ try:
         out_vid_path = "resources/output/video3-out.mp4"
 
 
-        fheight = 720
-        fwidth = 1280
-        process_video(vid_path, out_vid_path, fheight, fwidth, frame_rate, starting_frame, False)
+        # output video with the size of the source
+        fheight = None
+        fwidth = None
+        metrics = run_metrics.Metrics(exporters=[run_metrics.LogExporter()])
+        process_video(vid_path, out_vid_path, fheight, fwidth, frame_rate, starting_frame, False, metrics=metrics)
 
         # Test Code
         # process_video(vid_path, out_vid_path, fheight, fwidth, read_frame_rate=5, starting_frame=45, display=True)
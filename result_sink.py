@@ -0,0 +1,127 @@
+import json
+import struct
+
+import numpy as np
+
+from detections import NUM_BODY_PARTS
+
+# role of every detected body
+ROLE_NONE = 0
+ROLE_STRIKER = 1
+ROLE_GOALKEEPER = 2
+ROLE_REFEREE = 3
+ROLE_NAMES = {ROLE_NONE: 'none', ROLE_STRIKER: 'striker', ROLE_GOALKEEPER: 'goalkeeper', ROLE_REFEREE: 'referee'}
+
+
+def role_array(num_people, striker, referees, goalkeeper):
+    """
+    :return: int8 array with the role of every body, from the indices returned by classify_roles
+    """
+    roles = np.full(num_people, ROLE_NONE, np.int8)
+    roles[list(referees)] = ROLE_REFEREE
+    if striker is not None:
+        roles[striker] = ROLE_STRIKER
+    if goalkeeper is not None:
+        roles[goalkeeper] = ROLE_GOALKEEPER
+    return roles
+
+
+def body_record(index, keypoints, bounds, decimals=2, track_ids=None):
+    if index is None:
+        return None
+    record = {'index': int(index),
+              'bbox': np.round(bounds[index], decimals).tolist(),
+              'keypoints': np.round(keypoints[index], decimals).tolist()}
+    if track_ids is not None:
+        record['track_id'] = int(track_ids[index])
+    return record
+
+
+def frame_record(frame, keypoints, roles, bounds, goal_post=None, decimals=2, track_ids=None):
+    """
+    :param track_ids: (N,) id of every body given by player_tracker.PlayerTracker, added to the body records
+    :return: JSON serializable dict with the striker, the goalkeeper and the referees of the frame
+    """
+    striker = np.flatnonzero(roles == ROLE_STRIKER)
+    goalkeeper = np.flatnonzero(roles == ROLE_GOALKEEPER)
+    return {'frame': int(frame),
+            'people': int(len(keypoints)),
+            'goal_post': [int(c) for c in goal_post] if goal_post is not None else None,
+            'striker': body_record(striker[0] if len(striker) else None, keypoints, bounds, decimals, track_ids),
+            'goalkeeper': body_record(goalkeeper[0] if len(goalkeeper) else None, keypoints, bounds, decimals,
+                                      track_ids),
+            'referees': [body_record(i, keypoints, bounds, decimals, track_ids)
+                         for i in np.flatnonzero(roles == ROLE_REFEREE)]}
+
+
+class JsonlResultSink:
+    """
+    One JSON object per frame with the striker, the goalkeeper and the referees, their bounding box and keypoints
+    """
+
+    def __init__(self, path, decimals=2):
+        self.file = open(path, 'w')
+        self.decimals = decimals
+
+    def write(self, frame, keypoints, roles, bounds, goal_post=None, track_ids=None):
+        """
+        :param frame: frame index
+        :param keypoints: (N,25,3) body keypoints
+        :param roles: (N,) role of every body, see role_array
+        :param bounds: (N,4) body bounds
+        :param goal_post: goal post coordinates used for the classification
+        :param track_ids: (N,) id of every body when tracked
+        """
+        record = frame_record(frame, keypoints, roles, bounds, goal_post, self.decimals, track_ids)
+        self.file.write(json.dumps(record) + '\n')
+
+    def close(self):
+        self.file.close()
+
+
+BINARY_MAGIC = b'PPDR'
+BINARY_VERSION = 1
+# frame index, number of bodies
+FRAME_HEADER = struct.Struct('<qi')
+
+
+class BinaryResultSink:
+    """
+    Compact sink, per frame: the header (frame index, number of bodies N) then N int8 roles, (N,4) float32 bounds and
+    (N,25,3) float32 keypoints. Read back with read_binary_results.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+        self.file.write(BINARY_MAGIC + struct.pack('<i', BINARY_VERSION))
+
+    def write(self, frame, keypoints, roles, bounds, goal_post=None, track_ids=None):
+        # goal post and track ids are not stored
+        self.file.write(FRAME_HEADER.pack(int(frame), len(keypoints)))
+        self.file.write(np.ascontiguousarray(roles, np.int8).tobytes())
+        self.file.write(np.ascontiguousarray(bounds, np.float32).tobytes())
+        self.file.write(np.ascontiguousarray(keypoints, np.float32).tobytes())
+
+    def close(self):
+        self.file.close()
+
+
+def read_binary_results(path):
+    """
+    :return: yields (frame index, keypoints, roles, bounds) for every frame written by BinaryResultSink
+    """
+    with open(path, 'rb') as f:
+        if f.read(4) != BINARY_MAGIC:
+            raise ValueError('Not a binary result file: ' + path)
+        version, = struct.unpack('<i', f.read(4))
+        if version != BINARY_VERSION:
+            raise ValueError('Unsupported binary result version: ' + str(version))
+        while True:
+            header = f.read(FRAME_HEADER.size)
+            if len(header) < FRAME_HEADER.size:
+                break
+            frame, n = FRAME_HEADER.unpack(header)
+            roles = np.frombuffer(f.read(n), np.int8)
+            bounds = np.frombuffer(f.read(n * 4 * 4), np.float32).reshape(n, 4)
+            keypoints = np.frombuffer(f.read(n * NUM_BODY_PARTS * 3 * 4), np.float32).reshape(n, NUM_BODY_PARTS, 3)
+            yield frame, keypoints, roles, bounds
@@ -0,0 +1,146 @@
+import cv2
+import numpy as np
+
+
+def expand_box(box, margin, width, height):
+    """
+    :param box: [x,y,x2,y2]
+    :param margin: pixels added on every side
+    :return: expanded box clipped to the image, as ints
+    """
+    x, y, x2, y2 = box
+    return [max(0, int(x - margin)), max(0, int(y - margin)),
+            min(width, int(np.ceil(x2 + margin))), min(height, int(np.ceil(y2 + margin)))]
+
+
+def box_area(box):
+    x, y, x2, y2 = box
+    return max(0, x2 - x) * max(0, y2 - y)
+
+
+def union_box(box, other):
+    return [min(box[0], other[0]), min(box[1], other[1]), max(box[2], other[2]), max(box[3], other[3])]
+
+
+def boxes_overlap(box, other):
+    return box[0] < other[2] and other[0] < box[2] and box[1] < other[3] and other[1] < box[3]
+
+
+def merge_overlapping(boxes):
+    boxes = [list(b) for b in boxes if box_area(b) > 0]
+    i = 0
+    while i < len(boxes):
+        for j in range(i + 1, len(boxes)):
+            if boxes_overlap(boxes[i], boxes[j]):
+                boxes[i] = union_box(boxes[i], boxes[j])
+                del boxes[j]
+                # the union may overlap boxes already checked
+                i = -1
+                break
+        i += 1
+    return boxes
+
+
+def merge_boxes(boxes, max_boxes):
+    """
+    Merge overlapping boxes, then the pairs adding the least area until there are at most max_boxes left, so that
+    no body is found twice and the number of inference crops stays bounded
+    :return: list of non overlapping boxes
+    """
+    boxes = merge_overlapping(boxes)
+    while len(boxes) > max_boxes:
+        best = None
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                u = union_box(boxes[i], boxes[j])
+                cost = box_area(u) - box_area(boxes[i]) - box_area(boxes[j])
+                if best is None or cost < best[0]:
+                    best = (cost, i, j, u)
+        _, i, j, u = best
+        del boxes[j]
+        boxes[i] = u
+        boxes = merge_overlapping(boxes)
+    return boxes
+
+
+def ground_mask_boxes(ground_mask, min_area_ratio=0.02, downscale=4):
+    """
+    Bounding boxes of the connected ground regions
+    :param ground_mask: mask from ground_detection.generate_ground_mask
+    :param min_area_ratio: ignore regions smaller than this fraction of the frame
+    :param downscale: the components are labelled on the mask resized by this factor
+    :return: list of [x,y,x2,y2] in full resolution coordinates
+    """
+    small = ground_mask[::downscale, ::downscale]
+    n, _, stats, _ = cv2.connectedComponentsWithStats((small > 0).astype(np.uint8), connectivity=8)
+    min_area = min_area_ratio * small.shape[0] * small.shape[1]
+    boxes = []
+    # label 0 is the background
+    for i in range(1, n):
+        x, y, w, h, area = stats[i]
+        if area >= min_area:
+            boxes.append([x * downscale, y * downscale, (x + w) * downscale, (y + h) * downscale])
+    return boxes
+
+
+class RoiPlanner:
+    """
+    Chooses the crops of the masked frame sent to pose inference. The crops are the ground regions of the mask, or,
+    when bodies were found on the previous frame, boxes around them (the mask regions are used again every
+    refresh_interval frames to pick up people entering the frame).
+    """
+
+    def __init__(self, margin=16, max_crops=2, min_area_ratio=0.02, use_prev_bounds=True, bounds_margin=0.5,
+                 refresh_interval=10):
+        """
+        :param margin: pixels added around every crop
+        :param max_crops: max crops per frame
+        :param min_area_ratio: ignore ground regions smaller than this fraction of the frame
+        :param use_prev_bounds: crop around the bodies of the previous frame
+        :param bounds_margin: margin around the previous bodies, as a fraction of the body size
+        :param refresh_interval: frames after which the crops come from the mask again
+        """
+        self.margin = margin
+        self.max_crops = max_crops
+        self.min_area_ratio = min_area_ratio
+        self.use_prev_bounds = use_prev_bounds
+        self.bounds_margin = bounds_margin
+        self.refresh_interval = refresh_interval
+        self.prev_bounds = None
+        self.since_refresh = 0
+
+    def plan(self, ground_mask):
+        """
+        :param ground_mask: ground mask of the frame
+        :return: list of [x,y,x2,y2] crops, empty if there is no ground in the frame
+        """
+        height, width = ground_mask.shape[:2]
+        if self.use_prev_bounds and self.prev_bounds is not None and len(self.prev_bounds) != 0 \
+                and self.since_refresh < self.refresh_interval:
+            self.since_refresh += 1
+            boxes = []
+            for b in self.prev_bounds:
+                size = max(b[2] - b[0], b[3] - b[1])
+                boxes.append(expand_box(b, self.bounds_margin * size + self.margin, width, height))
+        else:
+            self.since_refresh = 0
+            boxes = [expand_box(b, self.margin, width, height)
+                     for b in ground_mask_boxes(ground_mask, self.min_area_ratio)]
+        return merge_boxes(boxes, self.max_crops)
+
+    def update(self, bounds):
+        """
+        :param bounds: (N,4) body bounds found on the last frame
+        """
+        self.prev_bounds = bounds
+
+
+def offset_keypoints(keypoints, x, y):
+    """
+    Map keypoints found in a crop back to the frame, undetected joints stay at (0,0)
+    """
+    keypoints = keypoints.copy()
+    detected = keypoints[:, :, 2] > 0
+    keypoints[:, :, 0] += np.where(detected, x, 0)
+    keypoints[:, :, 1] += np.where(detected, y, 0)
+    return keypoints
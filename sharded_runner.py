@@ -0,0 +1,199 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+import cv2
+import numpy as np
+
+
+def get_frame_count(vid_path):
+    cap = cv2.VideoCapture(vid_path)
+    count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return count
+
+
+def split_frame_range(starting_frame, end_frame, num_shards, open_end=False):
+    """
+    Split [starting_frame, end_frame) into num_shards contiguous ranges of (almost) the same size
+    :param open_end: end the last range with None so that it reads until the end of the video, the frame count
+    reported by the container is not always exact
+    :return: list of (start, end) tuples
+    """
+    bounds = np.linspace(starting_frame, end_frame, num_shards + 1).astype(int)
+    ranges = [(int(start), int(end)) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+    if ranges and open_end:
+        ranges[-1] = (ranges[-1][0], None)
+    return ranges
+
+
+def save_keypoints(path, frame_indices, keypoints):
+    """
+    :param frame_indices: index of every processed frame
+    :param keypoints: (N,25,3) keypoints of every processed frame
+    """
+    counts = np.array([len(kp) for kp in keypoints], np.int64)
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    stacked = np.concatenate(keypoints).astype(np.float32) if keypoints else np.zeros((0, 25, 3), np.float32)
+    np.savez(path, frames=np.array(frame_indices, np.int64), offsets=offsets, keypoints=stacked)
+
+
+def load_keypoints(path):
+    """
+    :return: list of frame indices and list of (N,25,3) keypoints, as given to save_keypoints
+    """
+    with np.load(path) as data:
+        frames = data['frames']
+        offsets = data['offsets']
+        stacked = data['keypoints']
+    keypoints = [stacked[offsets[i]:offsets[i + 1]] for i in range(len(frames))]
+    return list(frames), keypoints
+
+
+def worker_process_video(backend=None):
+    """
+    process_video module of a worker process, imported on first use so that every worker process starts its own
+    openpose
+    :param backend: pose_backend.create_backend arguments set as the pose backend, None to keep the current one
+    (openpose by default)
+    """
+    import pose_backend
+    import process_video
+
+    if backend is not None:
+        process_video.set_pose_backend(pose_backend.get_backend(**backend))
+    return process_video
+
+
+def init_worker(backend=None, render=True):
+    """
+    Worker process initializer: load the pose model once, before the first job comes in
+    :param backend: pose_backend.create_backend arguments, None for openpose
+    :param render: False to load the openpose configuration of analysis only runs, see process_video.init_op
+    """
+    worker_process_video(backend).init_op(render).warm_up()
+
+
+def worker_pool(num_workers, backend=None, render=True):
+    """
+    Pool of worker processes, each loading the pose model once with init_worker. The workers are spawned so that no
+    openpose/cuda state is inherited from the parent.
+    """
+    ctx = multiprocessing.get_context('spawn')
+    return ctx.Pool(max(1, num_workers), initializer=init_worker, initargs=(backend, render))
+
+
+def process_shard(shard):
+    """
+    Worker: process one frame range of the video with its own pose backend
+    :param shard: dict with vid_path, segment_path, keypoints_path, start, end, backend and options
+    :return: segment path, keypoints path and number of frames processed
+    """
+    process_video = worker_process_video(shard['backend'])
+
+    frame_indices = []
+    keypoints = []
+
+    def collect(task):
+        frame_indices.append(task['count'])
+        keypoints.append(task['keypoints'])
+
+    process_video.process_video(shard['vid_path'], shard['segment_path'], starting_frame=shard['start'],
+                                end_frame=shard['end'], on_frame=collect, **shard['options'])
+    save_keypoints(shard['keypoints_path'], frame_indices, keypoints)
+    return shard['segment_path'], shard['keypoints_path'], len(frame_indices)
+
+
+def stitch_videos(segment_paths, out_vid_path):
+    """
+    Concatenate the video segments in order, the output uses the size and fps of the first segment
+    """
+    out_vid = None
+    try:
+        for path in segment_paths:
+            cap = cv2.VideoCapture(path)
+            if out_vid is None:
+                fps = cap.get(cv2.CAP_PROP_FPS)
+                size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+                out_vid = cv2.VideoWriter(out_vid_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+            while True:
+                hasframe, frame = cap.read()
+                if not hasframe:
+                    break
+                out_vid.write(frame)
+            cap.release()
+    finally:
+        if out_vid is not None:
+            out_vid.release()
+
+
+def merge_keypoints(keypoints_paths, out_path):
+    frame_indices = []
+    keypoints = []
+    for path in keypoints_paths:
+        frames, kps = load_keypoints(path)
+        frame_indices.extend(frames)
+        keypoints.extend(kps)
+    save_keypoints(out_path, frame_indices, keypoints)
+
+
+def process_video_sharded(vid_path, out_vid_path, keypoints_path=None, num_workers=None, starting_frame=0,
+                          end_frame=None, backend=None, work_dir=None, **options):
+    """
+    Split the video into frame ranges processed by process_video.process_video in parallel worker processes, then
+    stitch the annotated segments and the keypoints back together in frame order
+    :param keypoints_path: .npz file receiving the keypoints of every processed frame, see load_keypoints
+    :param num_workers: number of worker processes, defaults to the number of cores
+    :param backend: pose_backend.create_backend arguments (e.g. {'name': 'synthetic'}), None for openpose
+    :param work_dir: directory for the per shard outputs, a temporary one is used (and removed) by default
+    :param options: other process_video arguments (read_frame_rate, mask_mode, pipelined...), must be picklable
+    :return: number of frames processed
+    """
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+    cap = cv2.VideoCapture(vid_path)
+    opened = cap.isOpened()
+    cap.release()
+    if not opened:
+        raise IOError('Could not read the video ' + vid_path)
+    open_end = end_frame is None
+    if open_end:
+        end_frame = get_frame_count(vid_path)
+    ranges = split_frame_range(starting_frame, end_frame, num_workers, open_end)
+    if not ranges:
+        raise ValueError('No frame to process in ' + vid_path + ' between frames ' + str(starting_frame) + ' and '
+                         + str(end_frame) + ' (the frame count is not reported by every container, pass end_frame)')
+
+    tmp_dir = None
+    if work_dir is None:
+        work_dir = tmp_dir = tempfile.mkdtemp(prefix='shards-')
+
+    try:
+        shards = []
+        for i, (start, end) in enumerate(ranges):
+            shards.append({'vid_path': vid_path,
+                           'segment_path': os.path.join(work_dir, 'segment-' + str(i) + '.mp4'),
+                           'keypoints_path': os.path.join(work_dir, 'keypoints-' + str(i) + '.npz'),
+                           'start': start,
+                           'end': end,
+                           'backend': backend,
+                           'options': options})
+
+        with worker_pool(min(num_workers, len(shards)), backend, not options.get('analysis_only', False)) as pool:
+            results = pool.map(process_shard, shards)
+
+        stitch_videos([r[0] for r in results], out_vid_path)
+        if keypoints_path is not None:
+            merge_keypoints([r[1] for r in results], keypoints_path)
+        return sum(r[2] for r in results)
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    vid_path = "resources/videos/video4/video4.mp4"
+    out_vid_path = "resources/output/video4-out.mp4"
+    keypoints_path = "resources/output/video4-keypoints.npz"
+    process_video_sharded(vid_path, out_vid_path, keypoints_path)
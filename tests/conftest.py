@@ -0,0 +1,26 @@
+import os
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+# the modules live at the root of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def synthetic_video(tmp_path):
+    """
+    :return: path of a short video of a pitch with a few moving blobs
+    """
+    path = str(tmp_path / 'pitch.mp4')
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), 20.0, (320, 240))
+    for i in range(16):
+        frame = np.zeros((240, 320, 3), np.uint8)
+        frame[80:] = (40, 140, 40)
+        cv2.circle(frame, (40 + 8 * i, 150), 12, (200, 200, 200), -1)
+        cv2.rectangle(frame, (200, 100 + i), (220, 160 + i), (30, 30, 200), -1)
+        out.write(frame)
+    out.release()
+    return path
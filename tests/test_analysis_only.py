@@ -0,0 +1,60 @@
+import pytest
+
+import ground_detection
+import pose_backend
+import process_video
+import result_sink
+
+
+class RecordingOpenPose(pose_backend.SyntheticPoseBackend):
+    """
+    Stands in for the openpose backend, recording the configurations which ran
+    """
+    calls = []
+
+    def __init__(self, params=None):
+        super(RecordingOpenPose, self).__init__()
+        self.params = dict(params or {})
+
+    def describe(self):
+        return {'name': 'openpose', 'params': self.params}
+
+    def infer_rendered(self, frames, out=None):
+        self.calls.append(('rendered', self.params.get('render_pose', -1)))
+        return super(RecordingOpenPose, self).infer_rendered(frames, out)
+
+    def infer(self, frames):
+        self.calls.append(('keypoints', self.params.get('render_pose', -1)))
+        return super(RecordingOpenPose, self).infer(frames)
+
+
+@pytest.fixture
+def openpose(monkeypatch):
+    monkeypatch.setitem(pose_backend.BACKENDS, 'openpose', RecordingOpenPose)
+    monkeypatch.setattr(pose_backend, 'BACKEND_POOL', pose_backend.BackendPool())
+    for name in ('OP_START', 'OP_WRAPPER', 'OP_ANALYSIS_WRAPPER', 'OP_ONE_START', 'ONE_OP_WRAPPER'):
+        monkeypatch.setattr(process_video, name, getattr(process_video, name))
+    monkeypatch.setattr(process_video, 'OP_START', False)
+    monkeypatch.setattr(RecordingOpenPose, 'calls', [])
+    return RecordingOpenPose
+
+
+def test_analysis_only_runs_openpose_without_rendering(openpose, synthetic_video, tmp_path):
+    sink = result_sink.BinaryResultSink(str(tmp_path / 'results.bin'))
+    process_video.process_video(synthetic_video, None, mask_mode=ground_detection.MASK_DOWNSCALED,
+                                analysis_only=True, results=sink)
+    sink.close()
+    assert openpose.calls and set(openpose.calls) == {('keypoints', 0)}
+    assert len(list(result_sink.read_binary_results(str(tmp_path / 'results.bin')))) == 16
+
+
+def test_rendering_runs_keep_the_default_configuration(openpose, synthetic_video):
+    process_video.process_video(synthetic_video, None, mask_mode=ground_detection.MASK_DOWNSCALED)
+    assert openpose.calls and set(openpose.calls) == {('rendered', -1)}
+
+
+def test_render_configuration_is_part_of_the_cache_key(openpose):
+    rendered = process_video.pose_cache_params(ground_detection.MASK_EXACT)
+    analysis = process_video.pose_cache_params(ground_detection.MASK_EXACT, render=False)
+    assert analysis['backend']['params']['render_pose'] == 0
+    assert 'render_pose' not in rendered['backend']['params']
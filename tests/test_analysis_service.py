@@ -0,0 +1,106 @@
+import asyncio
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+import analysis_service
+import pose_backend
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_micro_batcher_forms_batches():
+    sizes = []
+
+    def process_batch(items):
+        sizes.append(len(items))
+        return [item * 2 for item in items]
+
+    async def scenario():
+        batcher = analysis_service.MicroBatcher(process_batch, max_batch=8, max_latency=0.05, max_pending=64)
+        batcher.start()
+        try:
+            return await asyncio.gather(*[batcher.submit(i) for i in range(20)])
+        finally:
+            await batcher.stop()
+
+    assert run(scenario()) == [i * 2 for i in range(20)]
+    assert sum(sizes) == 20 and max(sizes) <= 8 and len(sizes) < 20
+
+
+def test_micro_batcher_rejects_when_full():
+    release = threading.Event()
+
+    def process_batch(items):
+        release.wait(5)
+        return items
+
+    async def scenario():
+        batcher = analysis_service.MicroBatcher(process_batch, max_batch=1, max_latency=0.0, max_pending=2)
+        batcher.start()
+        try:
+            # one item in the worker, two waiting
+            pending = [asyncio.ensure_future(batcher.submit(0))]
+            await asyncio.sleep(0.1)
+            pending += [asyncio.ensure_future(batcher.submit(i)) for i in (1, 2)]
+            await asyncio.sleep(0)
+            with pytest.raises(analysis_service.Overloaded):
+                await batcher.submit(3)
+            with pytest.raises(analysis_service.Overloaded):
+                await batcher.submit_all([4, 5])
+            release.set()
+            return await asyncio.gather(*pending), batcher.stats()['rejected']
+        finally:
+            release.set()
+            await batcher.stop()
+
+    assert run(scenario()) == ([0, 1, 2], 2)
+
+
+def encode_clip(path, count):
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), 20.0, (160, 120))
+    for i in range(count):
+        frame = np.zeros((120, 160, 3), np.uint8)
+        frame[40:] = (40, 140, 40)
+        cv2.circle(frame, (10 + 4 * i % 150, 80), 8, (200, 200, 200), -1)
+        out.write(frame)
+    out.release()
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def serve_and_post(requests, **options):
+    async def scenario():
+        service = analysis_service.AnalysisService(pose_backend.SyntheticPoseBackend(), **options)
+        server = await service.start(port=0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            return [await analysis_service.post('127.0.0.1', port, path, body) for path, body in requests]
+        finally:
+            await service.stop()
+
+    return run(scenario())
+
+
+def test_clip_longer_than_the_queue_is_not_truncated(tmp_path):
+    clip = encode_clip(str(tmp_path / 'clip.mp4'), 30)
+    (status, response), = serve_and_post([('/clip', clip)], max_pending=16)
+    assert status == 200
+    assert [record['frame'] for record in response['frames']] == list(range(30))
+
+
+def test_clip_longer_than_the_limit_is_rejected(tmp_path):
+    clip = encode_clip(str(tmp_path / 'clip.mp4'), 30)
+    (status, response), = serve_and_post([('/clip', clip)], max_clip_frames=20)
+    assert status == 413
+
+
+def test_frame_requests():
+    image = cv2.imencode('.png', np.full((120, 160, 3), (40, 140, 40), np.uint8))[1].tobytes()
+    (status, record), (bad_status, _) = serve_and_post([('/frame', image), ('/frame', b'not an image')])
+    assert status == 200 and record['people'] == 4
+    assert bad_status == 400
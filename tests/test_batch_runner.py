@@ -0,0 +1,84 @@
+import cv2
+import numpy as np
+import pytest
+
+import batch_runner
+import ground_detection
+import pose_backend
+import process_video
+import sharded_runner
+
+
+class CrashingBackend(pose_backend.SyntheticPoseBackend):
+    """
+    Synthetic backend failing after a number of frames, like a worker killed half way through a video
+    """
+
+    def __init__(self, frames_before_crash):
+        super(CrashingBackend, self).__init__()
+        self.frames_left = frames_before_crash
+
+    def infer_rendered(self, frames, out=None):
+        self.frames_left -= len(frames)
+        if self.frames_left < 0:
+            raise RuntimeError('crash')
+        return super(CrashingBackend, self).infer_rendered(frames, out)
+
+
+def make_job(synthetic_video, tmp_path, name):
+    entry = {'input': synthetic_video,
+             'output': str(tmp_path / (name + '.mp4')),
+             'keypoints': str(tmp_path / (name + '.npz')),
+             'options': {'mask_mode': ground_detection.MASK_DOWNSCALED}}
+    return {'entry': entry, 'work_dir': str(tmp_path / (name + '-work')), 'backend': None, 'segment_frames': 4}
+
+
+def frame_count(path):
+    cap = cv2.VideoCapture(path)
+    count = 0
+    while cap.read()[0]:
+        count += 1
+    cap.release()
+    return count
+
+
+def test_resume_after_a_crash(synthetic_video, tmp_path):
+    process_video.set_pose_backend(pose_backend.SyntheticPoseBackend())
+    reference = batch_runner.process_entry(make_job(synthetic_video, tmp_path, 'reference'))
+    assert reference['frames'] == 16 and reference['resumed_from'] == 0
+
+    job = make_job(synthetic_video, tmp_path, 'crashed')
+    process_video.set_pose_backend(CrashingBackend(10))
+    with pytest.raises(RuntimeError):
+        batch_runner.process_entry(job)
+
+    process_video.set_pose_backend(pose_backend.SyntheticPoseBackend())
+    report = batch_runner.process_entry(job)
+    # the frames completed before the crash are kept
+    assert report['resumed_from'] == 10
+    assert report['frames'] == 6 and report['done']
+    assert frame_count(job['entry']['output']) == 16
+
+    frames, keypoints = sharded_runner.load_keypoints(job['entry']['keypoints'])
+    expected_frames, expected_keypoints = sharded_runner.load_keypoints(str(tmp_path / 'reference.npz'))
+    assert list(frames) == list(expected_frames) == list(range(16))
+    for kp, expected in zip(keypoints, expected_keypoints):
+        np.testing.assert_array_equal(kp, expected)
+
+    # a finished video is not processed again
+    assert batch_runner.process_entry(job)['frames'] == 0
+
+
+def test_missing_input_is_not_done(tmp_path):
+    job = make_job(str(tmp_path / 'missing.mp4'), tmp_path, 'missing')
+    report = batch_runner.safe_process_entry(job)
+    assert report['done'] is False and 'Could not read' in report['error']
+
+
+def test_run_batch_on_worker_processes(synthetic_video, tmp_path):
+    good = make_job(synthetic_video, tmp_path, 'good')['entry']
+    missing = make_job(str(tmp_path / 'missing.mp4'), tmp_path, 'missing')['entry']
+    reports = batch_runner.run_batch([good, missing], str(tmp_path / 'work'), num_workers=2,
+                                     backend={'name': 'synthetic'}, segment_frames=4)
+    assert [report['done'] for report in reports] == [True, False]
+    assert reports[0]['frames'] == 16 and frame_count(good['output']) == 16
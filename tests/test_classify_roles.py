@@ -0,0 +1,78 @@
+import numpy as np
+
+import pose_backend
+import process_video
+
+GOAL_POST = [100, 300, 650, 600]
+
+
+def reference_roles(keypoints, gp_coords, detect_gk=True):
+    """
+    The per body loops classify_roles replaced, returning indices instead of keypoint arrays
+    """
+    neck, lhip, rhip = process_video.m_bodyPart_i['Neck'], process_video.m_bodyPart_i['LHip'], \
+        process_video.m_bodyPart_i['RHip']
+    valid = [i for i, kp in enumerate(keypoints) if process_video.is_valid_keypoints(kp)]
+    gx, gy, gx2, gy2 = gp_coords
+    g_mid = process_video.mid_bound_point(gp_coords)
+
+    def goal_dist(i):
+        mid = process_video.mid_bound_point(process_video.get_body_bound(keypoints[i]))
+        return np.sqrt((mid[0] - g_mid[0]) ** 2 + (mid[1] - g_mid[1]) ** 2), mid
+
+    gk = None
+    if detect_gk:
+        min_dist = 1000
+        for i in valid:
+            dist, mid = goal_dist(i)
+            if gx < mid[0] < gx2 and gy < mid[1] < gy2 and dist < min_dist:
+                min_dist, gk = dist, i
+        valid = [i for i in valid if i != gk]
+
+    outside = [i for i in valid if not min(keypoints[i][lhip][0], keypoints[i][rhip][0]) < keypoints[i][neck][0]
+               < max(keypoints[i][lhip][0], keypoints[i][rhip][0])]
+    striker = None
+    if len(outside) == 0:
+        min_hip = 1000
+        for i in valid:
+            hip = abs(keypoints[i][lhip][0] - keypoints[i][rhip][0])
+            if hip < min_hip:
+                min_hip, striker = hip, i
+    elif len(outside) == 1:
+        striker = outside[0]
+    else:
+        min_dist = 1000
+        for i in valid:
+            dist, _ = goal_dist(i)
+            if dist < min_dist:
+                min_dist, striker = dist, i
+    refs = [i for i in valid if i != striker]
+    return striker, refs, gk
+
+
+def random_frame(rng, seed):
+    num_people = int(rng.integers(0, 8))
+    keypoints = pose_backend.SyntheticPoseBackend(num_people, seed).generate(np.zeros((720, 1280, 3), np.uint8))
+    if num_people:
+        # drop joints, turn some bodies sideways and move some necks out of the hips
+        keypoints[rng.random(keypoints.shape[:2]) < 0.05] = 0.0
+        sideways = rng.random(num_people) < 0.3
+        keypoints[sideways, :, 0] = keypoints[sideways, :1, 0] + (keypoints[sideways, :, 0] -
+                                                                  keypoints[sideways, :1, 0]) * 0.1
+        leaning = rng.random(num_people) < 0.3
+        keypoints[leaning, 1, 0] += 40
+    return keypoints
+
+
+def test_classify_roles_matches_the_loop_implementation():
+    rng = np.random.default_rng(0)
+    for seed in range(2000):
+        keypoints = random_frame(rng, seed)
+        gp_coords = GOAL_POST if seed % 2 else [int(c) for c in rng.uniform(0, 1280, 4).reshape(2, 2).T.ravel()]
+        gp_coords = [min(gp_coords[0], gp_coords[2]), min(gp_coords[1], gp_coords[3]),
+                     max(gp_coords[0], gp_coords[2]), max(gp_coords[1], gp_coords[3])]
+        assert process_video.classify_roles(keypoints, gp_coords, True) == reference_roles(keypoints, gp_coords)
+
+
+def test_classify_roles_without_bodies():
+    assert process_video.classify_roles(pose_backend.empty_keypoints(), GOAL_POST, True) == (None, [], None)
@@ -0,0 +1,84 @@
+import numpy as np
+
+import detections
+import process_video
+
+
+def sort_based_non_zero_min(a):
+    """
+    find_non_zero_min before the batched version
+    """
+    for num in np.sort(a):
+        if num != 0.0:
+            return num
+    return 0.0
+
+
+def loop_body_bound(kp, padding=detections.BOUND_PADDING):
+    return [sort_based_non_zero_min(kp[:, 0]) - padding, sort_based_non_zero_min(kp[:, 1]) - padding,
+            kp[:, 0].max() + padding, kp[:, 1].max() + padding]
+
+
+def random_keypoints(rng, shape):
+    keypoints = rng.uniform(0, 1280, shape + (25, 3)).astype(np.float32)
+    # undetected joints are (0,0)
+    keypoints[rng.random(shape + (25,)) < 0.3] = 0.0
+    return keypoints
+
+
+def test_body_bounds_match_the_sort_based_loop():
+    rng = np.random.default_rng(7)
+    for people in range(6):
+        keypoints = random_keypoints(rng, (people,))
+        if people:
+            # a body without any joint
+            keypoints[0] = 0.0
+        expected = np.array([loop_body_bound(kp) for kp in keypoints], np.float32).reshape(-1, 4)
+        np.testing.assert_array_equal(detections.body_bounds(keypoints), expected)
+        assert process_video.get_body_bounds(keypoints) == [list(b) for b in expected]
+
+
+def test_body_bounds_of_a_clip():
+    rng = np.random.default_rng(8)
+    clip = random_keypoints(rng, (5, 3))
+    bounds = detections.body_bounds(clip)
+    assert bounds.shape == (5, 3, 4)
+    for frame, frame_bounds in zip(clip, bounds):
+        np.testing.assert_array_equal(frame_bounds, detections.body_bounds(frame))
+
+
+def test_find_non_zero_min():
+    a = np.array([[0.0, 3.0, 1.0], [0.0, 0.0, 0.0], [2.0, 5.0, 0.0]], np.float32)
+    assert list(detections.find_non_zero_min(a)) == [1.0, 0.0, 2.0]
+
+
+def test_frame_detections_fields_match_the_per_body_helpers():
+    rng = np.random.default_rng(12)
+    keypoints = random_keypoints(rng, (6,))
+    keypoints[:, detections.REQUIRED_JOINTS, 2] = 0.5
+    keypoints[2, detections.L_KNEE, 2] = 0.0
+    dets = detections.FrameDetections(keypoints)
+
+    assert len(dets) == 6 and dets[1] is not None and np.asarray(dets) is dets.keypoints
+    assert list(dets.valid) == [process_video.is_valid_keypoints(kp) for kp in keypoints]
+    for kp, bound, center, width, facing in zip(keypoints, dets.bounds, dets.centers, dets.hip_width,
+                                                dets.neck_between_hips()):
+        assert list(bound) == process_video.get_body_bound(kp)
+        assert list(center) == list(process_video.mid_bound_point(bound))
+        assert width == abs(kp[detections.L_HIP, 0] - kp[detections.R_HIP, 0])
+        lhip, rhip, neck = kp[detections.L_HIP, 0], kp[detections.R_HIP, 0], kp[detections.NECK, 0]
+        assert facing == (min(lhip, rhip) < neck < max(lhip, rhip))
+    # computed once
+    assert dets.bounds is dets.bounds
+    np.testing.assert_array_equal(dets.joint(detections.NECK), keypoints[:, detections.NECK])
+
+
+def test_frame_detections_of_openpose_output():
+    # openpose gives a 0-d array when nobody is detected
+    for keypoints in (np.array(0.0), None, []):
+        dets = detections.FrameDetections(keypoints)
+        assert dets.keypoints.shape == (0, 25, 3) and dets.bounds.shape == (0, 4)
+    dets = detections.FrameDetections(np.ones((1, 25, 3), np.float64))
+    assert dets.keypoints.dtype == np.float32 and dets.keypoints.flags['C_CONTIGUOUS']
+    assert detections.as_detections(dets) is dets
+    assert detections.JOINT_INDEX['LAnkle'] == detections.L_ANKLE == 14
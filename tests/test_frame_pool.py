@@ -0,0 +1,52 @@
+import hashlib
+
+import numpy as np
+import pytest
+
+import benchmark
+import frame_pool
+import ground_detection
+import pose_backend
+import process_video
+
+
+@pytest.fixture(autouse=True)
+def synthetic_backend():
+    process_video.set_pose_backend(pose_backend.SyntheticPoseBackend())
+
+
+def run(vid_path, **options):
+    frames = []
+
+    def collect(task):
+        frames.append((task['count'], task['keypoints'].tobytes(), hashlib.md5(task['out'].tobytes()).hexdigest()))
+
+    process_video.process_video(vid_path, None, on_frame=collect, **options)
+    return frames
+
+
+@pytest.mark.parametrize('mask_mode', [ground_detection.MASK_EXACT, ground_detection.MASK_DOWNSCALED])
+def test_pooled_output_matches_unpooled(synthetic_video, mask_mode):
+    unpooled = run(synthetic_video, mask_mode=mask_mode)
+    pool = frame_pool.FramePool()
+    assert run(synthetic_video, mask_mode=mask_mode, frame_pool=pool) == unpooled
+    assert run(synthetic_video, mask_mode=mask_mode, frame_pool=pool, pipelined=True, batch_size=2) == unpooled
+    stats = pool.stats()
+    assert stats['reuses'] > stats['allocations']
+
+
+def test_ground_mask_from_pool_matches():
+    image = np.random.default_rng(5).integers(0, 255, (120, 160, 3), np.uint8)
+    pool = frame_pool.FramePool()
+    for mode in (ground_detection.MASK_EXACT, ground_detection.MASK_DOWNSCALED):
+        expected = ground_detection.generate_ground_mask(image, mode)
+        for _ in range(3):
+            mask = ground_detection.generate_ground_mask(image, mode, pool=pool)
+            np.testing.assert_array_equal(mask, expected)
+            pool.release(mask)
+
+
+def test_steady_state_does_not_allocate_frames(synthetic_video):
+    stats = benchmark.bench_allocations(synthetic_video, warmup=4)
+    assert stats['unpooled']['mean_frames'] > 1.0
+    assert stats['pooled']['max_frames'] < 0.1
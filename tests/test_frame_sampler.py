@@ -0,0 +1,52 @@
+import numpy as np
+
+import frame_sampler
+
+PITCH = (40, 140, 40)
+CROWD = (90, 60, 150)
+
+
+def frame(color, x=None):
+    image = np.zeros((72, 128, 3), np.uint8)
+    image[:] = color
+    if x is not None:
+        image[20:50, x:x + 20] = 255
+    return image
+
+
+def test_spans_and_strides():
+    sampler = frame_sampler.FrameSampler(active_stride=1, static_stride=3)
+    frames = [frame(CROWD)] * 4 + [frame(PITCH, 10)] * 7 + [frame(PITCH, 10 + 12 * i) for i in range(1, 5)]
+    processed = [count for count, image in enumerate(frames) if sampler.should_process(count, image)]
+
+    spans = [(span['label'], span['start'], span['end'], span['processed']) for span in sampler.spans]
+    # the cut to the pitch is a motion
+    assert spans == [(frame_sampler.LABEL_NON_PITCH, 0, 4, 0),
+                     (frame_sampler.LABEL_ACTIVE, 4, 5, 1),
+                     (frame_sampler.LABEL_STATIC, 5, 11, 2),
+                     (frame_sampler.LABEL_ACTIVE, 11, 15, 4)]
+    assert processed == [4, 5, 8, 11, 12, 13, 14]
+    assert [span['start'] for span in sampler.skipped_spans()] == [0]
+    report = sampler.report()
+    assert (report['frames'], report['processed'], report['skipped']) == (15, 7, 8)
+
+
+def test_static_frames_can_be_skipped():
+    sampler = frame_sampler.FrameSampler(static_stride=0)
+    assert not any(sampler.should_process(count, frame(PITCH)) for count in range(5))
+    sampler.reset()
+    assert sampler.spans == []
+
+
+def test_process_video_with_a_sampler(synthetic_video):
+    import ground_detection
+    import pose_backend
+    import process_video
+
+    process_video.set_pose_backend(pose_backend.SyntheticPoseBackend())
+    sampler = frame_sampler.FrameSampler(motion_threshold=1000.0, static_stride=4)
+    counts = []
+    process_video.process_video(synthetic_video, None, mask_mode=ground_detection.MASK_DOWNSCALED, sampler=sampler,
+                                read_frame_rate=2, on_frame=lambda task: counts.append(task['count']))
+    # every 4th of the frames read at read_frame_rate
+    assert counts == [0, 8]
@@ -0,0 +1,83 @@
+import cv2
+import numpy as np
+import pytest
+
+import benchmark
+import ground_detection
+
+
+def pitch_frames():
+    return [benchmark.synthetic_frame(640, 360, seed) for seed in range(3)]
+
+
+def test_mask_iou():
+    a = np.zeros((4, 4), np.uint8)
+    assert ground_detection.mask_iou(a, a) == 1.0
+    b = a.copy()
+    a[:2] = 255
+    b[1:3] = 255
+    assert ground_detection.mask_iou(a, b) == pytest.approx(1 / 3)
+
+
+def test_downscaled_mask_is_close_to_the_exact_one():
+    report = ground_detection.evaluate_mask_mode(pitch_frames(), ground_detection.MASK_DOWNSCALED)
+    assert report['mode'] == ground_detection.MASK_DOWNSCALED
+    assert report['min_iou'] > 0.95
+    exact = ground_detection.evaluate_mask_mode(pitch_frames(), ground_detection.MASK_EXACT)
+    assert exact['min_iou'] == 1.0
+
+
+def test_equivalent_kernel_matches_the_iterations():
+    green_mask = ground_detection.generate_green_mask(pitch_frames()[0])
+    for kernel_size, iterations in (ground_detection.EROSION, ground_detection.DILATION):
+        kernel, anchor = ground_detection.equivalent_kernel(kernel_size, iterations, 1.0)
+        iterated = cv2.erode(green_mask, np.ones((kernel_size, kernel_size), np.uint8), iterations=iterations)
+        np.testing.assert_array_equal(cv2.erode(green_mask, kernel, anchor=anchor), iterated)
+
+
+def test_unknown_mask_mode():
+    with pytest.raises(ValueError):
+        ground_detection.generate_ground_mask(pitch_frames()[0], 'single-pass')
+
+
+def test_mask_cache_hits_until_a_cut():
+    cache = ground_detection.GroundMaskCache(max_age=0, mode=ground_detection.MASK_DOWNSCALED)
+    shot = benchmark.synthetic_frame(640, 360, 0)
+    # another camera
+    cut = 255 - shot
+    sequence = [shot] * 4 + [cut] * 3 + [shot]
+    masks = [cache.get_mask(frame) for frame in sequence]
+    assert (cache.misses, cache.hits) == (3, 5)
+    assert masks[1] is masks[0] and masks[5] is masks[4]
+    expected = ground_detection.generate_ground_mask(cut, ground_detection.MASK_DOWNSCALED)
+    np.testing.assert_array_equal(masks[4], expected)
+
+
+def test_mask_cache_max_age():
+    cache = ground_detection.GroundMaskCache(max_age=3)
+    frame = benchmark.synthetic_frame(320, 180, 0)
+    for _ in range(7):
+        cache.get_mask(frame)
+    assert (cache.misses, cache.hits) == (3, 4)
+
+
+@pytest.mark.parametrize('width, height', [(640, 360), (1280, 720), (1920, 1080)])
+def test_detect_goalpost_box(width, height):
+    box = ground_detection.detect_goalpost_box(benchmark.synthetic_frame(width, height))
+    expected = [width // 4, height // 3, 3 * width // 4, 3 * height // 4]
+    assert box is not None
+    assert np.abs(np.array(box) - expected).max() <= 0.02 * width
+
+
+def test_goalpost_detected_once_per_shot():
+    fallback = [0, 0, 10, 10]
+    cache = ground_detection.GoalPostCache(fallback=fallback)
+    empty = np.full((360, 640, 3), (40, 140, 40), np.uint8)
+    assert cache.get_box(empty) == fallback
+    shot = benchmark.synthetic_frame(640, 360, 1)
+    box = cache.get_box(shot)
+    assert box != fallback
+    for seed in range(2, 6):
+        # same shot, other noise
+        assert cache.get_box(benchmark.synthetic_frame(640, 360, seed)) == box
+    assert cache.stats() == {'detections': 2, 'failures': 1, 'hits': 4}
@@ -0,0 +1,62 @@
+import cv2
+import numpy as np
+
+import benchmark
+import inference_scale
+
+
+def test_quantize_scale():
+    assert inference_scale.quantize_scale(0.6) == 0.75
+    assert inference_scale.quantize_scale(0.5) == 0.5
+    assert inference_scale.quantize_scale(0.1) == 0.35
+    assert inference_scale.quantize_scale(2.0) == 1.0
+
+
+def test_rescale_keypoints_keeps_undetected_joints():
+    keypoints = np.full((2, 25, 3), 10.0, np.float32)
+    keypoints[1, 4] = 0.0
+    rescaled = inference_scale.rescale_keypoints(keypoints, 0.5)
+    assert (rescaled[0, :, :2] == 20.0).all() and (rescaled[..., 2] == keypoints[..., 2]).all()
+    assert not rescaled[1, 4].any()
+    assert keypoints[0, 0, 0] == 10.0
+
+
+def test_rescale_rendered_into_out():
+    rendered = np.zeros((90, 160, 3), np.uint8)
+    out = np.empty((180, 320, 3), np.uint8)
+    assert inference_scale.rescale_rendered(rendered, out.shape, out) is out
+
+
+def test_policy_scale_per_shot():
+    policy = inference_scale.InferenceScalePolicy(target_height=160)
+    shot = benchmark.synthetic_frame(640, 360, 0)
+    assert policy.scale_for(shot) == 1.0
+    policy.update(np.array([[0, 0, 50, 320], [0, 0, 50, 300], [0, 0, 50, 340]], np.float32))
+    assert policy.scale_for(shot) == 0.5
+    # nobody seen, back to full resolution
+    policy.update(np.zeros((0, 4), np.float32))
+    assert policy.scale_for(shot) == 1.0
+    policy.update(np.array([[0, 0, 50, 320]], np.float32))
+    # a new shot starts at full resolution
+    assert policy.scale_for(255 - shot) == 1.0
+    assert policy.stats() == {'shots': 2, 'frames_per_scale': {1.0: 3, 0.5: 1}}
+
+
+def test_output_keeps_the_source_size_and_fps(synthetic_video, tmp_path):
+    import ground_detection
+    import pose_backend
+    import process_video
+
+    process_video.set_pose_backend(pose_backend.SyntheticPoseBackend())
+    out_path = str(tmp_path / 'out.mp4')
+    shapes = []
+    policy = inference_scale.InferenceScalePolicy(target_height=20)
+    process_video.process_video(synthetic_video, out_path, mask_mode=ground_detection.MASK_DOWNSCALED,
+                                scale_policy=policy, on_frame=lambda task: shapes.append(task['out'].shape))
+    assert min(policy.stats()['frames_per_scale']) < 1.0
+    assert set(shapes) == {(240, 320, 3)}
+    cap = cv2.VideoCapture(out_path)
+    size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    cap.release()
+    assert size == (320, 240) and fps == 20.0
@@ -0,0 +1,69 @@
+import cv2
+import numpy as np
+
+import ground_detection
+import keypoint_propagation
+import pose_backend
+import process_video
+
+
+def textured_frame(shift=0):
+    rng = np.random.default_rng(9)
+    texture = cv2.GaussianBlur(rng.integers(0, 255, (240, 360), np.uint8), (7, 7), 0)
+    frame = np.ascontiguousarray(np.roll(texture, shift, axis=1)[:, 20:340])
+    return cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+
+
+def body_keypoints():
+    keypoints = np.zeros((1, 25, 3), np.float32)
+    keypoints[0, :, 0] = np.linspace(60, 260, 25)
+    keypoints[0, :, 1] = np.linspace(40, 200, 25)
+    keypoints[0, :, 2] = 0.9
+    keypoints[0, 20:] = 0.0
+    return keypoints
+
+
+def test_keyframe_cadence_and_motion():
+    propagator = keypoint_propagation.KeypointPropagator(keyframe_interval=3)
+    assert propagator.propagate(textured_frame()) is None
+    propagator.keyframe(textured_frame(), body_keypoints())
+    for step in (1, 2):
+        keypoints = propagator.propagate(textured_frame(2 * step))
+        assert keypoints is not None
+        detected = body_keypoints()[0, :, 2] > 0
+        np.testing.assert_allclose(keypoints[0, detected, 0], body_keypoints()[0, detected, 0] + 2 * step, atol=0.5)
+        np.testing.assert_allclose(keypoints[0, detected, 1], body_keypoints()[0, detected, 1], atol=0.5)
+        # undetected joints stay undetected
+        assert not keypoints[0, ~detected].any()
+    # keyframe_interval reached
+    assert propagator.propagate(textured_frame(6)) is None
+    assert propagator.stats() == {'keyframes': 1, 'propagated': 2, 'inference_ratio': 1 / 3}
+
+
+def test_lost_tracking_needs_a_keyframe():
+    propagator = keypoint_propagation.KeypointPropagator(keyframe_interval=10)
+    propagator.keyframe(textured_frame(), body_keypoints())
+    cut = np.ascontiguousarray(textured_frame()[::-1, ::-1])
+    assert propagator.propagate(cut) is None
+
+
+class CountingBackend(pose_backend.SyntheticPoseBackend):
+
+    def __init__(self):
+        super(CountingBackend, self).__init__()
+        self.frames = 0
+
+    def infer_rendered(self, frames, out=None):
+        self.frames += len(frames)
+        return super(CountingBackend, self).infer_rendered(frames, out)
+
+
+def test_process_video_infers_keyframes_only(synthetic_video):
+    backend = CountingBackend()
+    process_video.set_pose_backend(backend)
+    propagator = keypoint_propagation.KeypointPropagator(keyframe_interval=4, min_tracked_ratio=0.0)
+    count = []
+    process_video.process_video(synthetic_video, None, mask_mode=ground_detection.MASK_DOWNSCALED,
+                                propagator=propagator, on_frame=lambda task: count.append(task['count']))
+    assert len(count) == 16
+    assert backend.frames == propagator.stats()['keyframes'] == 4
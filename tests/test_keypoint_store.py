@@ -0,0 +1,82 @@
+import numpy as np
+
+import keypoint_store
+
+
+def random_frames(rng, count):
+    return [rng.random((int(rng.integers(0, 5)), 25, 3)).astype(np.float32) for _ in range(count)]
+
+
+def test_keypoint_store_round_trip(tmp_path):
+    rng = np.random.default_rng(2)
+    store = keypoint_store.KeypointStore(str(tmp_path))
+    frames = random_frames(rng, 20)
+    assert store.reader('key') is None
+
+    writer = store.writer('key', {'video': 'test'})
+    for i, keypoints in enumerate(frames[:10]):
+        writer.add(i * 2, keypoints)
+    writer.close()
+    # appending to an existing entry
+    writer = store.writer('key')
+    for i, keypoints in enumerate(frames[10:], 10):
+        writer.add(i * 2, keypoints)
+    writer.close()
+
+    reader = store.reader('key')
+    assert len(reader) == len(frames)
+    assert 3 not in reader and reader.get(3) is None
+    for i, keypoints in enumerate(frames):
+        np.testing.assert_array_equal(reader.get(i * 2), keypoints)
+
+
+def test_concurrent_writers_on_the_same_entry(tmp_path):
+    rng = np.random.default_rng(4)
+    store = keypoint_store.KeypointStore(str(tmp_path))
+    frames = random_frames(rng, 12)
+    writers = [store.writer('key', {'shard': i}) for i in range(3)]
+    # interleaved like the shards of a sharded run
+    for i, keypoints in enumerate(frames):
+        writers[i % 3].add(i, keypoints)
+    for writer in writers:
+        writer.close()
+
+    reader = store.reader('key')
+    assert len(reader) == len(frames)
+    for i, keypoints in enumerate(frames):
+        np.testing.assert_array_equal(reader.get(i), keypoints)
+
+
+def test_latest_write_wins(tmp_path):
+    store = keypoint_store.KeypointStore(str(tmp_path))
+    for value in (1.0, 2.0):
+        writer = store.writer('key')
+        writer.add(0, np.full((1, 25, 3), value, np.float32))
+        writer.close()
+    assert store.reader('key').get(0)[0, 0, 0] == 2.0
+
+
+def test_interrupted_write_is_ignored(tmp_path):
+    store = keypoint_store.KeypointStore(str(tmp_path))
+    writer = store.writer('key')
+    writer.add(0, np.ones((1, 25, 3), np.float32))
+    writer.file.close()
+    assert store.reader('key') is None
+
+
+def test_sharded_run_fills_the_store(tmp_path, synthetic_video):
+    import sharded_runner
+
+    store = keypoint_store.KeypointStore(str(tmp_path / 'store'))
+    keypoints_path = str(tmp_path / 'keypoints.npz')
+    count = sharded_runner.process_video_sharded(synthetic_video, str(tmp_path / 'out.mp4'), keypoints_path,
+                                                 num_workers=3, backend={'name': 'synthetic'},
+                                                 keypoint_cache=store)
+    assert count == 16
+    entries = [entry.name for entry in (tmp_path / 'store').iterdir()]
+    assert len(entries) == 1
+    reader = store.reader(entries[0])
+    frames, keypoints = sharded_runner.load_keypoints(keypoints_path)
+    assert list(reader.frames()) == list(frames)
+    for frame, kp in zip(frames, keypoints):
+        np.testing.assert_array_equal(reader.get(int(frame)), kp)
@@ -0,0 +1,63 @@
+import numpy as np
+
+import kick_locator
+
+
+def signals(length=400, step=2):
+    rng = np.random.default_rng(11)
+    frames = np.arange(0, length * step, step)
+    goal_motion = rng.uniform(0.5, 1.0, length)
+    global_motion = goal_motion * rng.uniform(0.3, 0.6, length)
+    pitch = np.ones(length, bool)
+    return frames, goal_motion, global_motion, pitch
+
+
+def test_kick_window_around_the_goal_motion_peak():
+    frames, goal_motion, global_motion, pitch = signals()
+    # the kick: a burst of motion in the goal region only
+    goal_motion[100:104] = [6.0, 9.0, 7.0, 5.0]
+    windows = kick_locator.find_windows(frames, goal_motion, global_motion, pitch, fps=20.0)
+    assert windows == [{'start': 202 - 40, 'end': 202 + 40 + 1, 'peak': 202, 'score': 9.0}]
+
+
+def test_cuts_pans_and_non_pitch_frames_are_ignored():
+    frames, goal_motion, global_motion, pitch = signals()
+    # camera cut
+    goal_motion[50] = global_motion[50] = 40.0
+    # pan, the whole frame moves
+    goal_motion[150:155] = global_motion[150:155] = 8.0
+    # crowd close-up
+    goal_motion[250:255] = 9.0
+    pitch[250:255] = False
+    assert kick_locator.find_windows(frames, goal_motion, global_motion, pitch, fps=20.0) == []
+
+
+def test_close_candidates_are_one_kick():
+    frames, goal_motion, global_motion, pitch = signals()
+    goal_motion[100] = 6.0
+    goal_motion[108] = 8.0
+    goal_motion[300] = 7.0
+    windows = kick_locator.find_windows(frames, goal_motion, global_motion, pitch, fps=20.0)
+    assert [(w['peak'], w['score']) for w in windows] == [(216, 8.0), (600, 7.0)]
+    assert windows[0]['start'] == 216 - 40 and windows[0]['end'] == 216 + 41
+
+
+def test_goal_region_is_clipped():
+    assert kick_locator.goal_region([100, 100, 300, 200], 0.5, (120, 160)) == [25, 37, 160, 112]
+    assert kick_locator.goal_region([0, 0, 40, 40], 1.0, (30, 30)) == [0, 0, 30, 30]
+
+
+def test_only_the_windows_are_processed(synthetic_video, tmp_path):
+    import ground_detection
+    import pose_backend
+    import process_video
+
+    process_video.set_pose_backend(pose_backend.SyntheticPoseBackend())
+    index_path = str(tmp_path / 'kicks.json')
+    kick_locator.save_index(index_path, {'video': synthetic_video, 'windows': [{'start': 2, 'end': 5},
+                                                                                {'start': 10, 'end': 12}]})
+    counts = []
+    kick_locator.process_kick_windows(synthetic_video, str(tmp_path / 'out.mp4'), index_path,
+                                      mask_mode=ground_detection.MASK_DOWNSCALED,
+                                      on_frame=lambda task: counts.append(task['count']))
+    assert counts == [2, 3, 4, 10, 11]
@@ -0,0 +1,50 @@
+import numpy as np
+
+import detections
+import overlay
+import pose_backend
+import process_video
+import result_sink
+
+
+def frame_and_classification(seed=0):
+    frame = np.zeros((360, 640, 3), np.uint8)
+    frame[120:] = (40, 140, 40)
+    keypoints = pose_backend.SyntheticPoseBackend(5, seed).generate(frame)
+    return frame, keypoints, process_video.classify_frame(frame, detections.FrameDetections(keypoints))
+
+
+def test_labels_match_the_per_role_drawing():
+    for seed in range(5):
+        frame, keypoints, classification = frame_and_classification(seed)
+        roles, bounds = classification['roles'], classification['bounds']
+        expected = frame.copy()
+        # the loop drawing striker, goalkeeper, then the referees
+        for role in overlay.DRAW_ORDER:
+            for i in np.flatnonzero(roles == role):
+                process_video.draw_bound(expected, bounds[i], overlay.ROLE_LABELS[role])
+        np.testing.assert_array_equal(overlay.render_overlay(frame, roles, bounds), expected)
+
+
+def test_detail_levels():
+    frame, keypoints, classification = frame_and_classification()
+    roles, bounds = classification['roles'], classification['bounds']
+    boxes = overlay.render_overlay(frame, roles, bounds, detail=overlay.DETAIL_BOXES)
+    labels = overlay.render_overlay(frame, roles, bounds, detail=overlay.DETAIL_LABELS)
+    skeleton = overlay.render_overlay(frame, roles, bounds, keypoints, overlay.DETAIL_SKELETON)
+    changed = [np.count_nonzero((image != frame).any(axis=2)) for image in (boxes, labels, skeleton)]
+    assert 0 < changed[0] < changed[1] < changed[2]
+    # the frame itself is not drawn on unless it is the out buffer
+    assert not (frame[:120] != 0).any()
+    assert overlay.render_overlay(frame, roles, bounds, out=frame) is frame
+
+
+def test_draw_order_and_skeleton_lines():
+    roles = np.array([result_sink.ROLE_REFEREE, result_sink.ROLE_NONE, result_sink.ROLE_GOALKEEPER,
+                      result_sink.ROLE_STRIKER, result_sink.ROLE_REFEREE])
+    assert list(overlay.draw_order(roles)) == [3, 2, 0, 4]
+    keypoints = np.ones((1, 25, 3), np.float32)
+    assert len(overlay.skeleton_lines(keypoints)) == len(overlay.BODY_25_PAIRS)
+    keypoints[0, 1] = 0.0
+    # the limbs of the neck are dropped
+    assert len(overlay.skeleton_lines(keypoints)) == len(overlay.BODY_25_PAIRS) - 4
@@ -0,0 +1,54 @@
+import itertools
+
+import numpy as np
+
+import player_tracker
+import result_sink
+
+
+def brute_force_cost(cost):
+    n, m = cost.shape
+    if n <= m:
+        return min(sum(cost[i, p[i]] for i in range(n)) for p in itertools.permutations(range(m), n))
+    return min(sum(cost[p[j], j] for j in range(m)) for p in itertools.permutations(range(n), m))
+
+
+def test_linear_assignment_is_optimal():
+    rng = np.random.default_rng(1)
+    for trial in range(500):
+        n, m = [int(x) for x in rng.integers(1, 7, 2)]
+        cost = rng.random((n, m))
+        if trial % 4 == 0:
+            # ties
+            cost = np.round(cost * 3)
+        pairs = player_tracker.linear_assignment(cost)
+        assert len(pairs) == min(n, m)
+        assert len(set(pairs[:, 0])) == len(pairs) and len(set(pairs[:, 1])) == len(pairs)
+        assert abs(cost[pairs[:, 0], pairs[:, 1]].sum() - brute_force_cost(cost)) < 1e-9
+
+
+def test_linear_assignment_empty():
+    assert player_tracker.linear_assignment(np.zeros((0, 3))).shape == (0, 2)
+
+
+def test_tracks_keep_their_id_and_role():
+    boxes = np.array([[0, 0, 50, 100], [200, 0, 250, 100], [400, 0, 450, 100]], np.float32)
+    roles = np.array([result_sink.ROLE_STRIKER, result_sink.ROLE_REFEREE, result_sink.ROLE_GOALKEEPER], np.int8)
+    tracker = player_tracker.PlayerTracker(confirm_frames=2, reclassify_interval=100)
+    calls = []
+
+    def classify(order):
+        calls.append(1)
+        return roles[order]
+
+    ids = None
+    for frame in range(10):
+        order = np.roll(np.arange(3), frame)
+        track_ids, track_roles = tracker.update(boxes[order] + frame, lambda: classify(order))
+        by_body = dict(zip(order, track_ids))
+        assert list(track_roles) == list(roles[order])
+        if ids is None:
+            ids = by_body
+        assert by_body == ids
+    # classified until the roles are confirmed, then reused
+    assert len(calls) == 2
@@ -0,0 +1,92 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import pose_backend
+
+
+def frames(count, seed=6):
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 255, (96, 128, 3), np.uint8) for _ in range(count)]
+
+
+def test_batched_inference_matches_single_frames():
+    backend = pose_backend.SyntheticPoseBackend(num_people=3)
+    batch = frames(5)
+    batched = backend.infer(batch)
+    for frame, keypoints in zip(batch, batched):
+        assert keypoints.shape == (3, 25, 3) and keypoints.dtype == np.float32
+        np.testing.assert_array_equal(backend.infer([frame])[0], keypoints)
+
+
+def test_rendered_into_out_buffers():
+    backend = pose_backend.SyntheticPoseBackend()
+    batch = frames(3)
+    out = [np.empty_like(frame) for frame in batch]
+    keypoints, rendered = backend.infer_rendered(batch, out)
+    assert all(image is buf for image, buf in zip(rendered, out))
+    for frame, image in zip(batch, rendered):
+        np.testing.assert_array_equal(image, frame)
+    np.testing.assert_array_equal(np.stack(keypoints), np.stack(backend.infer(batch)))
+
+
+def test_top_people_keeps_the_best_bodies():
+    backend = pose_backend.SyntheticPoseBackend(num_people=5)
+    top = pose_backend.TopPeopleBackend(backend, 2)
+    batch = frames(2)
+    for all_bodies, best in zip(backend.infer(batch), top.infer(batch)):
+        scores = pose_backend.body_scores(all_bodies)
+        np.testing.assert_array_equal(best, all_bodies[np.argsort(-scores, kind='stable')[:2]])
+
+
+def test_normalize_openpose_output():
+    assert pose_backend.normalize_keypoints(np.array(0.0)).shape == (0, 25, 3)
+    assert pose_backend.normalize_keypoints(None).shape == (0, 25, 3)
+    keypoints = np.ones((2, 25, 3), np.float32)
+    assert pose_backend.normalize_keypoints(keypoints) is keypoints
+
+
+def test_create_backend():
+    backend = pose_backend.create_backend('synthetic', num_people=2, seed=3)
+    assert backend.describe() == {'name': 'synthetic', 'num_people': 2, 'seed': 3}
+    with pytest.raises(ValueError):
+        pose_backend.create_backend('unknown')
+
+
+class CountingWarmUp(pose_backend.SyntheticPoseBackend):
+
+    def __init__(self, **kwargs):
+        super(CountingWarmUp, self).__init__(**kwargs)
+        self.started = 0
+        self.closed = 0
+
+    def warm_up(self):
+        self.started += 1
+
+    def close(self):
+        self.closed += 1
+
+
+def test_backend_pool_shares_by_configuration(monkeypatch):
+    monkeypatch.setitem(pose_backend.BACKENDS, 'counting', CountingWarmUp)
+    pool = pose_backend.BackendPool()
+    first = pool.get('counting', warm=True, seed=1)
+    assert pool.get('counting', seed=1) is first
+    other = pool.get('counting', seed=2)
+    assert other is not first
+    assert first.started == 1 and other.started == 0
+    assert pool.stats() == {'backends': 2, 'created': 2, 'reused': 1}
+    pool.close()
+    assert first.closed == other.closed == 1
+    assert pool.get('counting', seed=1) is not first
+
+
+def test_importing_the_pipeline_loads_no_heavy_module():
+    code = ('import sys, process_video, sharded_runner, batch_runner, analysis_service; '
+            'print(sorted(m for m in ("matplotlib", "pyopenpose", "openpose", "pytube") if m in sys.modules))')
+    root = os.path.dirname(os.path.abspath(pose_backend.__file__))
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=root)
+    assert output.decode().strip() == '[]'
@@ -0,0 +1,34 @@
+import hashlib
+
+import pytest
+
+import ground_detection
+import pose_backend
+import process_video
+
+
+@pytest.fixture(autouse=True)
+def synthetic_backend():
+    process_video.set_pose_backend(pose_backend.SyntheticPoseBackend())
+
+
+def run(vid_path, **options):
+    frames = []
+
+    def collect(task):
+        frames.append((task['count'], task['keypoints'].tobytes(), hashlib.md5(task['out'].tobytes()).hexdigest()))
+
+    process_video.process_video(vid_path, None, mask_mode=ground_detection.MASK_DOWNSCALED, on_frame=collect,
+                                **options)
+    return frames
+
+
+def test_pipelined_output_matches_serial(synthetic_video):
+    serial = run(synthetic_video)
+    assert len(serial) == 16
+    assert run(synthetic_video, pipelined=True, queue_size=2, batch_size=3) == serial
+
+
+def test_read_frame_rate_and_range(synthetic_video):
+    frames = run(synthetic_video, read_frame_rate=2, starting_frame=4, end_frame=12)
+    assert [count for count, _, _ in frames] == [4, 6, 8, 10]
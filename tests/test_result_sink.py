@@ -0,0 +1,45 @@
+import json
+
+import numpy as np
+
+import result_sink
+
+
+def random_frames(rng, count):
+    return [rng.random((int(rng.integers(0, 5)), 25, 3)).astype(np.float32) for _ in range(count)]
+
+
+def test_binary_results_round_trip(tmp_path):
+    rng = np.random.default_rng(3)
+    path = str(tmp_path / 'results.bin')
+    sink = result_sink.BinaryResultSink(path)
+    written = []
+    for frame, keypoints in enumerate(random_frames(rng, 15)):
+        roles = rng.integers(0, 4, len(keypoints)).astype(np.int8)
+        bounds = rng.random((len(keypoints), 4)).astype(np.float32)
+        sink.write(frame, keypoints, roles, bounds)
+        written.append((frame, keypoints, roles, bounds))
+    sink.close()
+
+    read = list(result_sink.read_binary_results(path))
+    assert len(read) == len(written)
+    for (frame, keypoints, roles, bounds), expected in zip(read, written):
+        assert frame == expected[0]
+        np.testing.assert_array_equal(keypoints, expected[1])
+        np.testing.assert_array_equal(roles, expected[2])
+        np.testing.assert_array_equal(bounds, expected[3])
+
+
+def test_jsonl_results(tmp_path):
+    path = str(tmp_path / 'results.jsonl')
+    keypoints = np.ones((2, 25, 3), np.float32)
+    roles = np.array([result_sink.ROLE_STRIKER, result_sink.ROLE_REFEREE], np.int8)
+    sink = result_sink.JsonlResultSink(path)
+    sink.write(7, keypoints, roles, np.zeros((2, 4), np.float32), [1, 2, 3, 4], np.array([5, 6]))
+    sink.close()
+    with open(path) as f:
+        record = json.loads(f.readline())
+    assert record['frame'] == 7 and record['people'] == 2 and record['goal_post'] == [1, 2, 3, 4]
+    assert record['striker']['index'] == 0 and record['striker']['track_id'] == 5
+    assert [referee['track_id'] for referee in record['referees']] == [6]
+    assert record['goalkeeper'] is None
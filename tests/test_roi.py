@@ -0,0 +1,69 @@
+import numpy as np
+
+import roi
+
+
+def covers(boxes, box):
+    return any(b[0] <= box[0] and b[1] <= box[1] and box[2] <= b[2] and box[3] <= b[3] for b in boxes)
+
+
+def test_offset_keypoints_keeps_undetected_joints():
+    keypoints = np.ones((2, 25, 3), np.float32)
+    keypoints[1, 3] = 0.0
+    moved = roi.offset_keypoints(keypoints, 10, 20)
+    assert (moved[0, :, 0] == 11).all() and (moved[0, :, 1] == 21).all()
+    assert not moved[1, 3].any()
+    assert keypoints[0, 0, 0] == 1
+
+
+def test_merge_boxes_covers_every_box_without_overlaps():
+    rng = np.random.default_rng(10)
+    for _ in range(200):
+        boxes = []
+        for _ in range(int(rng.integers(1, 8))):
+            x, y = rng.integers(0, 500, 2)
+            w, h = rng.integers(1, 120, 2)
+            boxes.append([int(x), int(y), int(x + w), int(y + h)])
+        max_boxes = int(rng.integers(1, 4))
+        merged = roi.merge_boxes(boxes, max_boxes)
+        assert 1 <= len(merged) <= max_boxes
+        for box in boxes:
+            assert covers(merged, box)
+        for i in range(len(merged)):
+            for j in range(i + 1, len(merged)):
+                assert not roi.boxes_overlap(merged[i], merged[j])
+
+
+def test_merge_boxes_joins_the_closest_pair():
+    boxes = [[0, 0, 10, 10], [12, 0, 22, 10], [200, 200, 210, 210]]
+    assert roi.merge_boxes(boxes, 2) == [[0, 0, 22, 10], [200, 200, 210, 210]]
+
+
+def test_planner_uses_the_mask_then_the_previous_bodies():
+    mask = np.zeros((240, 320), np.uint8)
+    mask[120:, :] = 255
+    planner = roi.RoiPlanner(margin=8, refresh_interval=2)
+    assert planner.plan(mask) == [[0, 112, 320, 240]]
+    planner.update(np.array([[100, 150, 120, 200]], np.float32))
+    assert planner.plan(mask) == [roi.expand_box([100, 150, 120, 200], 0.5 * 50 + 8, 320, 240)]
+    planner.plan(mask)
+    # refresh from the mask
+    assert planner.plan(mask) == [[0, 112, 320, 240]]
+
+
+def test_process_video_with_crops(synthetic_video):
+    import ground_detection
+    import pose_backend
+    import process_video
+
+    process_video.set_pose_backend(pose_backend.SyntheticPoseBackend())
+    frames = []
+    process_video.process_video(synthetic_video, None, mask_mode=ground_detection.MASK_DOWNSCALED,
+                                roi_planner=roi.RoiPlanner(), on_frame=lambda task: frames.append(task))
+    assert len(frames) == 16
+    for task in frames:
+        keypoints = task['keypoints']
+        assert keypoints.ndim == 3 and task['out'].shape == (240, 320, 3)
+        # mapped back into the frame
+        detected = keypoints[..., 2] > 0
+        assert (keypoints[..., 0][detected] < 320).all() and (keypoints[..., 1][detected] < 240).all()
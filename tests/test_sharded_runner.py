@@ -0,0 +1,66 @@
+import cv2
+import numpy as np
+import pytest
+
+import ground_detection
+import pose_backend
+import process_video
+import sharded_runner
+
+
+def test_split_frame_range():
+    assert sharded_runner.split_frame_range(0, 10, 3) == [(0, 3), (3, 6), (6, 10)]
+    assert sharded_runner.split_frame_range(5, 7, 4) == [(5, 6), (6, 7)]
+    assert sharded_runner.split_frame_range(0, 10, 2, open_end=True) == [(0, 5), (5, None)]
+    assert sharded_runner.split_frame_range(0, 0, 2) == []
+
+
+def write_numbered_video(path, values):
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), 20.0, (64, 48))
+    for value in values:
+        out.write(np.full((48, 64, 3), value, np.uint8))
+    out.release()
+
+
+def test_stitch_keeps_the_segment_order(tmp_path):
+    paths = []
+    for i, values in enumerate([[0, 0], [100], [200, 200, 200]]):
+        paths.append(str(tmp_path / ('segment-%d.mp4' % i)))
+        write_numbered_video(paths[-1], values)
+    out_path = str(tmp_path / 'out.mp4')
+    sharded_runner.stitch_videos(paths, out_path)
+
+    cap = cv2.VideoCapture(out_path)
+    means = []
+    while True:
+        hasframe, frame = cap.read()
+        if not hasframe:
+            break
+        means.append(frame.mean())
+    cap.release()
+    assert np.allclose(means, [0, 0, 100, 200, 200, 200], atol=10)
+
+
+def test_sharded_keypoints_match_a_single_process(synthetic_video, tmp_path):
+    process_video.set_pose_backend(pose_backend.SyntheticPoseBackend())
+    expected = []
+    process_video.process_video(synthetic_video, None, mask_mode=ground_detection.MASK_DOWNSCALED,
+                                on_frame=lambda task: expected.append((task['count'], task['keypoints'])))
+
+    keypoints_path = str(tmp_path / 'keypoints.npz')
+    count = sharded_runner.process_video_sharded(synthetic_video, str(tmp_path / 'out.mp4'), keypoints_path,
+                                                 num_workers=3, backend={'name': 'synthetic'},
+                                                 mask_mode=ground_detection.MASK_DOWNSCALED)
+    frames, keypoints = sharded_runner.load_keypoints(keypoints_path)
+    assert count == len(expected) == 16
+    assert list(frames) == [frame for frame, _ in expected]
+    for kp, (_, expected_kp) in zip(keypoints, expected):
+        np.testing.assert_array_equal(kp, expected_kp)
+
+
+def test_unreadable_video_and_empty_range(synthetic_video, tmp_path):
+    with pytest.raises(IOError):
+        sharded_runner.process_video_sharded(str(tmp_path / 'missing.mp4'), str(tmp_path / 'out.mp4'))
+    with pytest.raises(ValueError):
+        sharded_runner.process_video_sharded(synthetic_video, str(tmp_path / 'out.mp4'), starting_frame=5,
+                                             end_frame=5)
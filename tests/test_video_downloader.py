@@ -0,0 +1,104 @@
+import hashlib
+import http.server
+import os
+import threading
+
+import pytest
+
+import video_downloader
+
+CONTENT = bytes(range(256)) * 4096
+
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serves CONTENT at every path, honouring open ended Range requests like a video CDN
+    """
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(CONTENT)))
+        self.end_headers()
+
+    def do_GET(self):
+        self.requests.append((self.path, self.headers.get('Range')))
+        start = 0
+        if self.headers.get('Range'):
+            start = int(self.headers['Range'].split('=')[1].rstrip('-'))
+            if start >= len(CONTENT):
+                self.send_response(416)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (start, len(CONTENT) - 1, len(CONTENT)))
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(CONTENT) - start))
+        self.end_headers()
+        self.wfile.write(CONTENT[start:])
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(RangeHandler, 'requests', [])
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:%d/' % httpd.server_address[1]
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def check_report(report):
+    assert report['size'] == len(CONTENT)
+    assert report['sha256'] == hashlib.sha256(CONTENT).hexdigest()
+    with open(report['path'], 'rb') as f:
+        assert f.read() == CONTENT
+
+
+def test_download_then_cache_hit(server, tmp_path):
+    url = server + 'video.mp4'
+    report, = video_downloader.fetch_all([url], str(tmp_path))
+    assert report['status'] == 'downloaded'
+    check_report(report)
+    report, = video_downloader.fetch_all([url], str(tmp_path))
+    assert report['status'] == 'cached'
+    assert len(RangeHandler.requests) == 1
+
+
+def test_resume_from_partial(server, tmp_path):
+    url = server + 'video.mp4'
+    cache = video_downloader.VideoCache(str(tmp_path))
+    with open(cache.partial_path(url), 'wb') as f:
+        f.write(CONTENT[:300000])
+    report, = video_downloader.fetch_all([url], str(tmp_path))
+    assert report['status'] == 'resumed'
+    assert RangeHandler.requests == [('/video.mp4', 'bytes=300000-')]
+    check_report(report)
+
+
+@pytest.mark.parametrize('extra', [0, 10])
+def test_complete_or_stale_partial(server, tmp_path, extra):
+    url = server + 'video.mp4'
+    cache = video_downloader.VideoCache(str(tmp_path))
+    # complete partial file (416 with nothing left) or larger than the source (416, restarted)
+    with open(cache.partial_path(url), 'wb') as f:
+        f.write(CONTENT + b'x' * extra)
+    report, = video_downloader.fetch_all([url], str(tmp_path), retries=0)
+    assert report['status'] == ('resumed' if extra == 0 else 'downloaded')
+    check_report(report)
+
+
+def test_duplicate_urls_are_fetched_once(server, tmp_path):
+    urls = [server + 'video.mp4'] * 4 + [server + 'other.mp4']
+    reports = video_downloader.fetch_all(urls, str(tmp_path), max_workers=4, retries=0)
+    assert [report['status'] for report in reports] == ['downloaded'] * 5
+    for report in reports:
+        check_report(report)
+    assert sorted(path for path, _ in RangeHandler.requests) == ['/other.mp4', '/video.mp4']
+    assert os.listdir(os.path.join(str(tmp_path), 'partial')) == []
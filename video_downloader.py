@@ -1,6 +1,303 @@
-from pytube import YouTube
+import hashlib
+import io
+import json
+import os
+import shutil
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 
 SAVE_PATH = 'resources/videos/'
+CHUNK_SIZE = 1 << 20
+
+
+class HttpTransport:
+    """
+    Plain HTTP(S) downloads, resumed with a Range request
+    """
+
+    def __init__(self, timeout=30.0):
+        self.timeout = timeout
+
+    def open(self, url, offset=0):
+        """
+        :param offset: bytes already downloaded
+        :return: file like body, total size of the source (None if unknown) and whether the body starts at offset
+        (False when the server ignored the range and sends the whole source)
+        """
+        request = urllib.request.Request(url)
+        if offset > 0:
+            request.add_header('Range', 'bytes=' + str(offset) + '-')
+        try:
+            response = urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            if e.code != 416 or offset == 0:
+                raise
+            # range not satisfiable: the partial file is already complete, or larger than the source (stale) and
+            # the download starts over
+            e.close()
+            if offset > self.size(url):
+                body, total, _ = self.open(url, 0)
+                return body, total, False
+            return io.BytesIO(), offset, True
+        length = response.headers.get('Content-Length')
+        if response.status == 206:
+            content_range = response.headers.get('Content-Range', '')
+            total = content_range.rpartition('/')[2]
+            total = int(total) if total.isdigit() else (offset + int(length) if length else None)
+            return response, total, True
+        return response, int(length) if length else None, offset == 0
+
+    def size(self, url):
+        request = urllib.request.Request(url, method='HEAD')
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            length = response.headers.get('Content-Length')
+        return int(length) if length else 0
+
+    def extension(self, url):
+        return os.path.splitext(urllib.parse.urlparse(url).path)[1]
+
+
+class FileTransport:
+    """
+    Copies from a local path or file:// url, e.g. a mounted match library
+    """
+
+    def path(self, url):
+        parsed = urllib.parse.urlparse(url)
+        return urllib.request.url2pathname(parsed.path) if parsed.scheme == 'file' else url
+
+    def open(self, url, offset=0):
+        f = open(self.path(url), 'rb')
+        size = os.fstat(f.fileno()).st_size
+        if offset > size:
+            return f, size, False
+        f.seek(offset)
+        return f, size, True
+
+    def extension(self, url):
+        return os.path.splitext(self.path(url))[1]
+
+
+class YouTubeTransport:
+    """
+    Resolves a YouTube link to its highest resolution progressive stream with pytube, downloaded over HTTP
+    """
+
+    def __init__(self, http=None):
+        self.http = http if http is not None else HttpTransport()
+        self.stream_urls = {}
+        self.lock = threading.Lock()
+
+    def stream_url(self, url):
+        with self.lock:
+            if url not in self.stream_urls:
+                # imported here so that the other transports work without pytube
+                from pytube import YouTube
+
+                self.stream_urls[url] = YouTube(url).streams.get_highest_resolution().url
+            return self.stream_urls[url]
+
+    def open(self, url, offset=0):
+        return self.http.open(self.stream_url(url), offset)
+
+    def extension(self, url):
+        return '.mp4'
+
+
+YOUTUBE_HOSTS = ('youtube.com', 'www.youtube.com', 'm.youtube.com', 'youtu.be')
+TRANSPORTS = {}
+
+
+def default_transport(url):
+    """
+    :return: transport of the url: YouTube links, http(s) urls, else local files
+    """
+    parsed = urllib.parse.urlparse(url)
+    if parsed.netloc in YOUTUBE_HOSTS:
+        kind = YouTubeTransport
+    elif parsed.scheme in ('http', 'https'):
+        kind = HttpTransport
+    else:
+        kind = FileTransport
+    if kind not in TRANSPORTS:
+        TRANSPORTS[kind] = kind()
+    return TRANSPORTS[kind]
+
+
+def url_key(url):
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+
+def file_sha256(path, chunk_size=CHUNK_SIZE):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest
+
+
+class VideoCache:
+    """
+    Content addressed store of the downloaded videos: objects/<sha256[:2]>/<sha256><ext>, with an index.json mapping
+    every source url to its file path, size and checksum. Downloads in progress stay in partial/ so that they are
+    resumed by the next run.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.index_path = os.path.join(cache_dir, 'index.json')
+        self.lock = threading.Lock()
+        os.makedirs(os.path.join(cache_dir, 'partial'), exist_ok=True)
+        os.makedirs(os.path.join(cache_dir, 'objects'), exist_ok=True)
+        self.index = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+
+    def partial_path(self, url):
+        return os.path.join(self.cache_dir, 'partial', url_key(url) + '.part')
+
+    def object_path(self, sha256, ext=''):
+        return os.path.join(self.cache_dir, 'objects', sha256[:2], sha256 + ext)
+
+    def lookup(self, url):
+        """
+        :return: index entry of the url if its file is still there with the right size, None otherwise
+        """
+        with self.lock:
+            entry = self.index.get(url)
+        if entry is None:
+            return None
+        path = os.path.join(self.cache_dir, entry['path'])
+        if not os.path.exists(path) or os.path.getsize(path) != entry['size']:
+            return None
+        return entry
+
+    def add(self, url, partial_path, sha256, ext=''):
+        """
+        Move a completed download to its object, dropped if the same content is already there
+        :return: index entry of the url
+        """
+        path = self.object_path(sha256, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        size = os.path.getsize(partial_path)
+        if os.path.exists(path) and os.path.getsize(path) == size:
+            os.remove(partial_path)
+        else:
+            os.replace(partial_path, path)
+        entry = {'path': os.path.relpath(path, self.cache_dir), 'size': size, 'sha256': sha256,
+                 'fetched_at': time.time()}
+        with self.lock:
+            self.index[url] = entry
+            self.save()
+        return entry
+
+    def save(self):
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.index, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.index_path)
+
+    def resolve(self, entry):
+        return os.path.join(self.cache_dir, entry['path'])
+
+
+def download(url, cache, transport, chunk_size=CHUNK_SIZE):
+    """
+    Download (or resume) one source into the cache
+    :return: index entry and whether a partial download was resumed
+    """
+    partial_path = cache.partial_path(url)
+    offset = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+    body, total, resumed = transport.open(url, offset)
+    if not resumed:
+        offset = 0
+    try:
+        if offset > 0:
+            # the checksum covers the whole file, hash what was downloaded before
+            digest = file_sha256(partial_path, chunk_size)
+        else:
+            digest = hashlib.sha256()
+        with open(partial_path, 'ab' if offset > 0 else 'wb') as f:
+            if offset > 0 and total is not None and offset == total:
+                chunks = []
+            else:
+                chunks = iter(lambda: body.read(chunk_size), b'')
+            for chunk in chunks:
+                f.write(chunk)
+                digest.update(chunk)
+    finally:
+        body.close()
+
+    size = os.path.getsize(partial_path)
+    if total is not None and size != total:
+        raise IOError('Incomplete download of ' + url + ': ' + str(size) + ' of ' + str(total) + ' bytes')
+    return cache.add(url, partial_path, digest.hexdigest(), transport.extension(url)), offset > 0
+
+
+def fetch_one(url, cache, transport=None, retries=2, retry_delay=1.0):
+    """
+    :return: report of the source: url, status (cached, downloaded, resumed or failed), path, size and sha256
+    """
+    entry = cache.lookup(url)
+    if entry is not None:
+        return dict(entry, url=url, status='cached', path=cache.resolve(entry))
+
+    if transport is None:
+        transport = default_transport(url)
+    for attempt in range(retries + 1):
+        try:
+            entry, resumed = download(url, cache, transport)
+            return dict(entry, url=url, status='resumed' if resumed else 'downloaded', path=cache.resolve(entry))
+        except Exception as e:
+            # the partial file is kept, the next attempt resumes from it
+            if attempt == retries:
+                return {'url': url, 'status': 'failed', 'error': repr(e)}
+            time.sleep(retry_delay * (attempt + 1))
+
+
+def fetch_all(sources, cache_dir=SAVE_PATH, max_workers=4, transport=None, retries=2):
+    """
+    Download all the sources concurrently, skipping the ones already in the cache and resuming the interrupted ones
+    :param sources: list of urls (YouTube links, http(s) urls, local paths)
+    :param cache_dir: directory of the VideoCache
+    :param max_workers: downloads in flight
+    :param transport: transport of all the sources, picked per url by default_transport when None
+    :return: list of per source reports, see fetch_one, in the order of sources. A url listed twice is fetched once
+    and gets the same report.
+    """
+    cache = VideoCache(cache_dir)
+    # two downloads of the same url would write the same partial file
+    urls = list(dict.fromkeys(sources))
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        reports = dict(zip(urls, pool.map(lambda url: fetch_one(url, cache, transport, retries), urls)))
+    return [reports[url] for url in sources]
+
+
+def load_sources(manifest_path):
+    """
+    :return: urls of a text file, one per line, # starting a comment
+    """
+    sources = []
+    with open(manifest_path) as f:
+        for line in f:
+            line = line.split('#')[0].strip()
+            if line:
+                sources.append(line)
+    return sources
+
+
+def copy_to(report, out_path):
+    """
+    Copy a fetched video out of the cache, e.g. to the resources/videos/videoN/videoN.mp4 layout
+    """
+    os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
+    shutil.copyfile(report['path'], out_path)
+
 
 if __name__ == '__main__':
     links = [
@@ -10,12 +307,10 @@ if __name__ == '__main__':
         'https://www.youtube.com/watch?v=CBRE46C0tnM' # Fifa penalties over the years
         ]
 
-    i = 1
-    for link in links:
-        yt = YouTube(link)
-        print('Downloading : ' + yt.title)
-        stream = yt.streams.get_highest_resolution()
-        stream.download(SAVE_PATH, filename='video' + str(i))
-        i+=1
+    for report in fetch_all(links, os.path.join(SAVE_PATH, 'cache')):
+        if report['status'] == 'failed':
+            print('Failed ' + report['url'] + ':: ' + report['error'])
+        else:
+            print(report['status'].capitalize() + ' ' + report['url'] + ':: ' + report['path'])
 
-    print('Videos downloaded!')
\ No newline at end of file
+    print('Videos downloaded!')